@@ -0,0 +1,135 @@
+"""Synthetic players, chats and results for query benchmarks and performance tests.
+
+Point ``DB_CONNECTION_STRING`` at a scratch database: the generator writes into the bot's tables. Rows go
+in with ``COPY`` on PostgreSQL and with ``executemany`` inserts elsewhere.
+"""
+
+import random
+from collections.abc import AsyncGenerator, Iterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from games import FRAMED, GameSpec
+from models import ChatMember, GameResult, User
+from models.db import Base, engine
+from models.maintenance import rebuild_user_game_stats
+
+CHUNK_SIZE = 10_000
+
+
+@dataclass(frozen=True, slots=True)
+class DatasetShape:
+    users: int
+    rounds: int
+    chats: int
+    participation: float = 0.5
+    game: GameSpec = FRAMED
+    seed: int = 42
+
+    @property
+    def expected_results(self) -> int:
+        return int(self.users * self.rounds * self.participation)
+
+
+def _chunks[T](rows: Iterator[T], size: int) -> Iterator[list[T]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _user_chats(shape: DatasetShape, rng: random.Random) -> dict[int, list[int]]:
+    # Most players sit in one chat, some in a few.
+    return {
+        user_id: rng.sample(range(1, shape.chats + 1), k=min(shape.chats, rng.choice((1, 1, 1, 2, 3))))
+        for user_id in range(1, shape.users + 1)
+    }
+
+
+def _results(shape: DatasetShape, user_chats: dict[int, list[int]], rng: random.Random) -> Iterator[dict]:
+    for user_id, chats in user_chats.items():
+        # Stronger players win more often and earlier.
+        skill = rng.random()
+        for framed_round in range(1, shape.rounds + 1):
+            if rng.random() >= shape.participation:
+                continue
+            won = rng.random() < 0.3 + 0.6 * skill
+            win_frame = min(shape.game.grid_length, 1 + int(rng.expovariate(0.5 + skill))) if won else None
+            yield {
+                'game': shape.game.slug,
+                'user_id': user_id,
+                'framed_round': framed_round,
+                'won': won,
+                'win_frame': win_frame,
+                'chat_id': -rng.choice(chats),
+            }
+
+
+async def _copy_rows(conn: AsyncConnection, model: type[Base], rows: Iterator[dict]) -> int:
+    """Write ``rows`` inside the connection's transaction and return how many were written."""
+    written = 0
+    if conn.dialect.name == 'postgresql':
+        # The driver only opens the transaction with the first statement SQLAlchemy sends; COPY goes around
+        # SQLAlchemy and would otherwise commit on its own.
+        await conn.exec_driver_sql('SELECT 1')
+        driver_connection = (await conn.get_raw_connection()).driver_connection
+        if driver_connection is None:
+            raise RuntimeError('the connection has been closed')
+        for chunk in _chunks(rows, CHUNK_SIZE):
+            columns = list(chunk[0])
+            await driver_connection.copy_records_to_table(
+                model.__tablename__,
+                records=[tuple(row[column] for column in columns) for row in chunk],
+                columns=columns,
+            )
+            written += len(chunk)
+        return written
+    for chunk in _chunks(rows, CHUNK_SIZE):
+        await conn.execute(insert(model), chunk)
+        written += len(chunk)
+    return written
+
+
+async def load_dataset(conn: AsyncConnection, shape: DatasetShape) -> int:
+    """Insert users, results and chat members for ``shape`` and rebuild ``user_game_stats``.
+
+    Returns the number of inserted results.
+    """
+    rng = random.Random(shape.seed)  # noqa: S311 - reproducible test data, not secrets
+    user_chats = _user_chats(shape, rng)
+
+    users = (
+        {'id': user_id, 'full_name': f'Player {user_id}', 'username': f'player{user_id}'} for user_id in user_chats
+    )
+    await _copy_rows(conn, User, users)
+
+    members = ({'chat_id': -chat_id, 'user_id': user_id} for user_id, chats in user_chats.items() for chat_id in chats)
+    await _copy_rows(conn, ChatMember, members)
+
+    inserted = await _copy_rows(conn, GameResult, _results(shape, user_chats, rng))
+
+    await rebuild_user_game_stats(conn)
+    return inserted
+
+
+@asynccontextmanager
+async def loaded_dataset(shape: DatasetShape) -> AsyncGenerator[AsyncConnection]:
+    """Connection that sees ``shape`` loaded; everything is rolled back on exit, so the database stays as it was.
+
+    Meant as a fixture for performance tests; the tables must exist already.
+    """
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            await load_dataset(conn, shape)
+            await conn.exec_driver_sql('ANALYZE')
+            yield conn
+        finally:
+            await transaction.rollback()
@@ -0,0 +1,253 @@
+"""Replay a synthetic stream of Telegram updates through the real handler stack and measure it.
+
+Builds the bot with :func:`main.build_application`, but talks to a fake Bot API that answers every call
+after a simulated latency. The updates mix Framed and Episode results, chatter, /top and /stats from
+``--users`` players in ``--chats`` groups. Prints p50/p99 latency, updates per second and queries per
+update, and appends the run to a JSON lines file, so runs of different commits can be compared.
+
+Point ``DB_CONNECTION_STRING`` at a scratch database (PostgreSQL, or SQLite with ``aiosqlite``):
+
+    DB_CONNECTION_STRING=postgresql+asyncpg://... python benchmarks/load_test.py --updates 5000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess  # noqa: S404 - only to record the commit of a run
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault('BOT_TOKEN', '123:benchmark')
+os.environ.setdefault('ADMIN_USER_ID', '0')
+os.environ.setdefault('DELETION_QUEUE_PATH', str(Path(tempfile.gettempdir()) / 'load_test_deletions.bin'))
+
+from telegram import Update  # noqa: E402
+from telegram.request import BaseRequest, RequestData  # noqa: E402
+
+import main  # noqa: E402
+from instrumentation import handler_metrics, query_seconds  # noqa: E402
+from models.db import engine  # noqa: E402
+
+RESULTS_PATH = Path(__file__).parent / 'results' / 'load_test.jsonl'
+# Share of each kind of update in the stream.
+UPDATE_MIX = {'framed': 0.35, 'episode': 0.15, 'chatter': 0.4, 'top': 0.05, 'stats': 0.05}
+CHATTER = (
+    'кто-нибудь понял, что за фильм во втором раунде?',
+    'Framed сегодня лёгкий',
+    'ну я со второго кадра 😎',
+    'ахахах',
+)
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Framed', 'username': 'framed_bot'}
+
+
+class FakeBotRequest(BaseRequest):
+    """Bot API stand-in: answers every method after ``latency`` seconds and counts the calls."""
+
+    def __init__(self, latency: float, jitter: float, seed: int) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.calls: Counter[str] = Counter()
+        self._rng = random.Random(seed)  # noqa: S311 - simulated latency
+        self._message_id = 0
+
+    @property
+    def read_timeout(self) -> float | None:
+        return None
+
+    async def initialize(self) -> None:
+        return None
+
+    async def shutdown(self) -> None:
+        return None
+
+    async def do_request(
+        self, url: str, method: str, request_data: RequestData | None = None, *_args: Any, **_kwargs: Any
+    ) -> tuple[int, bytes]:
+        endpoint = url.rsplit('/', 1)[-1]
+        self.calls[endpoint] += 1
+        await asyncio.sleep(max(0.0, self._rng.gauss(self.latency, self.jitter)))
+        parameters = request_data.parameters if request_data is not None else {}
+        return 200, json.dumps({'ok': True, 'result': self._result(endpoint, parameters)}).encode()
+
+    def _result(self, endpoint: str, parameters: dict[str, Any]) -> object:
+        match endpoint:
+            case 'getMe':
+                return BOT_USER
+            case 'sendMessage' | 'editMessageText':
+                self._message_id += 1
+                return {
+                    'message_id': parameters.get('message_id', self._message_id),
+                    'date': int(time.time()),
+                    'chat': {'id': int(parameters.get('chat_id', 0)), 'type': 'group'},
+                    'from': BOT_USER,
+                    'text': parameters.get('text', ''),
+                }
+            case _:
+                return True
+
+
+def framed_text(rng: random.Random, framed_round: int) -> str:
+    win_frame = rng.choice((1, 2, 3, 4, 5, 6, None, None))
+    frames = ['⬛'] * 6 if win_frame is not None else ['🟥'] * 6
+    if win_frame is not None:
+        frames[: win_frame - 1] = ['🟥'] * (win_frame - 1)
+        frames[win_frame - 1] = '🟩'
+    return f'Framed #{framed_round}\n🎥 {" ".join(frames)}\n\nhttps://framed.wtf'
+
+
+def episode_text(rng: random.Random, episode_round: int) -> str:
+    win_frame = rng.choice((1, 2, 3, 5, 8, 10, None))
+    frames = ['⬛'] * 10 if win_frame is not None else ['🟥'] * 10
+    if win_frame is not None:
+        frames[: win_frame - 1] = ['🟥'] * (win_frame - 1)
+        frames[win_frame - 1] = '🟩'
+    return f'Episode #{episode_round}\n📺 {" ".join(frames)}\n\nhttps://episode.wtf'
+
+
+def generate_updates(count: int, users: int, chats: int, seed: int) -> list[dict[str, Any]]:
+    """``count`` raw updates; each player posts each round at most once, like in a real group."""
+    rng = random.Random(seed)  # noqa: S311 - reproducible test data, not secrets
+    kinds, weights = zip(*UPDATE_MIX.items(), strict=True)
+    user_chats = {user_id: -rng.randint(1, chats) for user_id in range(1, users + 1)}
+    next_round: dict[tuple[int, str], int] = {}
+    updates = []
+    for update_id in range(1, count + 1):
+        user_id = rng.randint(1, users)
+        kind = rng.choices(kinds, weights)[0]
+        entities = []
+        match kind:
+            case 'framed' | 'episode':
+                framed_round = next_round.get((user_id, kind), 1)
+                next_round[user_id, kind] = framed_round + 1
+                text = framed_text(rng, framed_round) if kind == 'framed' else episode_text(rng, framed_round)
+            case 'top' | 'stats':
+                text = f'/{kind}'
+                entities = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+            case _:
+                text = rng.choice(CHATTER)
+        chat_id = user_chats[user_id]
+        message: dict[str, Any] = {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'supergroup', 'title': f'Chat {-chat_id}'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'Player {user_id}', 'username': f'p{user_id}'},
+            'text': text,
+        }
+        if entities:
+            message['entities'] = entities
+        updates.append({'update_id': update_id, 'message': message})
+    return updates
+
+
+def total_queries() -> int:
+    return sum(histogram.count for histogram in query_seconds.values())
+
+
+def current_commit() -> str | None:
+    try:
+        completed = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],  # noqa: S603, S607 - fixed command
+            capture_output=True,
+            text=True,
+        )
+    except OSError:
+        return None
+    return completed.stdout.strip() if completed.returncode == 0 else None
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    request = FakeBotRequest(args.api_latency_ms / 1000, args.api_jitter_ms / 1000, args.seed)
+    application = main.build_application(block=True, request=request)
+    await application.initialize()
+    if application.post_init is not None:
+        await application.post_init(application)
+
+    raw_updates = generate_updates(args.updates, args.users, args.chats, args.seed)
+    queue: asyncio.Queue[Update] = asyncio.Queue()
+    for raw_update in raw_updates:
+        queue.put_nowait(Update.de_json(raw_update, application.bot))
+    latencies: list[float] = []
+
+    async def feed() -> None:
+        while not queue.empty():
+            update = queue.get_nowait()
+            started = time.perf_counter()
+            await application.process_update(update)
+            latencies.append(time.perf_counter() - started)
+
+    queries_before = total_queries()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(feed() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await application.shutdown()
+        if application.post_shutdown is not None:
+            await application.post_shutdown(application)
+    queries = total_queries() - queries_before
+
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'commit': current_commit(),
+        'started_at': datetime.now(UTC).isoformat(timespec='seconds'),
+        'database': engine.dialect.name,
+        'parameters': {
+            'updates': args.updates,
+            'users': args.users,
+            'chats': args.chats,
+            'concurrency': args.concurrency,
+            'api_latency_ms': args.api_latency_ms,
+            'seed': args.seed,
+        },
+        'updates_per_second': len(latencies) / elapsed,
+        'latency_ms': {'p50': percentiles[49] * 1000, 'p99': percentiles[98] * 1000, 'max': max(latencies) * 1000},
+        'queries_per_update': queries / len(latencies),
+        'bot_api_calls': dict(request.calls),
+        'handlers': {
+            name: {
+                'calls': metrics.seconds.count,
+                'errors': metrics.errors.value,
+                'mean_ms': metrics.seconds.sum / metrics.seconds.count * 1000,
+            }
+            for name, metrics in handler_metrics.items()
+            if metrics.seconds.count
+        },
+    }
+
+
+def report(result: dict[str, Any]) -> None:
+    latency = result['latency_ms']
+    print(
+        f'{result["parameters"]["updates"]} updates: {result["updates_per_second"]:.0f} updates/s, '
+        f'p50 {latency["p50"]:.1f} ms, p99 {latency["p99"]:.1f} ms, '
+        f'{result["queries_per_update"]:.2f} queries/update'
+    )
+    for name, handler in sorted(result['handlers'].items()):
+        print(f'  {name}: {handler["calls"]} calls, {handler["errors"]} errors, mean {handler["mean_ms"]:.1f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--updates', type=int, default=5_000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--chats', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=32, help='updates processed at the same time')
+    parser.add_argument('--api-latency-ms', type=float, default=30)
+    parser.add_argument('--api-jitter-ms', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', type=Path, default=RESULTS_PATH, help='JSON lines file the run is appended to')
+    arguments = parser.parse_args()
+    load_test_result = asyncio.run(run(arguments))
+    report(load_test_result)
+    arguments.output.parent.mkdir(parents=True, exist_ok=True)
+    with arguments.output.open('a') as output:
+        output.write(json.dumps(load_test_result, ensure_ascii=False) + '\n')
@@ -0,0 +1,82 @@
+"""Micro-benchmark of result parsing over a corpus of typical group messages.
+
+Compares the previous approach (``re.search`` with uncompiled patterns in every filter, a second search
+in the handler and separate ``in``/``count`` scans) with :func:`result_parser.parse_results`.
+
+    python benchmarks/parser_benchmark.py
+"""
+
+import re
+import sys
+import timeit
+from collections.abc import Callable
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import result_parser  # noqa: E402
+
+LEGACY_FRAMED_PATTERN = r'Framed #(?P<round>[\d]+)\n🎥(?P<result>(?: 🟥| 🟩| ⬛| ⬛️){6})\n\nhttps:\/\/framed\.wtf'
+LEGACY_EPISODE_PATTERN = r'Episode #(?P<round>[\d]+)\n📺(?P<result>(?: 🟥| 🟩| ⬛| ⬛️){10})\n\nhttps:\/\/episode\.wtf'
+
+CORPUS = [
+    'Framed #1024\n🎥 🟥 🟩 ⬛ ⬛ ⬛ ⬛\n\nhttps://framed.wtf',
+    'Framed #1024\n🎥 🟩 ⬛️ ⬛️ ⬛️ ⬛️ ⬛️\n\nhttps://framed.wtf',
+    'Framed #1024\n🎥 🟥 🟥 🟥 🟥 🟥 🟥\n\nhttps://framed.wtf',
+    'Episode #512\n📺 🟥 🟥 🟩 ⬛ ⬛ ⬛ ⬛ ⬛ ⬛ ⬛\n\nhttps://episode.wtf',
+    'Сегодня вообще без шансов, кадры какие-то тёмные',
+    'кто-нибудь понял, что за фильм во втором раунде?',
+    'Framed сегодня лёгкий',
+    'https://framed.wtf',
+    'ну я со второго кадра 😎',
+    'ахахах',
+    'Напоминаю, что в пятницу собираемся в 19:00 у входа в кинотеатр, билеты уже купил на всех, '
+    'кто отписался в чате. Если что-то поменяется — пишите заранее.',
+    'Мои результаты за сегодня:\nFramed #1024\n🎥 🟥 🟥 🟩 ⬛ ⬛ ⬛\n\nhttps://framed.wtf\n'
+    'Episode #512\n📺 🟩 ⬛ ⬛ ⬛ ⬛ ⬛ ⬛ ⬛ ⬛ ⬛\n\nhttps://episode.wtf',
+]
+
+
+def legacy_parse(text: str) -> list[tuple[int, bool, int | None]]:
+    results = []
+    for pattern in (LEGACY_FRAMED_PATTERN, LEGACY_EPISODE_PATTERN):
+        if re.search(pattern, text) is None:
+            continue
+        match = re.search(pattern, text)
+        if match is None:
+            continue
+        data_result = match.groupdict()['result']
+        data_won = '🟩' in data_result
+        data_win_frame = data_result.count('🟥') + 1 if data_won else None
+        results.append((int(match.groupdict()['round']), data_won, data_win_frame))
+    return results
+
+
+def single_pass_parse(text: str) -> tuple[result_parser.ParsedResult, ...]:
+    return result_parser.parse_results(text)
+
+
+def per_message(function: Callable[[str], object], corpus: list[str], number: int = 2_000) -> float:
+    """Best time over a few runs to parse one message of ``corpus``, in microseconds."""
+    elapsed = min(timeit.repeat(lambda: [function(text) for text in corpus], number=number, repeat=5))
+    return elapsed / (number * len(corpus)) * 1e6
+
+
+def main() -> None:
+    for legacy, parsed in zip(map(legacy_parse, CORPUS), map(single_pass_parse, CORPUS), strict=True):
+        if legacy != [(result.round, result.won, result.win_frame) for result in parsed]:
+            raise SystemExit(f'parsers disagree: {legacy} != {parsed}')
+
+    # Reported apart, because results and ordinary chat messages cost very different amounts.
+    kinds = {
+        'all': CORPUS,
+        'results': [text for text in CORPUS if legacy_parse(text)],
+        'chatter': [text for text in CORPUS if not legacy_parse(text)],
+    }
+    for name, function in (('legacy', legacy_parse), ('single pass', single_pass_parse)):
+        timings = ', '.join(f'{kind} {per_message(function, corpus):.2f}' for kind, corpus in kinds.items())
+        print(f'{name:>12}: {timings} µs per message')
+
+
+if __name__ == '__main__':
+    main()
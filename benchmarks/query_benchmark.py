@@ -0,0 +1,217 @@
+"""Time the /top boards and /stats on a synthetic dataset under several index strategies.
+
+Loads ``--users`` × ``--rounds`` results into the database from ``DB_CONNECTION_STRING`` (use a scratch
+database), then runs every query of :func:`benchmark_queries` with each of :data:`INDEX_STRATEGIES` and
+prints the median timings side by side. ``--explain`` adds the plans (``EXPLAIN ANALYZE`` on PostgreSQL),
+``--output`` writes everything as JSON. A strategy's index changes are rolled back after its run; on SQLite
+the script sends its own ``BEGIN`` so that the DDL is part of that transaction.
+
+    DB_CONNECTION_STRING=postgresql+asyncpg://... python benchmarks/query_benchmark.py --users 5000 --rounds 400
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault('BOT_TOKEN', 'benchmark')
+os.environ.setdefault('ADMIN_USER_ID', '0')
+
+from sqlalchemy import Float, Select, cast, event, func  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncConnection  # noqa: E402
+from tabulate import tabulate  # noqa: E402
+
+from benchmarks.dataset import DatasetShape, load_dataset  # noqa: E402
+from config import LATEST_ROUND_MIN_PLAYERS  # noqa: E402
+from games import FRAMED  # noqa: E402
+from models import GameResult, UserGameStats, init_db  # noqa: E402
+from models.db import engine  # noqa: E402
+
+BOARDS = {
+    'score': (UserGameStats.score, True),
+    'average frame': (cast(UserGameStats.win_frames_total, Float) / func.nullif(UserGameStats.wins, 0), False),
+    'rounds': (UserGameStats.rounds, True),
+    'won': (UserGameStats.wins, True),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class IndexStrategy:
+    """Indexes dropped from and added to the declared schema; plain DDL, so the models stay untouched."""
+
+    drop: tuple[str, ...] = ()
+    create: tuple[str, ...] = ()
+
+
+INDEX_STRATEGIES = {
+    'declared': IndexStrategy(),
+    'no stats score index': IndexStrategy(drop=('ix_user_game_stats_game_score',)),
+    'stats score + user id': IndexStrategy(
+        drop=('ix_user_game_stats_game_score',),
+        create=('CREATE INDEX bench_user_game_stats_game_score_user ON user_game_stats (game, score DESC, user_id)',),
+    ),
+    'round index, not covering': IndexStrategy(
+        drop=('ix_game_result_game_round',),
+        create=('CREATE INDEX bench_game_result_game_round ON game_result (game, framed_round)',),
+    ),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class QueryTiming:
+    query: str
+    strategy: str
+    median_ms: float
+    max_ms: float
+    plan: list[str]
+
+
+def benchmark_queries(shape: DatasetShape) -> dict[str, Select]:
+    """Every board for the global scope and for chat -1, the weekly score board and the queries of one /stats."""
+    queries = {}
+    for board, (score, descending) in BOARDS.items():
+        for scope, chat_id in (('global', None), ('chat', -1)):
+            queries[f'{board} / {scope}'] = UserGameStats.top_statement(FRAMED, chat_id, score, descending)
+    weekly_score = func.sum(GameResult.score_expression())
+    for scope, chat_id in (('global', None), ('chat', -1)):
+        queries[f'weekly score / {scope}'] = GameResult.top_between_statement(
+            FRAMED, shape.rounds - 6, shape.rounds, chat_id, weekly_score
+        )
+    user_id = shape.users // 2
+    queries['stats / totals'] = UserGameStats.user_totals_statement(user_id)
+    queries['stats / history'] = GameResult.user_columns_statement(user_id)
+    queries['stats / percentiles'] = UserGameStats.score_percentiles_statement(user_id)
+    queries['stats / latest round'] = GameResult.latest_round_statement(FRAMED, LATEST_ROUND_MIN_PLAYERS)
+    return queries
+
+
+def transactional_ddl() -> None:
+    """Make SQLite run DDL inside the transaction, so that a strategy's index changes can be rolled back.
+
+    The sqlite3 module only sends ``BEGIN`` before data changes, so ``DROP INDEX`` would commit on its own.
+    This is SQLAlchemy's recipe for the driver: turn its transaction handling off and begin explicitly.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine.sync_engine, 'connect')
+    def disable_driver_transactions(dbapi_connection, connection_record) -> None:
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, 'begin')
+    def begin(conn) -> None:
+        conn.exec_driver_sql('BEGIN')
+
+
+async def explain(conn: AsyncConnection, statement: Select) -> list[str]:
+    sql = str(statement.compile(engine, compile_kwargs={'literal_binds': True}))
+    if engine.dialect.name == 'postgresql':
+        result = await conn.exec_driver_sql(f'EXPLAIN (ANALYZE, BUFFERS) {sql}')
+        return [row[0] for row in result.all()]
+    result = await conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}')
+    return [str(row[-1]) for row in result.all()]
+
+
+async def time_statement(conn: AsyncConnection, statement: Select, repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await conn.execute(statement)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def run_strategy(
+    conn: AsyncConnection, name: str, strategy: IndexStrategy, queries: dict[str, Select], repeat: int
+) -> list[QueryTiming]:
+    transaction = await conn.begin()
+    try:
+        for index_name in strategy.drop:
+            await conn.exec_driver_sql(f'DROP INDEX {index_name}')
+        for ddl in strategy.create:
+            await conn.exec_driver_sql(ddl)
+        await conn.exec_driver_sql('ANALYZE')
+        timings = []
+        for query, statement in queries.items():
+            # The first run warms the caches and is not counted.
+            await conn.execute(statement)
+            samples = await time_statement(conn, statement, repeat)
+            timings.append(
+                QueryTiming(
+                    query, name, statistics.median(samples) * 1000, max(samples) * 1000, await explain(conn, statement)
+                )
+            )
+        return timings
+    finally:
+        await transaction.rollback()
+
+
+def report(timings: list[QueryTiming], show_plans: bool) -> None:
+    strategies = list(dict.fromkeys(timing.strategy for timing in timings))
+    medians = {(timing.query, timing.strategy): timing.median_ms for timing in timings}
+    queries = list(dict.fromkeys(timing.query for timing in timings))
+    print(
+        tabulate(
+            [[query, *(medians[query, strategy] for strategy in strategies)] for query in queries],
+            ('median, ms', *strategies),
+            floatfmt='.2f',
+            tablefmt='rounded_grid',
+        )
+    )
+    if show_plans:
+        for timing in timings:
+            print(f'\n== {timing.query} / {timing.strategy}: median {timing.median_ms:.2f} ms')
+            for line in timing.plan:
+                print(f'   {line}')
+
+
+async def main(args: argparse.Namespace) -> None:
+    shape = DatasetShape(users=args.users, rounds=args.rounds, chats=args.chats)
+    transactional_ddl()
+    await init_db()
+    if not args.skip_load:
+        started = time.perf_counter()
+        async with engine.begin() as conn:
+            inserted = await load_dataset(conn, shape)
+        print(f'loaded {inserted} results in {time.perf_counter() - started:.1f}s')
+
+    queries = benchmark_queries(shape)
+    strategies = args.strategy or list(INDEX_STRATEGIES)
+    timings = []
+    async with engine.connect() as conn:
+        for name in strategies:
+            timings.extend(await run_strategy(conn, name, INDEX_STRATEGIES[name], queries, args.repeat))
+    await engine.dispose()
+
+    report(timings, args.explain)
+    if args.output is not None:
+        args.output.write_text(
+            json.dumps(
+                {
+                    'dialect': engine.dialect.name,
+                    'shape': {'users': shape.users, 'rounds': shape.rounds, 'chats': shape.chats, 'seed': shape.seed},
+                    'timings': [asdict(timing) for timing in timings],
+                },
+                ensure_ascii=False,
+                indent=2,
+            )
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=5_000)
+    parser.add_argument('--rounds', type=int, default=400)
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--strategy', action='append', choices=INDEX_STRATEGIES, help='run only these strategies')
+    parser.add_argument('--explain', action='store_true', help='print the plan of every query')
+    parser.add_argument('--output', type=Path, help='write the timings and plans as JSON')
+    parser.add_argument('--skip-load', action='store_true', help='reuse data loaded by a previous run')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,152 @@
+"""Delivery of /announce messages to every group.
+
+Groups are sent to in id-ordered batches with a bounded number of messages in flight, so the
+``AIORateLimiter`` in front of the bot paces the sends instead of a sequential loop. Flood-control errors
+are retried after the delay Telegram asks for, network errors with exponential backoff. Groups that
+removed the bot are marked inactive and skipped by later broadcasts. Progress is saved after every batch,
+and broadcasts that were running when the bot stopped are resumed on the next start; a group in the batch
+that was interrupted may receive the message twice. A group that became a supergroup is sent to under its
+new id and moved there.
+"""
+
+import asyncio
+import contextlib
+import logging
+from datetime import timedelta
+from enum import Enum, auto
+
+from telegram import Bot
+from telegram.error import BadRequest, ChatMigrated, Forbidden, NetworkError, RetryAfter, TelegramError
+
+from config import BROADCAST_BATCH_SIZE, BROADCAST_CONCURRENCY, BROADCAST_MAX_RETRIES
+from metrics import Counter
+from models.broadcast import Broadcast
+from models.group import Group, group_cache
+
+logger = logging.getLogger(__name__)
+
+
+class Delivery(Enum):
+    DELIVERED = auto()
+    FAILED = auto()
+    # The bot can no longer post to the chat.
+    GONE = auto()
+
+
+def retry_delay(error: RetryAfter) -> float:
+    delay = error.retry_after
+    return delay.total_seconds() if isinstance(delay, timedelta) else delay
+
+
+class Broadcaster:
+    def __init__(self, concurrency: int, batch_size: int, max_retries: int, backoff: float = 1.0) -> None:
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.delivered = Counter('framed_bot_broadcast_delivered', 'Announcements delivered to a group')
+        self.failed = Counter('framed_bot_broadcast_failed', 'Announcements that could not be delivered')
+        self.retries = Counter('framed_bot_broadcast_retries', 'Announcement sends retried after an error')
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def start(self, bot: Bot, broadcast: Broadcast) -> None:
+        """Run the broadcast in the background and report to the admin when it is done."""
+        task = asyncio.create_task(self.run_and_report(bot, broadcast), name=f'Broadcast-{broadcast.id}')
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def stop(self) -> None:
+        """Cancel running broadcasts; they continue from their saved progress on the next start."""
+        for task in list(self._tasks):
+            task.cancel()
+        for task in list(self._tasks):
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    async def run_and_report(self, bot: Bot, broadcast: Broadcast) -> None:
+        try:
+            await self.run(bot, broadcast)
+        except Exception:
+            logger.exception('Broadcast %d stopped after group %s', broadcast.id, broadcast.last_group_id)
+            return
+        try:
+            await bot.send_message(
+                chat_id=broadcast.report_chat_id,
+                text=(
+                    f'Рассылка завершена: доставлено {broadcast.delivered}, не доставлено {broadcast.failed}, '
+                    f'бот удалён из {broadcast.deactivated} групп'
+                ),
+            )
+        except Exception:
+            logger.exception('Could not report the end of broadcast %d', broadcast.id)
+
+    async def run(self, bot: Bot, broadcast: Broadcast) -> Broadcast:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async for group_ids in Group.iter_ids(self.batch_size, after=broadcast.last_group_id):
+            migrated: dict[int, int] = {}
+            deliveries = await asyncio.gather(
+                *(self._deliver(bot, semaphore, group_id, broadcast.text, migrated) for group_id in group_ids)
+            )
+            for old_id, new_id in migrated.items():
+                await Group.migrate(old_id, new_id)
+            group_cache.forget(list(migrated))
+            gone = [
+                group_id for group_id, delivery in zip(group_ids, deliveries, strict=True) if delivery is Delivery.GONE
+            ]
+            await Group.deactivate(gone)
+            broadcast.delivered += deliveries.count(Delivery.DELIVERED)
+            broadcast.failed += deliveries.count(Delivery.FAILED)
+            broadcast.deactivated += len(gone)
+            broadcast.last_group_id = group_ids[-1]
+            await Broadcast.save_progress(broadcast)
+        broadcast.finished = True
+        await Broadcast.save_progress(broadcast)
+        return broadcast
+
+    async def _deliver(
+        self, bot: Bot, semaphore: asyncio.Semaphore, chat_id: int, text: str, migrated: dict[int, int]
+    ) -> Delivery:
+        """Send to one group; a group that became a supergroup is sent to again and recorded in ``migrated``."""
+        target = chat_id
+        attempt = 0
+        while True:
+            try:
+                async with semaphore:
+                    await bot.send_message(chat_id=target, text=text)
+            except RetryAfter as error:
+                delay = retry_delay(error)
+            except Forbidden:
+                return Delivery.GONE
+            except ChatMigrated as error:
+                if target != chat_id:
+                    logger.warning('Group %d migrated again after moving to %d', chat_id, target)
+                    return self._count(Delivery.FAILED)
+                target = migrated[chat_id] = error.new_chat_id
+                continue
+            except BadRequest as error:
+                if 'chat not found' in error.message.lower():
+                    return Delivery.GONE
+                logger.warning('Could not announce to %d: %s', chat_id, error.message)
+                return self._count(Delivery.FAILED)
+            except NetworkError:
+                delay = self.backoff * 2**attempt
+            except TelegramError as error:
+                logger.warning('Could not announce to %d: %s', chat_id, error.message)
+                return self._count(Delivery.FAILED)
+            else:
+                return self._count(Delivery.DELIVERED)
+            if attempt == self.max_retries:
+                break
+            attempt += 1
+            self.retries.inc()
+            # Sleep outside the semaphore, so other groups keep being served meanwhile.
+            await asyncio.sleep(delay)
+        logger.warning('Gave up announcing to %d after %d attempts', chat_id, self.max_retries + 1)
+        return self._count(Delivery.FAILED)
+
+    def _count(self, delivery: Delivery) -> Delivery:
+        (self.delivered if delivery is Delivery.DELIVERED else self.failed).inc()
+        return delivery
+
+
+broadcaster = Broadcaster(BROADCAST_CONCURRENCY, BROADCAST_BATCH_SIZE, BROADCAST_MAX_RETRIES)
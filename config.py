@@ -17,6 +17,79 @@ def _required_int_env(name: str) -> int:
         raise RuntimeError(f"Environment variable {name} must be an integer") from exc
 
 
+def _int_env(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError as exc:
+        raise RuntimeError(f"Environment variable {name} must be an integer") from exc
+
+
+def _bool_env(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise RuntimeError(f"Environment variable {name} must be a boolean")
+
+
 BOT_TOKEN: Final = _required_env("BOT_TOKEN")
 DB_CONNECTION_STRING: Final = _required_env("DB_CONNECTION_STRING")
 ADMIN_USER_ID: Final = _required_int_env("ADMIN_USER_ID")
+
+GROUP_CACHE_SIZE: Final = _int_env("GROUP_CACHE_SIZE", 10_000)
+GROUP_CACHE_FLUSH_INTERVAL: Final = _int_env("GROUP_CACHE_FLUSH_INTERVAL", 60)
+USER_CACHE_SIZE: Final = _int_env("USER_CACHE_SIZE", 50_000)
+
+INGEST_BATCH_SIZE: Final = _int_env("INGEST_BATCH_SIZE", 100)
+INGEST_LINGER_MS: Final = _int_env("INGEST_LINGER_MS", 20)
+INGEST_QUEUE_SIZE: Final = _int_env("INGEST_QUEUE_SIZE", 1000)
+
+LEADERBOARD_CACHE_TTL: Final = _int_env("LEADERBOARD_CACHE_TTL", 60)
+
+# Windowed /top boards count rounds, which are daily: a season is SEASON_LENGTH rounds from SEASON_FIRST_ROUND.
+SEASON_FIRST_ROUND: Final = _int_env("SEASON_FIRST_ROUND", 1)
+SEASON_LENGTH: Final = _int_env("SEASON_LENGTH", 91)
+# Windows end at the latest round posted by at least this many players, so one forged "#2000000000" cannot
+# move them past all real results.
+LATEST_ROUND_MIN_PLAYERS: Final = _int_env("LATEST_ROUND_MIN_PLAYERS", 3)
+
+BROADCAST_CONCURRENCY: Final = _int_env("BROADCAST_CONCURRENCY", 8)
+BROADCAST_BATCH_SIZE: Final = _int_env("BROADCAST_BATCH_SIZE", 100)
+BROADCAST_MAX_RETRIES: Final = _int_env("BROADCAST_MAX_RETRIES", 5)
+
+DELETION_QUEUE_PATH: Final = os.environ.get("DELETION_QUEUE_PATH") or "deletion_queue.bin"
+DELETION_TICK_SECONDS: Final = _int_env("DELETION_TICK_SECONDS", 5)
+
+# Webhook mode is used when WEBHOOK_URL is set, long polling otherwise.
+WEBHOOK_URL: Final = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_LISTEN: Final = os.environ.get("WEBHOOK_LISTEN") or "0.0.0.0"  # noqa: S104 - reached through a proxy
+WEBHOOK_PORT: Final = _int_env("WEBHOOK_PORT", 8080)
+WEBHOOK_SECRET_TOKEN: Final = os.environ.get("WEBHOOK_SECRET_TOKEN", "")
+# Seconds between metric summaries in the log; 0 turns them off. Webhook mode also serves /metrics to
+# requests with WEBHOOK_SECRET_TOKEN as their bearer token.
+METRICS_LOG_INTERVAL: Final = _int_env("METRICS_LOG_INTERVAL", 300)
+
+# "single" runs everything in one process. "ingress" only receives updates and queues them, and
+# WORKER_COUNT "worker" processes, numbered by WORKER_INDEX, handle the chats of their partition.
+BOT_MODE: Final = os.environ.get("BOT_MODE") or "single"
+WORKER_COUNT: Final = _int_env("WORKER_COUNT", 1)
+WORKER_INDEX: Final = _int_env("WORKER_INDEX", 0)
+UPDATE_QUEUE_BATCH_SIZE: Final = _int_env("UPDATE_QUEUE_BATCH_SIZE", 100)
+UPDATE_QUEUE_POLL_MS: Final = _int_env("UPDATE_QUEUE_POLL_MS", 200)
+
+# Connection pool of the PostgreSQL engine; SQLite keeps SQLAlchemy's defaults.
+DB_POOL_SIZE: Final = _int_env("DB_POOL_SIZE", 10)
+DB_MAX_OVERFLOW: Final = _int_env("DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT: Final = _int_env("DB_POOL_TIMEOUT", 30)
+DB_POOL_RECYCLE: Final = _int_env("DB_POOL_RECYCLE", 1800)
+DB_POOL_PRE_PING: Final = _bool_env("DB_POOL_PRE_PING", True)
+# Connections opened at startup, before the first update arrives.
+DB_POOL_WARMUP: Final = _int_env("DB_POOL_WARMUP", 4)
+# Prepared statements cached per connection; 0 behind a transaction-pooling PgBouncer.
+DB_STATEMENT_CACHE_SIZE: Final = _int_env("DB_STATEMENT_CACHE_SIZE", 100)
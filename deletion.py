@@ -0,0 +1,102 @@
+"""Delayed deletion of the bot's short-lived replies.
+
+Replies such as "Спасибо, записал" and /stats answers are removed after a while. Instead of a job and a
+``deleteMessage`` call per message, :class:`DeletionScheduler` puts them into time buckets one tick wide,
+and every tick deletes the due ones with one ``deleteMessages`` call per chat and up to 100 messages.
+Pending deletions are written to a small binary file, so replies sent before a restart are still removed.
+"""
+
+import logging
+import math
+import os
+import struct
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from telegram import Bot
+from telegram.constants import BulkRequestLimit
+from telegram.error import TelegramError
+
+from config import DELETION_QUEUE_PATH, DELETION_TICK_SECONDS
+from metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+# File header, then one (chat_id, message_id, due unix time) record per pending message.
+FILE_MAGIC = b'FBDQ1'
+RECORD = struct.Struct('<qiI')
+
+
+class DeletionScheduler:
+    def __init__(self, path: Path, tick: float) -> None:
+        self.path = path
+        self.tick = tick
+        self.backlog = Gauge('framed_bot_deletion_backlog', 'Messages waiting to be deleted')
+        self.deleted = Counter('framed_bot_deletion_deleted', 'Messages passed to deleteMessages')
+        self.failures = Counter('framed_bot_deletion_failures', 'Messages whose deleteMessages call failed')
+        self._buckets: dict[int, list[tuple[int, int]]] = defaultdict(list)
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._buckets.values())
+
+    def schedule(self, chat_id: int, message_id: int, delay: float, now: float | None = None) -> None:
+        """Delete the message ``delay`` seconds from now, rounded up to the next tick."""
+        due = (time.time() if now is None else now) + delay
+        self._buckets[math.ceil(due / self.tick)].append((chat_id, message_id))
+        self._dirty = True
+        self.backlog.set(len(self))
+
+    def pop_due(self, now: float | None = None) -> dict[int, list[int]]:
+        """Remove the due messages and return them grouped by chat."""
+        current = math.floor((time.time() if now is None else now) / self.tick)
+        due_by_chat: dict[int, list[int]] = defaultdict(list)
+        for bucket in sorted(bucket for bucket in self._buckets if bucket <= current):
+            for chat_id, message_id in self._buckets.pop(bucket):
+                due_by_chat[chat_id].append(message_id)
+        if due_by_chat:
+            self._dirty = True
+            self.backlog.set(len(self))
+        return due_by_chat
+
+    async def flush(self, bot: Bot, now: float | None = None) -> None:
+        for chat_id, message_ids in self.pop_due(now).items():
+            for start in range(0, len(message_ids), BulkRequestLimit.MAX_LIMIT):
+                chunk = message_ids[start : start + BulkRequestLimit.MAX_LIMIT]
+                try:
+                    await bot.delete_messages(chat_id, chunk)
+                except TelegramError:
+                    # Not retried: the messages may be gone already or too old to delete.
+                    logger.warning('Could not delete %d messages in %d', len(chunk), chat_id, exc_info=True)
+                    self.failures.inc(len(chunk))
+                else:
+                    self.deleted.inc(len(chunk))
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        records = b''.join(
+            RECORD.pack(chat_id, message_id, math.ceil(bucket * self.tick))
+            for bucket, entries in self._buckets.items()
+            for chat_id, message_id in entries
+        )
+        temporary = self.path.with_name(self.path.name + '.tmp')
+        temporary.write_bytes(FILE_MAGIC + records)
+        os.replace(temporary, self.path)
+        self._dirty = False
+
+    def load(self) -> None:
+        try:
+            data = self.path.read_bytes()
+        except FileNotFoundError:
+            return
+        if not data.startswith(FILE_MAGIC):
+            logger.warning('Ignoring %s: not a deletion queue file', self.path)
+            return
+        for chat_id, message_id, due in RECORD.iter_unpack(data[len(FILE_MAGIC) :]):
+            self._buckets[math.ceil(due / self.tick)].append((chat_id, message_id))
+        self.backlog.set(len(self))
+
+
+deletion_scheduler = DeletionScheduler(Path(DELETION_QUEUE_PATH), DELETION_TICK_SECONDS)
@@ -0,0 +1,63 @@
+"""Export of raw results as gzip-compressed CSV or as Parquet.
+
+Rows come from :meth:`GameResult.stream_rows` in chunks read through a server-side cursor, and each chunk
+is written out before the next one is fetched, so memory does not grow with the size of the export.
+Compressing and writing a chunk runs in a thread, so the bot keeps handling updates meanwhile.
+Parquet needs ``pyarrow``, which is not a dependency of the bot: install it next to it to export Parquet.
+"""
+
+import asyncio
+import csv
+import gzip
+import io
+from collections.abc import AsyncIterator, Sequence
+from pathlib import Path
+from typing import Any, BinaryIO
+
+COLUMNS = ('game', 'round', 'won', 'win_frame', 'user_id', 'player', 'chat_id')
+CHUNK_SIZE = 5000
+
+
+async def write_csv(chunks: AsyncIterator[Sequence[Sequence[Any]]], file: BinaryIO) -> int:
+    """Write the rows as gzip-compressed CSV with a header line and return how many were written."""
+    written = 0
+    with (
+        gzip.GzipFile(fileobj=file, mode='wb') as compressed,
+        io.TextIOWrapper(compressed, encoding='utf-8', newline='') as text,
+    ):
+        writer = csv.writer(text)
+        writer.writerow(COLUMNS)
+        async for chunk in chunks:
+            await asyncio.to_thread(writer.writerows, chunk)
+            written += len(chunk)
+    # GzipFile leaves a file object it was given open, so the caller can still send it.
+    return written
+
+
+async def write_parquet(chunks: AsyncIterator[Sequence[Sequence[Any]]], path: Path) -> int:
+    """Write the rows to a Parquet file, one row group per chunk, and return how many were written."""
+    # Optional dependency, imported only when a Parquet file is asked for.
+    try:
+        import pyarrow as pa  # ty: ignore[unresolved-import]
+        import pyarrow.parquet as pq  # ty: ignore[unresolved-import]
+    except ImportError as exc:
+        raise RuntimeError('Parquet export needs pyarrow: uv pip install pyarrow') from exc
+
+    schema = pa.schema(
+        [
+            ('game', pa.string()),
+            ('round', pa.int32()),
+            ('won', pa.bool_()),
+            ('win_frame', pa.int8()),
+            ('user_id', pa.int64()),
+            ('player', pa.string()),
+            ('chat_id', pa.int64()),
+        ]
+    )
+    written = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        async for chunk in chunks:
+            columns: list[list[Any]] = [list(column) for column in zip(*chunk, strict=True)]
+            await asyncio.to_thread(writer.write_batch, pa.record_batch(columns, schema=schema))
+            written += len(chunk)
+    return written
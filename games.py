@@ -0,0 +1,58 @@
+"""Registry of supported *.wtf games.
+
+A game is described once here; the parser, the result storage and the stats text are driven by the
+registry, so enabling another game does not need a new filter, handler or table.
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class GameSpec:
+    slug: str
+    header: str
+    emoji: str
+    host: str
+    grid_length: int
+    guessed_forms: tuple[str, str, str]
+    loss_score: int = 1
+
+    def score(self, won: bool, win_frame: int | None) -> int:
+        """Guessing on the first frame scores ``grid_length`` points, one point less for every next frame."""
+        if not won or win_frame is None:
+            return self.loss_score
+        return self.grid_length + 1 - win_frame
+
+
+GAMES: dict[str, GameSpec] = {}
+GAMES_BY_HEADER: dict[str, GameSpec] = {}
+
+
+def register_game(game: GameSpec) -> GameSpec:
+    if game.slug in GAMES or game.header in GAMES_BY_HEADER:
+        raise ValueError(f'game {game.slug} is already registered')
+    GAMES[game.slug] = game
+    GAMES_BY_HEADER[game.header] = game
+    return game
+
+
+FRAMED = register_game(
+    GameSpec(
+        slug='framed',
+        header='Framed',
+        emoji='🎥',
+        host='framed.wtf',
+        grid_length=6,
+        guessed_forms=('фильм', 'фильма', 'фильмов'),
+    )
+)
+EPISODE = register_game(
+    GameSpec(
+        slug='episode',
+        header='Episode',
+        emoji='📺',
+        host='episode.wtf',
+        grid_length=10,
+        guessed_forms=('сериал', 'сериала', 'сериалов'),
+    )
+)
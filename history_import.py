@@ -0,0 +1,253 @@
+"""Import of results pasted into a chat before the bot joined it, from a Telegram Desktop JSON export.
+
+Exports of busy groups run into hundreds of megabytes, so :class:`JsonStream` decodes the file in chunks
+and hands out one message at a time. Every message goes through :func:`result_parser.parse_results`,
+like in the bot. Results are written in batches through :meth:`GameResult.save_results`, so the unique
+index decides what is a duplicate, exactly as for live messages. Each batch commits together with a
+checkpoint of the last message it covered; an interrupted import continues after that message.
+"""
+
+import codecs
+import json
+import logging
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from models import GameResult, PersistedData, User
+from models.db import ResultRow, unit_of_work
+from result_parser import parse_results
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KIND = 'history_import'
+WHITESPACE = ' \t\r\n'
+DECODER = json.JSONDecoder()
+# Telegram Desktop drops the -100 prefix of supergroup and channel ids.
+SUPERGROUP_TYPES = ('private_supergroup', 'public_supergroup', 'private_channel', 'public_channel')
+# Characters one value may take. A message is at most a few kilobytes of text and entities, so a value
+# that is still incomplete past this is malformed JSON, not a long message.
+MAX_VALUE_SIZE = 1 << 20
+
+
+class JsonStream:
+    """Pull-style reader of one JSON document, holding at most one value and one chunk in memory."""
+
+    def __init__(self, file: BinaryIO, chunk_size: int = 1 << 16, max_value_size: int = MAX_VALUE_SIZE) -> None:
+        self.file = file
+        self.chunk_size = chunk_size
+        self.max_value_size = max_value_size
+        self.bytes_read = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._position = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        self.bytes_read += len(chunk)
+        self._eof = not chunk
+        self._buffer = self._buffer[self._position :] + self._decoder.decode(chunk, final=self._eof)
+        self._position = 0
+        return bool(chunk)
+
+    def _byte_offset(self, index: int) -> int:
+        """Offset in the file of the character at ``index`` of the buffer."""
+        undecoded, _ = self._decoder.getstate()
+        return self.bytes_read - len(undecoded) - len(self._buffer[index:].encode())
+
+    def peek(self) -> str:
+        """Next character that is not whitespace, without consuming it."""
+        while True:
+            while self._position < len(self._buffer) and self._buffer[self._position] in WHITESPACE:
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._fill():
+                raise ValueError('unexpected end of the JSON document')
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f'expected {char!r}, found {found!r} at byte {self._byte_offset(self._position)}')
+        self._position += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError as error:
+                # More input only helps a value that is cut off, and no value is longer than the limit.
+                if len(self._buffer) - self._position <= self.max_value_size and self._fill():
+                    continue
+                raise ValueError(f'{error.msg} at byte {self._byte_offset(error.pos)}') from error
+            # A number that ends the buffer may continue in the next chunk.
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._position = end
+            return value
+
+    def members(self) -> Iterator[str]:
+        """Keys of the object at the current position; the caller reads or streams each value."""
+        self.expect('{')
+        if self.peek() == '}':
+            self._position += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self._position += 1
+                continue
+            self.expect('}')
+            return
+
+    def items(self) -> Iterator[Any]:
+        """Elements of the array at the current position, decoded one at a time."""
+        self.expect('[')
+        if self.peek() == ']':
+            self._position += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ',':
+                self._position += 1
+                continue
+            self.expect(']')
+            return
+
+
+@dataclass
+class ChatExport:
+    """Chat fields of an export, filled in while its messages are streamed; Telegram writes them first."""
+
+    fields: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def chat_id(self) -> int:
+        if 'id' not in self.fields:
+            raise ValueError('not a single chat export: the chat id is missing before the messages')
+        if self.fields.get('type') in SUPERGROUP_TYPES:
+            return int(f'-100{self.fields["id"]}')
+        if self.fields.get('type') == 'private_group':
+            return -int(self.fields['id'])
+        return int(self.fields['id'])
+
+
+def stream_messages(stream: JsonStream, export: ChatExport) -> Iterator[dict[str, Any]]:
+    for key in stream.members():
+        if key == 'messages':
+            yield from stream.items()
+        else:
+            export.fields[key] = stream.value()
+
+
+def message_text(message: dict[str, Any]) -> str:
+    """Plain text of a message; formatted text is exported as a list of strings and entity objects."""
+    text = message.get('text', '')
+    if isinstance(text, str):
+        return text
+    return ''.join(part if isinstance(part, str) else part.get('text', '') for part in text)
+
+
+def sender_id(message: dict[str, Any]) -> int | None:
+    from_id = message.get('from_id')
+    if not isinstance(from_id, str) or not from_id.startswith('user'):
+        return None
+    return int(from_id.removeprefix('user'))
+
+
+@dataclass
+class ImportProgress:
+    messages: int = 0
+    results: int = 0
+    saved: int = 0
+    skipped: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def duplicates(self) -> int:
+        return self.results - self.saved
+
+
+class HistoryImporter:
+    def __init__(self, batch_size: int = 2000, progress_interval: float = 5) -> None:
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+
+    async def run(self, path: Path) -> ImportProgress:
+        progress = ImportProgress()
+        total_bytes = path.stat().st_size
+        export = ChatExport()
+        rows: list[ResultRow] = []
+        full_names: dict[int, str] = {}
+        resume_after: int | None = None
+        last_message_id = 0
+        last_report = progress.started
+        with path.open('rb') as file:
+            stream = JsonStream(file)
+            for message in stream_messages(stream, export):
+                progress.messages += 1
+                if resume_after is None:
+                    resume_after = await self._checkpoint(export.chat_id)
+                    if resume_after:
+                        logger.info('Resuming after message %d', resume_after)
+                if message.get('id', 0) <= resume_after:
+                    progress.skipped += 1
+                    continue
+                last_message_id = message['id']
+                user_id = sender_id(message)
+                if message.get('type') != 'message' or user_id is None:
+                    continue
+                for result in parse_results(message_text(message)):
+                    rows.append(
+                        ResultRow(result.game.slug, user_id, result.round, result.won, result.win_frame, export.chat_id)
+                    )
+                    full_names[user_id] = message.get('from') or str(user_id)
+                if len(rows) >= self.batch_size:
+                    await self._write(export.chat_id, rows, full_names, last_message_id, progress)
+                    rows, full_names = [], {}
+                if time.monotonic() - last_report >= self.progress_interval:
+                    last_report = time.monotonic()
+                    self._report(progress, stream.bytes_read, total_bytes)
+            if last_message_id:
+                await self._write(export.chat_id, rows, full_names, last_message_id, progress)
+            self._report(progress, stream.bytes_read, total_bytes)
+        return progress
+
+    @staticmethod
+    async def _checkpoint(chat_id: int) -> int:
+        data = (await PersistedData.load(CHECKPOINT_KIND)).get(str(chat_id))
+        return json.loads(data)['message_id'] if data is not None else 0
+
+    @staticmethod
+    async def _write(
+        chat_id: int, rows: list[ResultRow], full_names: dict[int, str], message_id: int, progress: ImportProgress
+    ) -> None:
+        """Write a batch and move the checkpoint past it in one transaction."""
+        async with unit_of_work():
+            await User.add_missing(full_names)
+            saved = await GameResult.save_results(rows)
+            checkpoint = json.dumps({'message_id': message_id}).encode()
+            await PersistedData.write({(CHECKPOINT_KIND, str(chat_id)): checkpoint})
+        progress.results += len(rows)
+        progress.saved += sum(saved)
+
+    @staticmethod
+    def _report(progress: ImportProgress, bytes_read: int, total_bytes: int) -> None:
+        elapsed = max(time.monotonic() - progress.started, 1e-9)
+        logger.info(
+            '%.0f%%: %d messages (%.0f/s), %d results saved, %d duplicates, %d skipped as already imported',
+            100 * bytes_read / total_bytes if total_bytes else 100,
+            progress.messages,
+            progress.messages / elapsed,
+            progress.saved,
+            progress.duplicates,
+            progress.skipped,
+        )
@@ -0,0 +1,151 @@
+"""Micro-batching of result writes.
+
+During the daily rush hundreds of results arrive within minutes. Instead of a transaction per message,
+:class:`ResultIngestor` collects results for a few milliseconds (or until a batch is full) and writes
+each batch with one multi-row insert per result table. Every caller still learns whether its own
+result was saved or was a duplicate.
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Protocol
+
+from config import INGEST_BATCH_SIZE, INGEST_LINGER_MS, INGEST_QUEUE_SIZE
+from metrics import Counter, Histogram
+from models.db import ResultRow
+
+logger = logging.getLogger(__name__)
+
+
+class ResultSaver(Protocol):
+    @staticmethod
+    async def save_results(rows: Sequence[ResultRow]) -> list[bool]: ...
+
+
+@dataclass(frozen=True, slots=True)
+class PendingResult:
+    model: type[ResultSaver]
+    row: ResultRow
+    future: asyncio.Future[bool]
+
+
+class ResultIngestor:
+    def __init__(self, batch_size: int, linger: float, queue_size: int) -> None:
+        self.batch_size = batch_size
+        self.linger = linger
+        self.queue_size = queue_size
+        self.batch_sizes = Histogram(
+            'framed_bot_ingest_batch_size', 'Results written per batch', (1, 2, 5, 10, 25, 50, 100, 250, 500)
+        )
+        self.flush_seconds = Histogram(
+            'framed_bot_ingest_flush_seconds',
+            'Time spent writing one batch',
+            (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+        )
+        self.flush_errors = Counter('framed_bot_ingest_flush_errors', 'Batches or retried rows that failed to write')
+        self._queue: asyncio.Queue[PendingResult] | None = None
+        self._worker: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue(self.queue_size)
+        self._worker = asyncio.create_task(self._run(self._queue), name='ResultIngestor')
+
+    async def stop(self) -> None:
+        """Write everything already queued, then stop the worker."""
+        if self._queue is None or self._worker is None:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._worker
+        self._queue = None
+        self._worker = None
+
+    async def submit(self, model: type[ResultSaver], row: ResultRow) -> bool:
+        """Queue a result and wait until its batch is written.
+
+        Blocks while the queue is full, so a stalled database slows handlers down instead of
+        growing memory. Without a running worker the row is written directly.
+        """
+        if self._queue is None:
+            [saved] = await model.save_results([row])
+            return saved
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(PendingResult(model=model, row=row, future=future))
+        return await future
+
+    async def _collect(self, queue: asyncio.Queue[PendingResult]) -> list[PendingResult]:
+        batch = [await queue.get()]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except TimeoutError:
+                break
+        return batch
+
+    async def _run(self, queue: asyncio.Queue[PendingResult]) -> None:
+        while True:
+            batch = await self._collect(queue)
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _flush(self, batch: list[PendingResult]) -> None:
+        started = time.perf_counter()
+        by_model: dict[type[ResultSaver], list[PendingResult]] = {}
+        for pending in batch:
+            by_model.setdefault(pending.model, []).append(pending)
+
+        for model, pending_results in by_model.items():
+            error = await self._write(model, pending_results)
+            if error is None:
+                continue
+            if len(pending_results) == 1:
+                self._fail(pending_results, error)
+                continue
+            # One bad row rejects the whole statement; written one by one, only that row fails.
+            for pending in pending_results:
+                error = await self._write(model, [pending])
+                if error is not None:
+                    self._fail([pending], error)
+
+        self.batch_sizes.observe(len(batch))
+        self.flush_seconds.observe(time.perf_counter() - started)
+
+    async def _write(self, model: type[ResultSaver], pending_results: list[PendingResult]) -> Exception | None:
+        try:
+            statuses = await model.save_results([pending.row for pending in pending_results])
+        except Exception as exc:
+            self.flush_errors.inc()
+            logger.exception('Failed to write %d results', len(pending_results))
+            return exc
+        for pending, saved in zip(pending_results, statuses, strict=True):
+            if not pending.future.done():
+                pending.future.set_result(saved)
+        return None
+
+    @staticmethod
+    def _fail(pending_results: list[PendingResult], error: Exception) -> None:
+        for pending in pending_results:
+            if not pending.future.done():
+                pending.future.set_exception(error)
+
+
+result_ingestor = ResultIngestor(INGEST_BATCH_SIZE, INGEST_LINGER_MS / 1000, INGEST_QUEUE_SIZE)
@@ -0,0 +1,109 @@
+"""Latency, in-flight and error metrics for the handlers and for every SQL statement.
+
+:func:`instrumented` wraps a handler callback, :func:`instrument_engine` hooks the engine's cursor events.
+A measurement is two ``perf_counter`` calls and a bisect into fixed buckets, cheap enough to stay on in
+production. The metrics are served on ``/metrics`` in webhook mode and logged by :func:`log_metrics`.
+"""
+
+import functools
+import logging
+import re
+import time
+from collections.abc import Callable, Coroutine
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, ExecutionContext
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from metrics import Counter, Gauge, Histogram, summarize
+
+logger = logging.getLogger(__name__)
+
+HANDLER_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+# First table a statement reads from or writes to.
+TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+"?(\w+)', re.IGNORECASE)
+
+
+class HandlerMetrics:
+    def __init__(self, name: str) -> None:
+        labels = {'handler': name}
+        self.seconds = Histogram('framed_bot_handler_seconds', 'Time spent in a handler', HANDLER_BUCKETS, labels)
+        self.in_flight = Gauge('framed_bot_handler_in_flight', 'Handler calls currently running', labels)
+        self.errors = Counter('framed_bot_handler_errors', 'Handler calls that raised', labels)
+
+
+handler_metrics: dict[str, HandlerMetrics] = {}
+query_seconds: dict[str, Histogram] = {}
+query_errors = Counter('framed_bot_db_query_errors', 'Statements that failed')
+
+
+def instrumented[**P](callback: Callable[P, Coroutine[Any, Any, None]]) -> Callable[P, Coroutine[Any, Any, None]]:
+    """Record latency, concurrency and errors of a handler callback under its name."""
+    name = getattr(callback, '__name__', repr(callback))
+    metrics = handler_metrics.get(name)
+    if metrics is None:
+        metrics = handler_metrics[name] = HandlerMetrics(name)
+
+    @functools.wraps(callback)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> None:
+        metrics.in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await callback(*args, **kwargs)
+        except Exception:
+            metrics.errors.inc()
+            raise
+        finally:
+            metrics.seconds.observe(time.perf_counter() - started)
+            metrics.in_flight.dec()
+
+    return wrapper
+
+
+@functools.lru_cache(maxsize=1024)
+def query_label(statement: str) -> str:
+    """``<verb> <table>``, e.g. ``select user_game_stats``; multi-row inserts of any size share a label."""
+    verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else 'unknown'
+    table = TABLE_PATTERN.search(statement)
+    return f'{verb} {table[1]}' if table is not None else verb
+
+
+def query_histogram(label: str) -> Histogram:
+    histogram = query_seconds.get(label)
+    if histogram is None:
+        histogram = query_seconds[label] = Histogram(
+            'framed_bot_db_query_seconds', 'Time spent executing a statement', QUERY_BUCKETS, {'query': label}
+        )
+    return histogram
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Time every statement of ``engine``; ``execution_options(query_label=...)`` overrides the derived label."""
+
+    @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(
+        conn: Connection, _cursor: Any, _statement: str, _parameters: Any, _context: ExecutionContext, _many: bool
+    ) -> None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(
+        conn: Connection, _cursor: Any, statement: str, _parameters: Any, context: ExecutionContext, _many: bool
+    ) -> None:
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        label = context.execution_options.get('query_label') or query_label(statement)
+        query_histogram(label).observe(elapsed)
+
+    @event.listens_for(engine.sync_engine, 'handle_error')
+    def handle_error(exception_context: Any) -> None:
+        query_errors.inc()
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('query_started'):
+            connection.info['query_started'].pop()
+
+
+def log_metrics() -> None:
+    for line in summarize():
+        logger.info('%s', line)
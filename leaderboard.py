@@ -0,0 +1,69 @@
+"""Cache of rendered leaderboards behind /top and its inline buttons."""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable, Hashable
+
+from config import LEADERBOARD_CACHE_TTL
+from metrics import Counter
+
+# (board type and window, game slug, scope)
+type LeaderboardKey = tuple[Hashable, str, Hashable]
+
+
+class LeaderboardCache:
+    """TTL cache of rendered board text with single-flight loading.
+
+    Concurrent requests for the same board share one query. Saving a result invalidates the boards of its
+    game, and a load that was already running when the invalidation happened is not stored.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self.hits = Counter('framed_bot_leaderboard_cache_hits', 'Boards served from the cache')
+        self.misses = Counter('framed_bot_leaderboard_cache_misses', 'Boards rendered from the database')
+        self.shared_loads = Counter('framed_bot_leaderboard_cache_shared_loads', 'Requests that joined a running load')
+        self._entries: dict[LeaderboardKey, tuple[float, str]] = {}
+        self._in_flight: dict[LeaderboardKey, asyncio.Future[str]] = {}
+        self._generations: dict[str, int] = {}
+
+    async def get(self, key: LeaderboardKey, render: Callable[[], Awaitable[str]]) -> str:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits.inc()
+            return entry[1]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.shared_loads.inc()
+            return await asyncio.shield(in_flight)
+
+        self.misses.inc()
+        _, game, _ = key
+        generation = self._generations.get(game, 0)
+        future: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            text = await render()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark the error as retrieved, there may be no waiters to do it.
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+        future.set_result(text)
+        if self._generations.get(game, 0) == generation:
+            self._entries[key] = (time.monotonic() + self.ttl, text)
+        return text
+
+    def invalidate(self, game: str) -> None:
+        self._generations[game] = self._generations.get(game, 0) + 1
+        for key in [key for key in self._entries if key[1] == game]:
+            del self._entries[key]
+
+
+leaderboard_cache = LeaderboardCache(LEADERBOARD_CACHE_TTL)
@@ -1,12 +1,13 @@
-import json
+import asyncio
 import logging
 import re
-from datetime import timedelta
+import tempfile
 from enum import IntEnum
-from typing import Protocol
+from typing import Any
 
 from tabulate import tabulate
 from telegram import (
+    Chat,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
     MessageEntity,
@@ -16,37 +17,72 @@ from telegram import (
 from telegram import (
     Message as TelegramMessage,
 )
-from telegram.constants import ReactionEmoji
+from telegram.constants import ChatMemberStatus, FileSizeLimit, ReactionEmoji
 from telegram.error import TelegramError
 from telegram.ext import (
     AIORateLimiter,
     Application,
     ApplicationBuilder,
+    BasePersistence,
     CallbackQueryHandler,
     CommandHandler,
     ContextTypes,
     ExtBot,
     JobQueue,
     MessageHandler,
-    PicklePersistence,
+    TypeHandler,
     filters,
 )
 from telegram.ext.filters import Message, MessageFilter
-
-from config import ADMIN_USER_ID, BOT_TOKEN
-from models import FramedResult, User, init_db
-from models.episode_result import EpisodeResult
-from models.group import Group
-from stats import Stats, count_stats
+from telegram.request import BaseRequest
+
+import webhook
+from broadcast import broadcaster
+from config import (
+    ADMIN_USER_ID,
+    BOT_MODE,
+    BOT_TOKEN,
+    DELETION_TICK_SECONDS,
+    GROUP_CACHE_FLUSH_INTERVAL,
+    LATEST_ROUND_MIN_PLAYERS,
+    METRICS_LOG_INTERVAL,
+    SEASON_FIRST_ROUND,
+    SEASON_LENGTH,
+    UPDATE_QUEUE_BATCH_SIZE,
+    UPDATE_QUEUE_POLL_MS,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_URL,
+    WORKER_COUNT,
+    WORKER_INDEX,
+)
+from deletion import deletion_scheduler
+from export import CHUNK_SIZE as EXPORT_CHUNK_SIZE
+from export import write_csv
+from games import FRAMED, GAMES
+from ingest import ResultSaver, result_ingestor
+from instrumentation import instrumented, log_metrics
+from leaderboard import leaderboard_cache
+from models import Broadcast, GameResult, QueuedUpdate, User, UserGameStats, init_db
+from models.db import ResultRow, unit_of_work
+from models.group import group_cache
+from persistence import DatabasePersistence
+from result_parser import ParsedResult, parse_results
+from stats import RECENT_ROUNDS, Stats, user_detailed_stats
+from workers import UpdateForwarder, UpdateQueue, UpdateWorker, partition_of, serve_worker
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 
-framed_pattern = r'Framed #(?P<round>[\d]+)\n🎥(?P<result>(?: 🟥| 🟩| ⬛| ⬛️){6})\n\nhttps:\/\/framed\.wtf'
-episode_pattern = r'Episode #(?P<round>[\d]+)\n📺(?P<result>(?: 🟥| 🟩| ⬛| ⬛️){10})\n\nhttps:\/\/episode\.wtf'
 saved_result_reaction = ReactionTypeEmoji(ReactionEmoji.THUMBS_UP)
 first_frame_saved_result_reaction = ReactionTypeEmoji(ReactionEmoji.TROPHY)
 duplicate_result_reaction = ReactionTypeEmoji(ReactionEmoji.THUMBS_DOWN)
 
+# Seconds before the bot's replies (and the /stats command) are deleted.
+REPLY_LIFETIME = 30
+# Largest document a bot may upload.
+MAX_EXPORT_SIZE = FileSizeLimit.FILESIZE_UPLOAD
+
 
 def saved_reaction_for(win_frame: int | None) -> ReactionTypeEmoji:
     return first_frame_saved_result_reaction if win_frame == 1 else saved_result_reaction
@@ -59,36 +95,67 @@ class TopType(IntEnum):
     TOP_ROUNDS = 4
 
 
-class FramedFilter(MessageFilter):
-    def filter(self, message: Message):
-        return message.text is not None and re.search(framed_pattern, message.text) is not None
+class TopWindow(IntEnum):
+    ALL_TIME = 0
+    WEEK = 1
+    MONTH = 2
+    SEASON = 3
 
 
-FRAMED_FILTER = FramedFilter(name='FramedFilter')
+# Rounds are daily, so a week is the last 7 of them.
+WINDOW_LENGTHS = {TopWindow.WEEK: 7, TopWindow.MONTH: 30}
 
+# ``top:<type>:<window>``; buttons sent before windows existed carry ``{"top": <type>}``.
+TOP_CALLBACK_PATTERN = re.compile(r'^(?:top:(?P<type>\d+):(?P<window>\d+)|\{"top": (?P<legacy_type>\d+)\})$')
 
-class EpisodeFilter(MessageFilter):
-    def filter(self, message: Message):
-        return message.text is not None and re.search(episode_pattern, message.text) is not None
 
+def top_callback_data(top_type: TopType, window: TopWindow) -> str:
+    return f'top:{top_type}:{window}'
 
-EPISODE_FILTER = EpisodeFilter(name='EpisodeFilter')
 
+def parse_top_callback(data: str) -> tuple[TopType, TopWindow] | None:
+    match = TOP_CALLBACK_PATTERN.match(data)
+    if match is None:
+        return None
+    try:
+        if match['legacy_type'] is not None:
+            return TopType(int(match['legacy_type'])), TopWindow.ALL_TIME
+        return TopType(int(match['type'])), TopWindow(int(match['window']))
+    except ValueError:
+        return None
 
-class ResultSaver(Protocol):
-    @staticmethod
-    async def save_result(user_id: int, framed_round: int, won: bool, win_frame: int | None) -> bool: ...
 
+def window_rounds(window: TopWindow, latest_round: int) -> tuple[int, int]:
+    """First and last round of a window that ends with ``latest_round``."""
+    if window is TopWindow.SEASON:
+        season = max(latest_round - SEASON_FIRST_ROUND, 0) // SEASON_LENGTH
+        return SEASON_FIRST_ROUND + season * SEASON_LENGTH, latest_round
+    return max(latest_round - WINDOW_LENGTHS[window] + 1, 1), latest_round
 
-async def delete_message_task(context: ContextTypes.DEFAULT_TYPE):
-    job = context.job
-    if job is None:
-        return
-    chat_id = job.chat_id
-    message_id = job.data
-    if chat_id is None or not isinstance(message_id, int):
-        return
-    await context.bot.delete_message(chat_id, message_id)
+
+class GameResultFilter(MessageFilter):
+    """Data filter that hands the parsed results to the handler as ``context.parsed_results``."""
+
+    def filter(self, message: Message):
+        if message.text is None:
+            return False
+        results = parse_results(message.text)
+        if not results:
+            return False
+        return {'parsed_results': list(results)}
+
+
+GAME_RESULT_FILTER = GameResultFilter(name='GameResultFilter', data_filter=True)
+
+
+def parsed_results_for(update: Update, context: ContextTypes.DEFAULT_TYPE) -> list[ParsedResult]:
+    parsed_results: list[ParsedResult] | None = getattr(context, 'parsed_results', None)
+    if parsed_results is not None:
+        return parsed_results
+    message = update.message
+    if message is None or message.text is None:
+        return []
+    return list(parse_results(message.text))
 
 
 def pluralize(count: int, first_form: str, second_form: str, third_form: str):
@@ -109,28 +176,28 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def save_results(
     update: Update,
     context: ContextTypes.DEFAULT_TYPE,
-    pattern: str,
+    result: ParsedResult | None,
     result_class: type[ResultSaver],
 ):
     effective_user = update.effective_user
     effective_chat = update.effective_chat
     message = update.message
-    if effective_user is None or effective_chat is None or message is None or message.text is None:
+    if effective_user is None or effective_chat is None or message is None or result is None:
         return
 
     await User.update_from_tg_user(effective_user)
-    result = re.search(pattern, message.text)
-    if result is None:
-        return
 
-    data_round = int(result.groupdict()['round'])
-    data_result = result.groupdict()['result']
-    data_won = '🟩' in data_result
-    data_win_frame = data_result.count('🟥') + 1 if data_won else None
+    saved = await result_ingestor.submit(
+        result_class,
+        ResultRow(
+            result.game.slug, effective_user.id, result.round, result.won, result.win_frame, chat_id=effective_chat.id
+        ),
+    )
 
-    saved = await result_class.save_result(effective_user.id, data_round, data_won, data_win_frame)
+    if saved:
+        leaderboard_cache.invalidate(result.game.slug)
 
-    reaction = saved_reaction_for(data_win_frame) if saved else duplicate_result_reaction
+    reaction = saved_reaction_for(result.win_frame) if saved else duplicate_result_reaction
 
     try:
         await context.bot.set_message_reaction(
@@ -142,8 +209,6 @@ async def save_results(
     except TelegramError:
         logging.warning('Не удалось проставить реакцию, откатываюсь к сообщению-ответу', exc_info=True)
 
-    job_queue = context.job_queue
-
     if saved:
         reply_message = await context.bot.send_message(
             chat_id=effective_chat.id,
@@ -157,55 +222,57 @@ async def save_results(
             reply_to_message_id=message.id,
         )
 
-    if job_queue is not None:
-        job_queue.run_once(delete_message_task, timedelta(seconds=30), reply_message.id, chat_id=effective_chat.id)
-
+    deletion_scheduler.schedule(effective_chat.id, reply_message.id, REPLY_LIFETIME)
 
-async def new_framed_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await save_results(update, context, framed_pattern, FramedResult)
 
+async def new_game_result(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    for result in parsed_results_for(update, context):
+        await save_results(update, context, result, GameResult)
 
-async def new_episode_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await save_results(update, context, episode_pattern, EpisodeResult)
 
-
-async def generate_stats_text(framed_stats: Stats, episode_stats: Stats):
-    text = 'Ты участвовал в '
-    if framed_stats.rounds_count:
-        text += (
-            f'{framed_stats.rounds_count} '
-            f'{pluralize(framed_stats.rounds_count, "раунде", "раундах", "раундах")} '
-            f'framed.wtf, '
+def generate_details_text(game_stats: Stats) -> str:
+    lines = []
+    if game_stats.rounds_won_count and game_stats.frame_counts:
+        distribution = ', '.join(
+            f'{frame} — {count}' for frame, count in enumerate(game_stats.frame_counts, start=1) if count
         )
-        if framed_stats.rounds_won_count:
-            text += (
-                f'отгадал {framed_stats.rounds_won_count} '
-                f'{pluralize(framed_stats.rounds_won_count, "фильм", "фильма", "фильмов")} '
-                f'в среднем с {framed_stats.average_frame} кадра.'
-            )
-        else:
-            text += 'но ни разу ничего не отгадал.'
+        lines.append(f'По кадрам: {distribution}.')
+    if game_stats.longest_streak:
+        lines.append(f'Отгадано подряд: сейчас {game_stats.current_streak}, лучшая серия {game_stats.longest_streak}.')
+    if game_stats.recent_average_frame is not None and game_stats.rounds_count > RECENT_ROUNDS:
+        lines.append(
+            f'За последние {RECENT_ROUNDS} {pluralize(RECENT_ROUNDS, "раунд", "раунда", "раундов")} '
+            f'в среднем с {game_stats.recent_average_frame:.2f} кадра.'
+        )
+    if game_stats.percentile is not None:
+        lines.append(f'Очков больше, чем у {game_stats.percentile:.0f}% игроков.')
+    return ''.join(f'\n{line}' for line in lines)
 
-    if framed_stats.rounds_count and episode_stats.rounds_count:
-        text += '\nА ещё в '
 
-    if episode_stats.rounds_count:
-        text += (
-            f'{episode_stats.rounds_count} '
-            f'{pluralize(episode_stats.rounds_count, "раунде", "раундах", "раундах")} '
-            f'episode.wtf, '
+async def generate_stats_text(stats_by_game: dict[str, Stats]):
+    text = 'Ты участвовал в '
+    parts = []
+    for slug, game_stats in stats_by_game.items():
+        if not game_stats.rounds_count:
+            continue
+        game = GAMES[slug]
+        part = (
+            f'{game_stats.rounds_count} '
+            f'{pluralize(game_stats.rounds_count, "раунде", "раундах", "раундах")} '
+            f'{game.host}, '
         )
-
-        if episode_stats.rounds_won_count:
-            text += (
-                f'отгадал {episode_stats.rounds_won_count} '
-                f'{pluralize(episode_stats.rounds_won_count, "сериал", "сериала", "сериалов")} '
-                f'в среднем с {episode_stats.average_frame} кадра.'
+        if game_stats.rounds_won_count:
+            part += (
+                f'отгадал {game_stats.rounds_won_count} '
+                f'{pluralize(game_stats.rounds_won_count, *game.guessed_forms)} '
+                f'в среднем с {game_stats.average_frame} кадра.'
             )
         else:
-            text += 'но ни разу ничего не отгадал.'
+            part += 'но ни разу ничего не отгадал.'
+        part += generate_details_text(game_stats)
+        parts.append(part)
 
-    return text
+    return text + '\nА ещё в '.join(parts)
 
 
 async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -215,33 +282,40 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if effective_user is None or effective_chat is None or message is None:
         return
 
-    user = await User.get(effective_user.id)
+    # One transaction for the queries only; it is finished before the reply goes out.
+    async with unit_of_work():
+        stats_by_game = await user_detailed_stats(effective_user.id)
 
-    if not user:
+    if stats_by_game is None:
         await context.bot.send_message(chat_id=effective_chat.id, text='Я тебя не знаю', reply_to_message_id=message.id)
         return
 
-    framed_stats = await count_stats(user.framed_results)
-    episode_stats = await count_stats(user.episode_results)
-
-    text = await generate_stats_text(framed_stats, episode_stats)
+    text = await generate_stats_text(stats_by_game)
 
     reply_message = await context.bot.send_message(chat_id=effective_chat.id, text=text, reply_to_message_id=message.id)
 
-    job_queue = context.job_queue
-    if job_queue is None:
-        return
-
-    job_queue.run_once(delete_message_task, timedelta(seconds=30), message.id, chat_id=effective_chat.id)
-
-    job_queue.run_once(delete_message_task, timedelta(seconds=30), reply_message.id, chat_id=effective_chat.id)
+    deletion_scheduler.schedule(effective_chat.id, message.id, REPLY_LIFETIME)
+    deletion_scheduler.schedule(effective_chat.id, reply_message.id, REPLY_LIFETIME)
 
 
 async def update_chat_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
     effective_chat = update.effective_chat
     if effective_chat is None:
         return
-    await Group.update_from_tg_chat(effective_chat)
+    group_cache.record(effective_chat.id, effective_chat.title or '')
+
+
+async def flush_group_cache(_context: ContextTypes.DEFAULT_TYPE):
+    await group_cache.flush()
+
+
+async def flush_deletions(context: ContextTypes.DEFAULT_TYPE):
+    await deletion_scheduler.flush(context.bot)
+    deletion_scheduler.save()
+
+
+async def dump_metrics(_context: ContextTypes.DEFAULT_TYPE):
+    log_metrics()
 
 
 async def announce(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -251,25 +325,78 @@ async def announce(update: Update, context: ContextTypes.DEFAULT_TYPE):
     _, _, announcement_text = effective_message.text.partition(' ')
     if not announcement_text:
         return
-    groups = await Group.get_all()
-    for group in groups:
-        await context.bot.send_message(chat_id=group.id, text=announcement_text)
+    broadcast = await Broadcast.create(announcement_text, effective_message.chat_id)
+    broadcaster.start(context.bot, broadcast)
+
 
+async def export_results(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send the results posted in a group to its admins, or their own results to a player in private."""
+    effective_user = update.effective_user
+    effective_chat = update.effective_chat
+    message = update.message
+    if effective_user is None or effective_chat is None or message is None:
+        return
 
-def top_reply_markup(top_type: TopType):
+    if effective_chat.type in (Chat.GROUP, Chat.SUPERGROUP):
+        member = await context.bot.get_chat_member(effective_chat.id, effective_user.id)
+        if member.status not in (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER):
+            await context.bot.send_message(
+                chat_id=effective_chat.id,
+                text='Выгрузить результаты группы может только администратор',
+                reply_to_message_id=message.id,
+            )
+            return
+        rows = GameResult.stream_rows(EXPORT_CHUNK_SIZE, chat_id=effective_chat.id)
+        filename = f'results_{-effective_chat.id}.csv.gz'
+    else:
+        rows = GameResult.stream_rows(EXPORT_CHUNK_SIZE, user_id=effective_user.id)
+        filename = f'results_{effective_user.id}.csv.gz'
+
+    # Written to a file on disk, so a large export does not sit in memory while it is built.
+    with tempfile.TemporaryFile() as export_file:
+        if not await write_csv(rows, export_file):
+            await context.bot.send_message(
+                chat_id=effective_chat.id, text='Пока нечего выгружать', reply_to_message_id=message.id
+            )
+            return
+        if export_file.tell() > MAX_EXPORT_SIZE:
+            await context.bot.send_message(
+                chat_id=effective_chat.id,
+                text=f'Выгрузка больше {MAX_EXPORT_SIZE // 1_000_000} МБ, столько Telegram не даёт отправить',
+                reply_to_message_id=message.id,
+            )
+            return
+        export_file.seek(0)
+        await context.bot.send_document(
+            chat_id=effective_chat.id, document=export_file, filename=filename, reply_to_message_id=message.id
+        )
+
+
+def top_reply_markup(top_type: TopType, window: TopWindow = TopWindow.ALL_TIME):
     type_to_text = {
         TopType.TOP_SCORE: 'По очкам',
         TopType.TOP_ROUNDS: 'По участиям',
         TopType.TOP_FRAME: 'По кадрам',
         TopType.TOP_WIN: 'По фильмам',
     }
+    window_to_text = {
+        TopWindow.ALL_TIME: 'Всё время',
+        TopWindow.WEEK: 'Неделя',
+        TopWindow.MONTH: 'Месяц',
+        TopWindow.SEASON: 'Сезон',
+    }
     return InlineKeyboardMarkup(
         [
             [
-                InlineKeyboardButton(type_to_text[_type], callback_data=json.dumps({'top': _type}))
+                InlineKeyboardButton(type_to_text[_type], callback_data=top_callback_data(_type, window))
                 for _type in type_to_text
                 if _type != top_type
-            ]
+            ],
+            [
+                InlineKeyboardButton(window_to_text[_window], callback_data=top_callback_data(top_type, _window))
+                for _window in window_to_text
+                if _window != window
+            ],
         ]
     )
 
@@ -279,8 +406,7 @@ async def top(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     if effective_chat is None or message is None:
         return
-    results = await FramedResult.top_score()
-    text = await format_top(TopType.TOP_SCORE, results)
+    text = await top_text(TopType.TOP_SCORE, board_chat_id(effective_chat))
 
     await context.bot.send_message(
         chat_id=effective_chat.id,
@@ -291,59 +417,110 @@ async def top(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
-async def format_top(top_type, results) -> str:
+async def format_top(top_type, results, rounds: tuple[int, int] | None = None, group: bool = False) -> str:
     match top_type:
         case TopType.TOP_WIN:
-            text = 'Топ по количеству отгаданных фильмов:\n'
+            text = 'Топ по количеству отгаданных фильмов'
         case TopType.TOP_FRAME:
-            text = 'Топ по среднему отгаданному кадру:\n'
+            text = 'Топ по среднему отгаданному кадру'
         case TopType.TOP_SCORE:
-            text = 'Топ по очкам:\n'
+            text = 'Топ по очкам'
         case TopType.TOP_ROUNDS:
-            text = 'Топ по количеству участий:\n'
+            text = 'Топ по количеству участий'
         case _:
             text = ''
+    if rounds is not None:
+        text += f' за раунды {rounds[0]}–{rounds[1]}'
+    text += ':\n'
     text += tabulate(
         [(i, result.name, result.score) for i, result in enumerate(results, 1)],
         ('#', 'Имя', 'Очки'),
         tablefmt='rounded_grid',
     )
+    if group:
+        # Results saved before chats were recorded belong to no group, so their players show up here only
+        # after posting a result in this chat.
+        text += '\nВ топе группы только те, кто присылал сюда результаты.'
     return text
 
 
-async def inline_top(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    if query is None or query.data is None:
-        return
-    data = json.loads(query.data)
-    top_type = TopType(data['top'])
+def board_chat_id(chat: Chat) -> int | None:
+    """Groups get a board of their own members, private chats see the global one."""
+    return chat.id if chat.type in (Chat.GROUP, Chat.SUPERGROUP) else None
+
+
+async def render_top(top_type: TopType, window: TopWindow, chat_id: int | None) -> str:
+    if window is not TopWindow.ALL_TIME:
+        return await render_window_top(top_type, window, chat_id)
     results = []
     match top_type:
         case TopType.TOP_WIN:
-            results = await FramedResult.top_won()
+            results = await UserGameStats.top_won(FRAMED, chat_id)
         case TopType.TOP_FRAME:
-            results = await FramedResult.top_average_frame()
+            results = await UserGameStats.top_average_frame(FRAMED, chat_id)
         case TopType.TOP_SCORE:
-            results = await FramedResult.top_score()
+            results = await UserGameStats.top_score(FRAMED, chat_id)
         case TopType.TOP_ROUNDS:
-            results = await FramedResult.top_rounds()
+            results = await UserGameStats.top_rounds(FRAMED, chat_id)
+    return await format_top(top_type, results, group=chat_id is not None)
+
+
+async def render_window_top(top_type: TopType, window: TopWindow, chat_id: int | None) -> str:
+    latest_round = await GameResult.latest_round(FRAMED, LATEST_ROUND_MIN_PLAYERS)
+    if latest_round is None:
+        return await format_top(top_type, [], group=chat_id is not None)
+    first_round, last_round = window_rounds(window, latest_round)
+    results = []
+    match top_type:
+        case TopType.TOP_WIN:
+            results = await GameResult.top_won_between(FRAMED, first_round, last_round, chat_id)
+        case TopType.TOP_FRAME:
+            results = await GameResult.top_average_frame_between(FRAMED, first_round, last_round, chat_id)
+        case TopType.TOP_SCORE:
+            results = await GameResult.top_score_between(FRAMED, first_round, last_round, chat_id)
+        case TopType.TOP_ROUNDS:
+            results = await GameResult.top_rounds_between(FRAMED, first_round, last_round, chat_id)
+    return await format_top(top_type, results, (first_round, last_round), group=chat_id is not None)
+
+
+async def top_text(top_type: TopType, chat_id: int | None, window: TopWindow = TopWindow.ALL_TIME) -> str:
+    scope = 'global' if chat_id is None else chat_id
+    return await leaderboard_cache.get(
+        ((top_type, window), FRAMED.slug, scope), lambda: load_top(top_type, window, chat_id)
+    )
+
+
+async def load_top(top_type: TopType, window: TopWindow, chat_id: int | None) -> str:
+    """Render a board from one transaction, finished before the caller replies with the text."""
+    async with unit_of_work():
+        return await render_top(top_type, window, chat_id)
+
 
-    text = await format_top(top_type, results)
+async def inline_top(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if query is None or query.data is None:
+        return
+    parsed = parse_top_callback(query.data)
+    if parsed is None:
+        await query.answer()
+        return
+    top_type, window = parsed
     query_message = query.message
     if not isinstance(query_message, TelegramMessage):
         await query.answer()
         return
+    text = await top_text(top_type, board_chat_id(query_message.chat), window)
     await query_message.edit_text(
         text,
         entities=[MessageEntity(MessageEntity.CODE, 0, len(text))],
-        reply_markup=top_reply_markup(top_type),
+        reply_markup=top_reply_markup(top_type, window),
     )
 
     await query.answer()
 
 
 async def initialize_database(
-    _application: Application[
+    application: Application[
         ExtBot[None],
         ContextTypes.DEFAULT_TYPE,
         dict[str, str],
@@ -353,42 +530,143 @@ async def initialize_database(
     ],
 ) -> None:
     await init_db()
-
-
-if __name__ == '__main__':
-    application = (
+    deletion_scheduler.load()
+    await result_ingestor.start()
+    # /announce is handled by the worker of the admin's private chat. Only that worker resumes broadcasts,
+    # so a broadcast that is still running is never started by a second worker.
+    if BOT_MODE != 'worker' or partition_of(ADMIN_USER_ID, WORKER_COUNT) == WORKER_INDEX:
+        for broadcast in await Broadcast.unfinished():
+            broadcaster.start(application.bot, broadcast)
+    if application.job_queue is not None:
+        application.job_queue.run_repeating(flush_group_cache, GROUP_CACHE_FLUSH_INTERVAL)
+        application.job_queue.run_repeating(flush_deletions, DELETION_TICK_SECONDS)
+        if METRICS_LOG_INTERVAL:
+            application.job_queue.run_repeating(dump_metrics, METRICS_LOG_INTERVAL)
+
+
+async def shutdown_database(
+    _application: Application[
+        ExtBot[None],
+        ContextTypes.DEFAULT_TYPE,
+        dict[str, str],
+        dict[str, str],
+        dict[str, str],
+        JobQueue[ContextTypes.DEFAULT_TYPE],
+    ],
+) -> None:
+    await broadcaster.stop()
+    await result_ingestor.stop()
+    await group_cache.flush()
+    deletion_scheduler.save()
+
+
+def build_application(
+    persistence: BasePersistence | None = None,
+    block: bool = False,
+    request: BaseRequest | None = None,
+) -> Application[
+    # ExtBot[int] behind the rate limiter, ExtBot[None] with a replaced request.
+    ExtBot[Any],
+    ContextTypes.DEFAULT_TYPE,
+    dict[str, str],
+    dict[str, str],
+    dict[str, str],
+    JobQueue[ContextTypes.DEFAULT_TYPE],
+]:
+    """The bot itself; workers pass ``block=True``, so they finish an update before the next one of its chat.
+
+    A ``request`` replaces the connection to the Bot API and its rate limiter; the load test passes a fake one.
+    """
+    builder = (
         ApplicationBuilder()
         .token(BOT_TOKEN)
-        .rate_limiter(AIORateLimiter())
-        .persistence(PicklePersistence('bot_data'))
+        .persistence(DatabasePersistence() if persistence is None else persistence)
         .post_init(initialize_database)
-        .build()
+        .post_shutdown(shutdown_database)
     )
+    if request is None:
+        builder = builder.rate_limiter(AIORateLimiter())
+    else:
+        builder = builder.request(request).get_updates_request(request)
+    application = builder.build()
 
-    start_handler = CommandHandler('start', start, block=False)
+    start_handler = CommandHandler('start', instrumented(start), block=block)
     application.add_handler(start_handler)
 
     announce_handler = CommandHandler(
-        'announce', announce, filters.ChatType.PRIVATE & filters.User(ADMIN_USER_ID), block=False
+        'announce', instrumented(announce), filters.ChatType.PRIVATE & filters.User(ADMIN_USER_ID), block=block
     )
     application.add_handler(announce_handler)
 
-    chat_update_handler = MessageHandler(filters.ChatType.GROUPS, update_chat_data, block=False)
+    chat_update_handler = MessageHandler(filters.ChatType.GROUPS, instrumented(update_chat_data), block=block)
     application.add_handler(chat_update_handler, -1)
 
-    framed_data_handler = MessageHandler(filters.ChatType.GROUPS & FRAMED_FILTER, new_framed_data, block=False)
-    application.add_handler(framed_data_handler)
-
-    episode_data_handler = MessageHandler(filters.ChatType.GROUPS & EPISODE_FILTER, new_episode_data, block=False)
-    application.add_handler(episode_data_handler)
+    game_result_handler = MessageHandler(
+        filters.ChatType.GROUPS & GAME_RESULT_FILTER, instrumented(new_game_result), block=block
+    )
+    application.add_handler(game_result_handler)
 
-    stats_handler = CommandHandler('stats', stats, block=False)
+    stats_handler = CommandHandler('stats', instrumented(stats), block=block)
     application.add_handler(stats_handler)
 
-    top_handler = CommandHandler('top', top, block=False)
+    top_handler = CommandHandler('top', instrumented(top), block=block)
     application.add_handler(top_handler)
 
-    inline_top_handler = CallbackQueryHandler(inline_top, pattern=r'^{"top": [\d]+}$', block=False)
+    export_handler = CommandHandler('export', instrumented(export_results), block=block)
+    application.add_handler(export_handler)
+
+    inline_top_handler = CallbackQueryHandler(instrumented(inline_top), pattern=TOP_CALLBACK_PATTERN, block=block)
     application.add_handler(inline_top_handler)
 
-    application.run_polling()
+    return application
+
+
+async def initialize_ingress(
+    _application: Application[
+        ExtBot[None],
+        ContextTypes.DEFAULT_TYPE,
+        dict[str, str],
+        dict[str, str],
+        dict[str, str],
+        JobQueue[ContextTypes.DEFAULT_TYPE],
+    ],
+) -> None:
+    await init_db()
+
+
+def build_ingress_application(
+    queue: UpdateQueue,
+) -> Application[
+    ExtBot[None],
+    ContextTypes.DEFAULT_TYPE,
+    dict[str, str],
+    dict[str, str],
+    dict[str, str],
+    JobQueue[ContextTypes.DEFAULT_TYPE],
+]:
+    """Application that only passes updates on to the workers."""
+    application = ApplicationBuilder().token(BOT_TOKEN).post_init(initialize_ingress).build()
+    application.add_handler(TypeHandler(Update, UpdateForwarder(queue)))
+    return application
+
+
+if __name__ == '__main__':
+    if BOT_MODE == 'worker':
+        deletion_scheduler.path = deletion_scheduler.path.with_suffix(
+            f'.{WORKER_INDEX}{deletion_scheduler.path.suffix}'
+        )
+        worker = UpdateWorker(
+            build_application(block=True),
+            QueuedUpdate,
+            WORKER_INDEX,
+            WORKER_COUNT,
+            UPDATE_QUEUE_BATCH_SIZE,
+            UPDATE_QUEUE_POLL_MS / 1000,
+        )
+        asyncio.run(serve_worker(worker))
+    else:
+        bot_application = build_ingress_application(QueuedUpdate) if BOT_MODE == 'ingress' else build_application()
+        if WEBHOOK_URL:
+            asyncio.run(webhook.serve(bot_application, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET_TOKEN))
+        else:
+            bot_application.run_polling()
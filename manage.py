@@ -0,0 +1,136 @@
+"""Maintenance commands, run as ``python manage.py <command>``."""
+
+import argparse
+import asyncio
+import logging
+import sys
+from collections import Counter
+from pathlib import Path
+
+from telegram.ext import ExtBot, PicklePersistence
+
+from config import BOT_TOKEN, WEBHOOK_SECRET_TOKEN
+from export import CHUNK_SIZE, write_csv, write_parquet
+from history_import import HistoryImporter
+from models import GameResult, init_db
+from models.db import engine
+from models.maintenance import check_user_game_stats, rebuild_chat_members, rebuild_user_game_stats
+from persistence import DatabasePersistence, copy_persistence
+from webhook import post_update
+
+logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+
+async def rebuild_stats(_args: argparse.Namespace) -> int:
+    await init_db()
+    async with engine.begin() as conn:
+        rebuilt = await rebuild_user_game_stats(conn)
+        added_members = await rebuild_chat_members(conn)
+    logging.info('Rebuilt %d user_game_stats rows, added %d chat members', rebuilt, added_members)
+    return 0
+
+
+async def check_stats(_args: argparse.Namespace) -> int:
+    mismatches = await check_user_game_stats()
+    for mismatch in mismatches:
+        logging.error(
+            'user %d, game %s: expected %s, stored %s',
+            mismatch.user_id,
+            mismatch.game,
+            mismatch.expected,
+            mismatch.actual,
+        )
+    if mismatches:
+        logging.error('%d user_game_stats rows are out of date, run rebuild-stats', len(mismatches))
+        return 1
+    logging.info('user_game_stats is consistent with game_result')
+    return 0
+
+
+async def import_pickle(args: argparse.Namespace) -> int:
+    if not args.path.is_file():
+        logging.error('%s does not exist', args.path)
+        return 1
+    source = PicklePersistence(args.path)
+    # Unpickling needs a bot to restore references to it; no request is made.
+    source.set_bot(ExtBot(BOT_TOKEN))
+    await source.get_bot_data()
+    conversation_names = list(source.conversations or {})
+    await init_db()
+    copied = await copy_persistence(source, DatabasePersistence(), conversation_names)
+    logging.info('Imported %s from %s', ', '.join(f'{count} {kind}' for kind, count in copied.items()), args.path)
+    return 0
+
+
+async def import_history(args: argparse.Namespace) -> int:
+    if not args.path.is_file():
+        logging.error('%s does not exist', args.path)
+        return 1
+    await init_db()
+    progress = await HistoryImporter(args.batch_size).run(args.path)
+    logging.info('Imported %s: %d results saved, %d duplicates', args.path, progress.saved, progress.duplicates)
+    return 0
+
+
+async def export_results(args: argparse.Namespace) -> int:
+    rows = GameResult.stream_rows(args.chunk_size, user_id=args.user, chat_id=args.chat)
+    if args.format == 'parquet':
+        written = await write_parquet(rows, args.path)
+    else:
+        with args.path.open('wb') as export_file:
+            written = await write_csv(rows, export_file)
+    logging.info('Exported %d results to %s', written, args.path)
+    return 0
+
+
+async def replay_updates(args: argparse.Namespace) -> int:
+    statuses: Counter[int] = Counter()
+    with args.path.open('rb') as updates:
+        for line in updates:
+            if line.strip():
+                statuses[await asyncio.to_thread(post_update, args.url, line.strip(), args.secret_token)] += 1
+    logging.info('Replayed %d updates: %s', statuses.total(), dict(sorted(statuses.items())))
+    return 0 if set(statuses) <= {200} else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='framed_bot maintenance commands')
+    commands = parser.add_subparsers(dest='command', required=True)
+    rebuild = commands.add_parser('rebuild-stats', help='recompute user_game_stats and chat_member from game_result')
+    rebuild.set_defaults(handler=rebuild_stats)
+    commands.add_parser('check-stats', help='compare user_game_stats with game_result').set_defaults(
+        handler=check_stats
+    )
+    import_command = commands.add_parser('import-pickle', help='copy a PicklePersistence file into the database')
+    import_command.add_argument('path', type=Path, nargs='?', default=Path('bot_data'))
+    import_command.set_defaults(handler=import_pickle)
+    history = commands.add_parser(
+        'import-history', help='import results from a Telegram Desktop JSON export of a chat (result.json)'
+    )
+    history.add_argument('path', type=Path)
+    history.add_argument('--batch-size', type=int, default=2000)
+    history.set_defaults(handler=import_history)
+    export = commands.add_parser('export-results', help='write results as gzip-compressed CSV or Parquet')
+    export.add_argument('path', type=Path)
+    export.add_argument('--user', type=int, help='only the results of this user')
+    export.add_argument('--chat', type=int, help='only the results posted in this chat')
+    export.add_argument('--format', choices=('csv', 'parquet'), default='csv')
+    export.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    export.set_defaults(handler=export_results)
+    replay = commands.add_parser('replay-updates', help='POST recorded updates (one JSON per line) to a webhook')
+    replay.add_argument('path', type=Path)
+    replay.add_argument('--url', default='http://127.0.0.1:8080/telegram')
+    replay.add_argument('--secret-token', default=WEBHOOK_SECRET_TOKEN)
+    replay.set_defaults(handler=replay_updates)
+    return parser
+
+
+async def run(args: argparse.Namespace) -> int:
+    try:
+        return await args.handler(args)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run(build_parser().parse_args())))
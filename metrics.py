@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import bisect
+import math
+from collections.abc import Mapping, Sequence
+
+REGISTRY: list[Counter | Gauge | Histogram] = []
+
+
+def format_labels(labels: Mapping[str, str], extra: str = '') -> str:
+    parts = [f'{name}="{escape(value)}"' for name, value in labels.items()]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str, labels: Mapping[str, str] | None = None) -> None:
+        self.name = name
+        self.description = description
+        self.labels = dict(labels or {})
+        self.value = 0
+        REGISTRY.append(self)
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def samples(self) -> list[str]:
+        return [f'{self.name}{format_labels(self.labels)} {self.value}']
+
+    def summary(self) -> str:
+        return f'{self.name}{format_labels(self.labels)} {self.value}'
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name: str, description: str, labels: Mapping[str, str] | None = None) -> None:
+        self.name = name
+        self.description = description
+        self.labels = dict(labels or {})
+        self.value = 0
+        REGISTRY.append(self)
+
+    def set(self, value: int) -> None:
+        self.value = value
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: int = 1) -> None:
+        self.value -= amount
+
+    def samples(self) -> list[str]:
+        return [f'{self.name}{format_labels(self.labels)} {self.value}']
+
+    def summary(self) -> str:
+        return f'{self.name}{format_labels(self.labels)} {self.value}'
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds, in the Prometheus sense."""
+
+    kind = 'histogram'
+
+    def __init__(
+        self, name: str, description: str, buckets: Sequence[float], labels: Mapping[str, str] | None = None
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.labels = dict(labels or {})
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        REGISTRY.append(self)
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.bucket_counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self) -> list[int]:
+        counts = []
+        total = 0
+        for bucket_count in self.bucket_counts:
+            total += bucket_count
+            counts.append(total)
+        return counts
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile; ``inf`` when it is above the last bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        for bound, cumulative in zip(self.buckets, self.cumulative_counts(), strict=True):
+            if cumulative >= rank:
+                return bound
+        return math.inf
+
+    def samples(self) -> list[str]:
+        samples = [
+            f'{self.name}_bucket{format_labels(self.labels, f'le="{format_value(bound)}"')} {cumulative}'
+            for bound, cumulative in zip(self.buckets, self.cumulative_counts(), strict=True)
+        ]
+        samples.append(f'{self.name}_bucket{format_labels(self.labels, 'le="+Inf"')} {self.count}')
+        samples.append(f'{self.name}_sum{format_labels(self.labels)} {format_value(self.sum)}')
+        samples.append(f'{self.name}_count{format_labels(self.labels)} {self.count}')
+        return samples
+
+    def summary(self) -> str:
+        mean = self.sum / self.count if self.count else 0.0
+        return (
+            f'{self.name}{format_labels(self.labels)} count={self.count} mean={mean:.4g} '
+            f'p50<={format_value(self.quantile(0.5))} p99<={format_value(self.quantile(0.99))}'
+        )
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format."""
+    families: dict[str, list[Counter | Gauge | Histogram]] = {}
+    for metric in REGISTRY:
+        families.setdefault(metric.name, []).append(metric)
+    lines = []
+    for name, metrics in families.items():
+        lines.append(f'# HELP {name} {escape(metrics[0].description)}')
+        lines.append(f'# TYPE {name} {metrics[0].kind}')
+        for metric in metrics:
+            lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+def summarize() -> list[str]:
+    """One line per metric that saw any activity, for logging."""
+    return [
+        metric.summary() for metric in REGISTRY if (metric.count if isinstance(metric, Histogram) else metric.value)
+    ]
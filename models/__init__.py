@@ -1,9 +1,23 @@
+from config import DB_POOL_SIZE, DB_POOL_WARMUP
+
+from .broadcast import Broadcast
+from .chat_member import ChatMember
 from .db import Base, engine
-from .framed_result import FramedResult
+from .game_result import GameResult
+from .group import Group
+from .migrations import lock_schema, run_migrations
+from .persisted_data import PersistedData
+from .pool import warm_up
+from .queued_update import QueuedUpdate
 from .user import User
+from .user_game_stats import UserGameStats
 
-__all__ = ["FramedResult", "User"]
+__all__ = ["Broadcast", "ChatMember", "GameResult", "Group", "PersistedData", "QueuedUpdate", "User", "UserGameStats"]
 
 async def init_db():
     async with engine.begin() as conn:
+        await lock_schema(conn)
         await conn.run_sync(Base.metadata.create_all)
+        await run_migrations(conn)
+    if engine.dialect.name == 'postgresql' and DB_POOL_WARMUP:
+        await warm_up(engine, min(DB_POOL_WARMUP, DB_POOL_SIZE))
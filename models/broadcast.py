@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from sqlalchemy import BigInteger, Select, update
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .db import AsyncScopedSession, Base
+
+
+class Broadcast(Base):
+    """An /announce run and how far it got, so a restarted bot finishes it instead of starting over."""
+
+    __tablename__ = 'broadcast'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    text: Mapped[str] = mapped_column()
+    report_chat_id: Mapped[int] = mapped_column(BigInteger)
+    # Groups are visited in id order; every group up to this id has been handled.
+    last_group_id: Mapped[int | None] = mapped_column(BigInteger)
+    delivered: Mapped[int] = mapped_column(default=0)
+    failed: Mapped[int] = mapped_column(default=0)
+    deactivated: Mapped[int] = mapped_column(default=0)
+    finished: Mapped[bool] = mapped_column(default=False)
+
+    @staticmethod
+    async def create(text: str, report_chat_id: int) -> Broadcast:
+        broadcast = Broadcast(
+            text=text,
+            report_chat_id=report_chat_id,
+            last_group_id=None,
+            delivered=0,
+            failed=0,
+            deactivated=0,
+            finished=False,
+        )
+        async with AsyncScopedSession() as session:
+            session.add(broadcast)
+        return broadcast
+
+    @staticmethod
+    async def unfinished() -> list[Broadcast]:
+        async with AsyncScopedSession() as session:
+            result = await session.execute(
+                Select(Broadcast).filter(Broadcast.finished.is_(False)).order_by(Broadcast.id)
+            )
+            return list(result.scalars().all())
+
+    @staticmethod
+    async def save_progress(broadcast: Broadcast) -> None:
+        async with AsyncScopedSession() as session:
+            await session.execute(
+                update(Broadcast)
+                .filter(Broadcast.id == broadcast.id)
+                .values(
+                    last_group_id=broadcast.last_group_id,
+                    delivered=broadcast.delivered,
+                    failed=broadcast.failed,
+                    deactivated=broadcast.deactivated,
+                    finished=broadcast.finished,
+                )
+            )
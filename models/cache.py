@@ -0,0 +1,47 @@
+from collections import OrderedDict
+
+from metrics import Counter
+
+
+class LruCache[K, V]:
+    """Bounded mapping that evicts the least recently used key and counts lookups.
+
+    The counts are metrics labelled with the cache's ``name``, so they show up on ``/metrics`` and in the
+    periodic log.
+    """
+
+    def __init__(self, max_size: int, name: str) -> None:
+        if max_size <= 0:
+            raise ValueError('max_size must be positive')
+        self.max_size = max_size
+        self.hits = Counter('framed_bot_cache_hits', 'Lookups answered from an in-memory cache', {'cache': name})
+        self.misses = Counter('framed_bot_cache_misses', 'Lookups missing from an in-memory cache', {'cache': name})
+        self._data: OrderedDict[K, V] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._data
+
+    def get(self, key: K) -> V | None:
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses.inc()
+            return None
+        self._data.move_to_end(key)
+        self.hits.inc()
+        return value
+
+    def put(self, key: K, value: V) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def discard(self, key: K) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
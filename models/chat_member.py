@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from sqlalchemy import BigInteger, ForeignKey
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .db import Base, ResultRow, upsert
+
+
+class ChatMember(Base):
+    """Users who posted results in a chat, derived from saved results.
+
+    The primary key leads with ``chat_id``, so a per-chat board reads only that chat's members.
+    """
+
+    __tablename__ = 'chat_member'
+
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('user.id'), primary_key=True)
+
+    @staticmethod
+    async def add_results(session: AsyncSession, rows: Sequence[ResultRow]) -> None:
+        members = sorted({(row.chat_id, row.user_id) for row in rows if row.chat_id is not None})
+        if not members:
+            return
+        statement = (
+            upsert(ChatMember)
+            .values([{'chat_id': chat_id, 'user_id': user_id} for chat_id, user_id in members])
+            .on_conflict_do_nothing(index_elements=[ChatMember.chat_id, ChatMember.user_id])
+        )
+        await session.execute(statement)
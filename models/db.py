@@ -1,13 +1,22 @@
+from collections.abc import AsyncGenerator
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from types import TracebackType
 from typing import Protocol
 
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy import Table
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 
 from config import DB_CONNECTION_STRING
+from instrumentation import instrument_engine
 
-engine = create_async_engine(
-    DB_CONNECTION_STRING
-)
+from .pool import create_pooled_engine
+
+engine = create_pooled_engine(DB_CONNECTION_STRING)
+instrument_engine(engine)
 
 
 # async_sessionmaker: a factory for new AsyncSession objects.
@@ -16,7 +25,55 @@ async_session_factory = async_sessionmaker(
     engine,
     expire_on_commit=False,
 )
-AsyncScopedSession = async_session_factory
+
+# Session of the unit of work the current task runs in, if any.
+current_session: ContextVar[AsyncSession | None] = ContextVar('current_session', default=None)
+
+
+class AsyncScopedSession:
+    """Session scoped to the current context.
+
+    Inside :func:`unit_of_work` every model operation shares the unit's session and transaction. Outside
+    of one, the operation gets a session of its own, committed when the block exits without an error.
+    """
+
+    def __init__(self) -> None:
+        self._own: AbstractAsyncContextManager[AsyncSession] | None = None
+
+    async def __aenter__(self) -> AsyncSession:
+        session = current_session.get()
+        if session is not None:
+            return session
+        self._own = async_session_factory.begin()
+        return await self._own.__aenter__()
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if self._own is not None:
+            await self._own.__aexit__(exc_type, exc, traceback)
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncGenerator[AsyncSession]:
+    """One session and one transaction for everything the block does, committed once at the end.
+
+    The session only checks out a connection on its first statement, so a block that never touches the
+    database costs nothing. Nested units join the outer one.
+    """
+    session = current_session.get()
+    if session is not None:
+        yield session
+        return
+    async with async_session_factory.begin() as session:
+        token = current_session.set(session)
+        try:
+            yield session
+        finally:
+            current_session.reset(token)
 
 
 class Base(DeclarativeBase):
@@ -26,3 +83,28 @@ class Base(DeclarativeBase):
 class ResultForStats(Protocol):
     won: bool
     win_frame: int | None
+
+
+class GameResultForStats(ResultForStats, Protocol):
+    game: str
+
+
+@dataclass(frozen=True, slots=True)
+class ResultRow:
+    game: str
+    user_id: int
+    framed_round: int
+    won: bool
+    win_frame: int | None
+    chat_id: int | None = None
+
+
+def upsert(table: Table | type[Base]) -> postgresql.Insert | sqlite.Insert:
+    """Dialect-specific INSERT that supports ON CONFLICT clauses."""
+    match engine.dialect.name:
+        case 'postgresql':
+            return postgresql.insert(table)
+        case 'sqlite':
+            return sqlite.insert(table)
+        case dialect:
+            raise NotImplementedError(f'upsert is not supported for {dialect}')
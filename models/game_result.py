@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+from collections.abc import AsyncIterator, Sequence
+
+from sqlalchemy import (
+    BigInteger,
+    ColumnElement,
+    Float,
+    ForeignKey,
+    Index,
+    Row,
+    Select,
+    String,
+    and_,
+    case,
+    cast,
+    desc,
+    func,
+    text,
+)
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from games import GAMES, GameSpec
+
+from .chat_member import ChatMember
+from .db import AsyncScopedSession, Base, ResultRow, upsert
+from .user import User
+from .user_game_stats import UserGameStats
+
+
+class GameResult(Base):
+    __tablename__ = 'game_result'
+    __table_args__ = (
+        Index('uq_game_result_game_user_round', 'game', 'user_id', 'framed_round', unique=True),
+        # Covers windowed boards: a round range is read from the index alone.
+        Index('ix_game_result_game_round', 'game', 'framed_round', 'user_id', 'won', 'win_frame'),
+        # A chat's results in insertion order, for /export.
+        Index('ix_game_result_chat_id', 'chat_id', 'id'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    game: Mapped[str] = mapped_column(String(32))
+    user_id: Mapped[int] = mapped_column(ForeignKey('user.id'), index=True)
+    framed_round: Mapped[int] = mapped_column()
+    won: Mapped[bool] = mapped_column()
+    win_frame: Mapped[int | None] = mapped_column()
+    # Chat the result was posted in; unknown for results saved before chats were recorded.
+    chat_id: Mapped[int | None] = mapped_column(BigInteger)
+
+    user: Mapped[Base] = relationship('User', back_populates='results')
+
+    @staticmethod
+    async def save_results(rows: Sequence[ResultRow]) -> list[bool]:
+        """Insert rows in one statement and report, per row, whether it was saved or is a duplicate."""
+        if not rows:
+            return []
+        statement = upsert(GameResult).values(
+            [
+                {
+                    'game': row.game,
+                    'user_id': row.user_id,
+                    'framed_round': row.framed_round,
+                    'won': row.won,
+                    'win_frame': row.win_frame,
+                    'chat_id': row.chat_id,
+                }
+                for row in rows
+            ]
+        )
+        statement = statement.on_conflict_do_nothing(
+            index_elements=[GameResult.game, GameResult.user_id, GameResult.framed_round]
+        ).returning(GameResult.game, GameResult.user_id, GameResult.framed_round)
+        async with AsyncScopedSession() as session:
+            result = await session.execute(statement)
+            inserted = {tuple(inserted_row) for inserted_row in result.all()}
+            saved = []
+            saved_rows = []
+            for row in rows:
+                key = (row.game, row.user_id, row.framed_round)
+                saved.append(key in inserted)
+                if key in inserted:
+                    saved_rows.append(row)
+                # A repeated row in the same batch is a duplicate of the first one.
+                inserted.discard(key)
+            await UserGameStats.add_results(session, saved_rows)
+            # Membership counts for duplicates too: a player may repost an old result in another chat.
+            await ChatMember.add_results(session, rows)
+        return saved
+
+    @staticmethod
+    def score_expression():
+        """SQL counterpart of :meth:`games.GameSpec.score` for every registered game."""
+        return case(
+            *(
+                (
+                    and_(GameResult.game == game.slug, GameResult.won.is_(True)),
+                    game.grid_length + 1 - GameResult.win_frame,
+                )
+                for game in GAMES.values()
+            ),
+            *((GameResult.game == game.slug, game.loss_score) for game in GAMES.values()),
+            else_=0,
+        )
+
+    @staticmethod
+    def totals_by_user() -> Select:
+        """Aggregate raw results into the shape of ``user_game_stats``."""
+        return Select(
+            GameResult.user_id,
+            GameResult.game,
+            func.count().label('rounds'),
+            func.sum(case((GameResult.won.is_(True), 1), else_=0)).label('wins'),
+            func.sum(case((GameResult.won.is_(True), GameResult.win_frame), else_=0)).label('win_frames_total'),
+            func.sum(GameResult.score_expression()).label('score'),
+        ).group_by(GameResult.user_id, GameResult.game)
+
+    @staticmethod
+    def latest_round_statement(game: GameSpec, min_players: int) -> Select:
+        return (
+            Select(GameResult.framed_round)
+            .filter(GameResult.game == game.slug)
+            .group_by(GameResult.framed_round)
+            .having(func.count() >= min_players)
+            .order_by(desc(GameResult.framed_round))
+            .limit(1)
+        )
+
+    @staticmethod
+    async def latest_round(game: GameSpec, min_players: int = 1) -> int | None:
+        """Latest round that at least ``min_players`` players posted a result for.
+
+        Any player can post any round number, so a single far-future round must not count as the current
+        one. While no round has enough players yet, the latest round of all is used.
+        """
+        async with AsyncScopedSession() as session:
+            latest = await session.scalar(GameResult.latest_round_statement(game, min_players))
+            if latest is None and min_players > 1:
+                latest = await session.scalar(
+                    Select(func.max(GameResult.framed_round)).filter(GameResult.game == game.slug)
+                )
+            return latest
+
+    @staticmethod
+    def top_between_statement(
+        game: GameSpec,
+        first_round: int,
+        last_round: int,
+        chat_id: int | None,
+        score: ColumnElement,
+        descending: bool = True,
+    ) -> Select:
+        statement = Select(User.full_name.label('name'), score.label('score')).select_from(GameResult)
+        if chat_id is not None:
+            statement = statement.join(
+                ChatMember, and_(ChatMember.user_id == GameResult.user_id, ChatMember.chat_id == chat_id)
+            )
+        statement = (
+            statement.join(User, User.id == GameResult.user_id)
+            .filter(GameResult.game == game.slug, GameResult.framed_round.between(first_round, last_round))
+            .group_by(GameResult.user_id, User.full_name)
+        )
+        return statement.order_by(desc(text('score')) if descending else text('score')).limit(10)
+
+    @staticmethod
+    async def _top_between(
+        game: GameSpec,
+        first_round: int,
+        last_round: int,
+        chat_id: int | None,
+        score: ColumnElement,
+        descending: bool = True,
+    ):
+        statement = GameResult.top_between_statement(game, first_round, last_round, chat_id, score, descending)
+        async with AsyncScopedSession() as session:
+            result = await session.execute(statement)
+            return result.all()
+
+    @staticmethod
+    async def top_score_between(game: GameSpec, first_round: int, last_round: int, chat_id: int | None = None):
+        score = func.sum(GameResult.score_expression())
+        return await GameResult._top_between(game, first_round, last_round, chat_id, score)
+
+    @staticmethod
+    async def top_average_frame_between(game: GameSpec, first_round: int, last_round: int, chat_id: int | None = None):
+        win_frames_total = func.sum(case((GameResult.won.is_(True), GameResult.win_frame), else_=0))
+        wins = func.sum(case((GameResult.won.is_(True), 1), else_=0))
+        average_frame = cast(win_frames_total, Float) / func.nullif(wins, 0)
+        return await GameResult._top_between(game, first_round, last_round, chat_id, average_frame, descending=False)
+
+    @staticmethod
+    async def top_rounds_between(game: GameSpec, first_round: int, last_round: int, chat_id: int | None = None):
+        return await GameResult._top_between(game, first_round, last_round, chat_id, func.count())
+
+    @staticmethod
+    async def top_won_between(game: GameSpec, first_round: int, last_round: int, chat_id: int | None = None):
+        wins = func.sum(case((GameResult.won.is_(True), 1), else_=0))
+        return await GameResult._top_between(game, first_round, last_round, chat_id, wins)
+
+    @staticmethod
+    async def stream_rows(
+        chunk_size: int, user_id: int | None = None, chat_id: int | None = None
+    ) -> AsyncIterator[Sequence[Row]]:
+        """Results of a user or of a chat with the player names, read through a server-side cursor in chunks."""
+        statement = (
+            Select(
+                GameResult.game,
+                GameResult.framed_round,
+                GameResult.won,
+                GameResult.win_frame,
+                GameResult.user_id,
+                User.full_name,
+                GameResult.chat_id,
+            )
+            .join(User, User.id == GameResult.user_id)
+            .order_by(GameResult.id)
+        )
+        if user_id is not None:
+            statement = statement.filter(GameResult.user_id == user_id)
+        if chat_id is not None:
+            statement = statement.filter(GameResult.chat_id == chat_id)
+        async with AsyncScopedSession() as session:
+            result = await session.stream(statement.execution_options(yield_per=chunk_size))
+            async for chunk in result.partitions():
+                yield chunk
+
+    @staticmethod
+    def user_columns_statement(user_id: int) -> Select:
+        previous_round = func.lag(GameResult.framed_round).over(
+            partition_by=GameResult.game, order_by=GameResult.framed_round
+        )
+        consecutive = func.coalesce(GameResult.framed_round - previous_round, 0) == 1
+        code = case((and_(GameResult.won.is_(True), consecutive), 1), (GameResult.won.is_(True), 2), else_=0)
+        return (
+            Select(GameResult.game, code, func.coalesce(GameResult.win_frame, 0), GameResult.framed_round)
+            .filter(GameResult.user_id == user_id)
+            .order_by(GameResult.game, GameResult.framed_round)
+        )
+
+    @staticmethod
+    async def user_columns(
+        user_id: int,
+    ) -> tuple[tuple[str, ...], tuple[int, ...], tuple[int, ...], tuple[int, ...]]:
+        """A user's results in round order per game as columns of game, result code, win frame and round.
+
+        The code is 0 for a loss, 1 for a win right after the previous round and 2 for a win after a round
+        the user skipped, so streaks can be cut without looking at round numbers again. The win frame is 0
+        for a loss.
+        """
+        async with AsyncScopedSession() as session:
+            result = await session.execute(GameResult.user_columns_statement(user_id))
+            columns = tuple(zip(*result.all(), strict=True))
+        if not columns:
+            return (), (), (), ()
+        games, codes, frames, rounds = columns
+        return games, codes, frames, rounds
@@ -1,11 +1,17 @@
 from __future__ import annotations
 
-from sqlalchemy import Select
+from collections.abc import AsyncIterator, Collection, Mapping, Sequence
+
+from sqlalchemy import Select, delete, literal, or_, true, update
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.types import BigInteger
-from telegram import Chat as TgChat
 
-from .db import AsyncScopedSession, Base
+from config import GROUP_CACHE_SIZE
+
+from .cache import LruCache
+from .chat_member import ChatMember
+from .db import AsyncScopedSession, Base, upsert
+from .game_result import GameResult
 
 
 class Group(Base):
@@ -13,17 +19,21 @@ class Group(Base):
 
     id: Mapped[int] = mapped_column('id', BigInteger, primary_key=True)
     title: Mapped[str] = mapped_column()
+    # Cleared when the bot was removed from the chat; a new message from the chat sets it again.
+    active: Mapped[bool] = mapped_column(server_default=true())
 
     @staticmethod
-    async def update_from_tg_chat(tg_chat: TgChat) -> None:
+    async def upsert_titles(titles: Mapping[int, str]) -> None:
+        if not titles:
+            return
+        statement = upsert(Group).values([{'id': group_id, 'title': title} for group_id, title in titles.items()])
+        statement = statement.on_conflict_do_update(
+            index_elements=[Group.id],
+            set_={'title': statement.excluded.title, 'active': True},
+            where=or_(Group.title != statement.excluded.title, Group.active.is_(False)),
+        )
         async with AsyncScopedSession() as session:
-            result = await session.execute(Select(Group).filter(Group.id == tg_chat.id))
-            group = result.scalars().first()
-            if not group:
-                group = Group(id=tg_chat.id)
-            group.title = tg_chat.title or ''
-            session.add(group)
-            await session.commit()
+            await session.execute(statement)
 
     @staticmethod
     async def get(group_id: int) -> Group | None:
@@ -32,7 +42,103 @@ class Group(Base):
             return result.scalars().first()
 
     @staticmethod
-    async def get_all() -> list[Group]:
+    async def ids_after(group_id: int | None, limit: int, active_only: bool = True) -> list[int]:
+        """Next ``limit`` group ids in id order, starting after ``group_id``."""
+        statement = Select(Group.id)
+        if active_only:
+            statement = statement.filter(Group.active.is_(True))
+        if group_id is not None:
+            statement = statement.filter(Group.id > group_id)
         async with AsyncScopedSession() as session:
-            result = await session.execute(Select(Group))
+            result = await session.execute(statement.order_by(Group.id).limit(limit))
             return list(result.scalars().all())
+
+    @staticmethod
+    async def iter_ids(batch_size: int, after: int | None = None, active_only: bool = True) -> AsyncIterator[list[int]]:
+        """Stream group ids in id-ordered batches with memory bounded by ``batch_size``.
+
+        Every batch is a keyset-paginated query of its own, so a slow consumer does not hold a connection or
+        a transaction open between batches, and groups added meanwhile are still picked up.
+        """
+        while group_ids := await Group.ids_after(after, batch_size, active_only):
+            yield group_ids
+            after = group_ids[-1]
+
+    @staticmethod
+    async def deactivate(group_ids: Sequence[int]) -> None:
+        if not group_ids:
+            return
+        async with AsyncScopedSession() as session:
+            await session.execute(update(Group).filter(Group.id.in_(group_ids)).values(active=False))
+
+    @staticmethod
+    async def reactivate(group_ids: Collection[int]) -> None:
+        """Set ``active`` again for those of the groups that were deactivated; the rest are not touched."""
+        if not group_ids:
+            return
+        async with AsyncScopedSession() as session:
+            await session.execute(
+                update(Group).filter(Group.id.in_(group_ids), Group.active.is_(False)).values(active=True)
+            )
+
+    @staticmethod
+    async def migrate(old_id: int, new_id: int) -> None:
+        """Move a group that became a supergroup to its new id, with its members and results."""
+        async with AsyncScopedSession() as session:
+            title = await session.scalar(Select(Group.title).filter(Group.id == old_id))
+            if title is not None:
+                statement = upsert(Group).values(id=new_id, title=title)
+                await session.execute(statement.on_conflict_do_update(index_elements=[Group.id], set_={'active': True}))
+            members = Select(literal(new_id), ChatMember.user_id).filter(ChatMember.chat_id == old_id)
+            await session.execute(
+                upsert(ChatMember)
+                .from_select(['chat_id', 'user_id'], members)
+                .on_conflict_do_nothing(index_elements=[ChatMember.chat_id, ChatMember.user_id])
+            )
+            await session.execute(delete(ChatMember).filter(ChatMember.chat_id == old_id))
+            await session.execute(update(GameResult).filter(GameResult.chat_id == old_id).values(chat_id=new_id))
+            await session.execute(delete(Group).filter(Group.id == old_id))
+
+
+class GroupCache:
+    """Write-behind cache of group titles.
+
+    Titles are remembered per chat id, so a message in a group whose title did not change costs no write.
+    Changed titles are coalesced into ``pending`` and written by :meth:`flush` in one batched upsert.
+
+    Another process may have deactivated a group this one still remembers, so the ids of all groups heard
+    from are collected in ``seen`` as well, and :meth:`flush` sets them active again in one update.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.titles: LruCache[int, str] = LruCache(max_size, 'group_titles')
+        self.pending: dict[int, str] = {}
+        self.seen: set[int] = set()
+
+    def record(self, group_id: int, title: str) -> None:
+        if self.titles.get(group_id) == title:
+            self.seen.add(group_id)
+            return
+        self.titles.put(group_id, title)
+        self.pending[group_id] = title
+
+    async def flush(self) -> None:
+        pending, self.pending = self.pending, {}
+        # Groups with a pending title are set active by the upsert.
+        seen, self.seen = self.seen - pending.keys(), set()
+        try:
+            await Group.upsert_titles(pending)
+            await Group.reactivate(seen)
+        except Exception:
+            # Newer titles recorded during the failed write win over the ones being restored.
+            self.pending = pending | self.pending
+            self.seen |= seen
+            raise
+
+    def forget(self, group_ids: Sequence[int]) -> None:
+        """Drop remembered titles, so the next message from these groups is written again."""
+        for group_id in group_ids:
+            self.titles.discard(group_id)
+
+
+group_cache = GroupCache(GROUP_CACHE_SIZE)
@@ -0,0 +1,72 @@
+"""Rebuilding and verifying ``user_game_stats`` from raw results."""
+
+from dataclasses import dataclass
+
+from sqlalchemy import Select, delete, insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from .chat_member import ChatMember
+from .db import engine, upsert
+from .game_result import GameResult
+from .user_game_stats import UserGameStats
+
+STATS_COLUMNS = ('user_id', 'game', 'rounds', 'wins', 'win_frames_total', 'score')
+
+
+@dataclass(frozen=True, slots=True)
+class StatsMismatch:
+    user_id: int
+    game: str
+    expected: tuple[int, int, int, int] | None
+    actual: tuple[int, int, int, int] | None
+
+
+async def rebuild_user_game_stats(conn: AsyncConnection) -> int:
+    """Recompute every row of ``user_game_stats`` from ``game_result`` inside the caller's transaction."""
+    await conn.execute(delete(UserGameStats))
+    result = await conn.execute(insert(UserGameStats).from_select(STATS_COLUMNS, GameResult.totals_by_user()))
+    return result.rowcount
+
+
+async def rebuild_chat_members(conn: AsyncConnection) -> int:
+    """Add memberships for every chat a result was recorded in."""
+    members = Select(GameResult.chat_id, GameResult.user_id).filter(GameResult.chat_id.is_not(None)).distinct()
+    statement = (
+        upsert(ChatMember)
+        .from_select(['chat_id', 'user_id'], members)
+        .on_conflict_do_nothing(index_elements=[ChatMember.chat_id, ChatMember.user_id])
+    )
+    result = await conn.execute(statement)
+    return result.rowcount
+
+
+async def _totals(conn: AsyncConnection, statement: Select) -> dict[tuple[int, str], tuple[int, int, int, int]]:
+    result = await conn.execute(statement)
+    return {
+        (user_id, game): (rounds, wins, win_frames_total, score)
+        for user_id, game, rounds, wins, win_frames_total, score in result.all()
+    }
+
+
+async def check_user_game_stats() -> list[StatsMismatch]:
+    """Compare ``user_game_stats`` with totals aggregated from raw results."""
+    async with engine.connect() as conn:
+        expected = await _totals(conn, GameResult.totals_by_user())
+        actual = await _totals(
+            conn,
+            Select(
+                UserGameStats.user_id,
+                UserGameStats.game,
+                UserGameStats.rounds,
+                UserGameStats.wins,
+                UserGameStats.win_frames_total,
+                UserGameStats.score,
+            ),
+        )
+    mismatches = []
+    for user_id, game in sorted(expected.keys() | actual.keys()):
+        expected_totals = expected.get((user_id, game))
+        actual_totals = actual.get((user_id, game))
+        if expected_totals != actual_totals:
+            mismatches.append(StatsMismatch(user_id, game, expected_totals, actual_totals))
+    return mismatches
@@ -0,0 +1,138 @@
+"""Schema changes that ``Base.metadata.create_all`` cannot apply to an existing database."""
+
+import logging
+
+from sqlalchemy import (
+    ClauseElement,
+    Connection,
+    DefaultClause,
+    Table,
+    column,
+    exists,
+    func,
+    inspect,
+    literal,
+    select,
+    table,
+)
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from .chat_member import ChatMember
+from .db import Base, upsert
+from .game_result import GameResult
+from .group import Group
+from .maintenance import rebuild_chat_members, rebuild_user_game_stats
+from .user_game_stats import UserGameStats
+
+logger = logging.getLogger(__name__)
+
+# Result tables used before all games moved into ``game_result``, with the game stored in each.
+LEGACY_RESULT_TABLES = {'framed_result': 'framed', 'episode_result': 'episode'}
+# Advisory lock held while a process applies the schema; any number all the bot's processes agree on.
+SCHEMA_LOCK_KEY = 0x6672616D
+
+
+async def lock_schema(conn: AsyncConnection) -> None:
+    """Wait until no other process is applying the schema; the lock is held until ``conn``'s transaction ends.
+
+    The ingress and the workers start together and each runs ``create_all`` and the migrations. Side by
+    side, one would fail on a table another has just created, or copy from a legacy table it has just
+    renamed. SQLite has a single writer anyway.
+    """
+    if conn.dialect.name == 'postgresql':
+        await conn.execute(select(func.pg_advisory_xact_lock(SCHEMA_LOCK_KEY)))
+
+
+def _migrate_legacy_results(connection: Connection, table_name: str, game: str) -> None:
+    """Copy a per-game result table into ``game_result`` and keep it as ``<name>_migrated``.
+
+    Repeated (user_id, framed_round) rows are skipped, keeping the earliest one.
+    """
+    legacy = table(
+        table_name, column('id'), column('user_id'), column('framed_round'), column('won'), column('win_frame')
+    )
+    rows = select(literal(game), legacy.c.user_id, legacy.c.framed_round, legacy.c.won, legacy.c.win_frame).order_by(
+        legacy.c.id
+    )
+    statement = (
+        upsert(GameResult)
+        .from_select(['game', 'user_id', 'framed_round', 'won', 'win_frame'], rows)
+        .on_conflict_do_nothing(index_elements=[GameResult.game, GameResult.user_id, GameResult.framed_round])
+    )
+    copied = connection.execute(statement).rowcount
+    connection.exec_driver_sql(f'ALTER TABLE {table_name} RENAME TO {table_name}_migrated')
+    logger.info('Moved %d results from %s to %s', copied, table_name, GameResult.__tablename__)
+
+
+def _add_missing_columns(connection: Connection, model_table: Table) -> None:
+    """Add nullable or server-defaulted columns that were introduced after the table had been created."""
+    existing_columns = {existing['name'] for existing in inspect(connection).get_columns(model_table.name)}
+    for model_column in model_table.columns:
+        if model_column.name in existing_columns:
+            continue
+        definition = model_column.type.compile(connection.dialect)
+        server_default = model_column.server_default
+        if isinstance(server_default, DefaultClause) and isinstance(server_default.arg, ClauseElement):
+            default = server_default.arg.compile(dialect=connection.dialect)
+            definition += f' NOT NULL DEFAULT {default}'
+        elif not model_column.nullable:
+            continue
+        connection.exec_driver_sql(f'ALTER TABLE "{model_table.name}" ADD COLUMN {model_column.name} {definition}')
+        logger.info('Added column %s.%s', model_table.name, model_column.name)
+
+
+def _rebuild_changed_indexes(connection: Connection, model_table: Table) -> None:
+    """Create indexes added after the table had been created and recreate those whose columns changed."""
+    existing_indexes = {
+        existing['name']: existing['column_names'] for existing in inspect(connection).get_indexes(model_table.name)
+    }
+    for index in model_table.indexes:
+        columns = [index_column.name for index_column in index.columns]
+        if index.name not in existing_indexes:
+            index.create(connection)
+            logger.info('Created index %s on %s', index.name, ', '.join(columns))
+            continue
+        if existing_indexes[index.name] == columns:
+            continue
+        index.drop(connection)
+        index.create(connection)
+        logger.info('Rebuilt index %s on %s', index.name, ', '.join(columns))
+
+
+def _table_of(model: type[Base]) -> Table:
+    return Base.metadata.tables[model.__tablename__]
+
+
+def _migrate(connection: Connection) -> None:
+    existing_tables = set(inspect(connection).get_table_names())
+    for table_name, game in LEGACY_RESULT_TABLES.items():
+        if table_name in existing_tables:
+            _migrate_legacy_results(connection, table_name, game)
+    _add_missing_columns(connection, _table_of(GameResult))
+    _add_missing_columns(connection, _table_of(Group))
+    _rebuild_changed_indexes(connection, _table_of(GameResult))
+
+
+async def _backfill_user_game_stats(conn: AsyncConnection) -> None:
+    has_stats = await conn.scalar(select(exists().select_from(UserGameStats)))
+    has_results = await conn.scalar(select(exists().select_from(GameResult)))
+    if has_stats or not has_results:
+        return
+    rebuilt = await rebuild_user_game_stats(conn)
+    logger.info('Filled %s with %d rows', UserGameStats.__tablename__, rebuilt)
+
+
+async def _backfill_chat_members(conn: AsyncConnection) -> None:
+    """Derive memberships from results that recorded their chat; older results have none to offer."""
+    has_members = await conn.scalar(select(exists().select_from(ChatMember)))
+    has_chat_results = await conn.scalar(select(exists().where(GameResult.chat_id.is_not(None))))
+    if has_members or not has_chat_results:
+        return
+    added = await rebuild_chat_members(conn)
+    logger.info('Filled %s with %d rows', ChatMember.__tablename__, added)
+
+
+async def run_migrations(conn: AsyncConnection) -> None:
+    await conn.run_sync(_migrate)
+    await _backfill_user_game_stats(conn)
+    await _backfill_chat_members(conn)
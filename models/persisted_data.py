@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+
+from sqlalchemy import LargeBinary, Select, String, delete
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .db import AsyncScopedSession, Base, engine, upsert
+
+
+class PersistedData(Base):
+    """Pickled ``python-telegram-bot`` persistence entries, one row per chat, user or conversation.
+
+    Offline jobs keep their checkpoints here too, under kinds of their own.
+    """
+
+    __tablename__ = 'persisted_data'
+
+    kind: Mapped[str] = mapped_column(String(128), primary_key=True)
+    key: Mapped[str] = mapped_column(String(128), primary_key=True)
+    data: Mapped[bytes] = mapped_column(LargeBinary)
+
+    @staticmethod
+    async def create_table() -> None:
+        """The application loads its persistence before ``post_init`` creates the schema."""
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.tables[PersistedData.__tablename__].create, checkfirst=True)
+
+    @staticmethod
+    async def load(kind: str) -> dict[str, bytes]:
+        async with AsyncScopedSession() as session:
+            result = await session.execute(
+                Select(PersistedData.key, PersistedData.data).filter(PersistedData.kind == kind)
+            )
+            return {key: data for key, data in result.all()}
+
+    @staticmethod
+    async def write(entries: Mapping[tuple[str, str], bytes]) -> None:
+        if not entries:
+            return
+        statement = upsert(PersistedData).values(
+            [{'kind': kind, 'key': key, 'data': data} for (kind, key), data in sorted(entries.items())]
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[PersistedData.kind, PersistedData.key], set_={'data': statement.excluded.data}
+        )
+        async with AsyncScopedSession() as session:
+            await session.execute(statement)
+
+    @staticmethod
+    async def drop(kind: str, key: str) -> None:
+        async with AsyncScopedSession() as session:
+            await session.execute(delete(PersistedData).filter(PersistedData.kind == kind, PersistedData.key == key))
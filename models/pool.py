@@ -0,0 +1,78 @@
+"""Engine and connection pool settings, with metrics on how long handlers wait for a connection."""
+
+import asyncio
+import contextlib
+import time
+
+from sqlalchemy import exc, make_url, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+
+from config import (
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_STATEMENT_CACHE_SIZE,
+)
+from metrics import Counter, Gauge, Histogram
+
+checkout_wait_seconds = Histogram(
+    'framed_bot_db_pool_checkout_wait_seconds',
+    'Time spent waiting for a pooled connection',
+    (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30),
+)
+checkout_timeouts = Counter('framed_bot_db_pool_checkout_timeouts', 'Checkouts that gave up waiting for a connection')
+checked_out = Gauge('framed_bot_db_pool_checked_out', 'Connections currently in use')
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited."""
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            checkout_timeouts.inc()
+            raise
+        finally:
+            checkout_wait_seconds.observe(time.perf_counter() - started)
+        checked_out.set(self.checkedout())
+        return connection
+
+    def _do_return_conn(self, record: ConnectionPoolEntry) -> None:
+        super()._do_return_conn(record)
+        checked_out.set(self.checkedout())
+
+
+def create_pooled_engine(url: str) -> AsyncEngine:
+    """Async engine for ``url``, with the pool settings from ``config`` for PostgreSQL."""
+    database_url = make_url(url)
+    if database_url.get_backend_name() != 'postgresql':
+        return create_async_engine(database_url)
+    # SQLAlchemy's cache of prepared statements, and asyncpg's own one below it.
+    database_url = database_url.update_query_dict({'prepared_statement_cache_size': str(DB_STATEMENT_CACHE_SIZE)})
+    return create_async_engine(
+        database_url,
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={'statement_cache_size': DB_STATEMENT_CACHE_SIZE},
+    )
+
+
+async def warm_up(engine: AsyncEngine, connections: int) -> None:
+    """Open ``connections`` pooled connections at once, so the first burst of updates does not pay for them."""
+    async with contextlib.AsyncExitStack() as stack:
+        opened = await asyncio.gather(
+            *(stack.enter_async_context(engine.connect()) for _ in range(connections)), return_exceptions=True
+        )
+        for connection in opened:
+            if isinstance(connection, BaseException):
+                raise connection
+            await connection.execute(text('SELECT 1'))
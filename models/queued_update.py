@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from sqlalchemy import BigInteger, Select, Text, delete, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .db import AsyncScopedSession, Base, upsert
+
+
+class QueuedUpdate(Base):
+    """Raw updates handed from the ingress process to the workers, keyed by Telegram's ``update_id``."""
+
+    __tablename__ = 'queued_update'
+
+    update_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    payload: Mapped[str] = mapped_column(Text)
+
+    @staticmethod
+    async def put(update_id: int, chat_id: int, payload: str) -> bool:
+        """Queue an update and report whether it was new; a redelivered update is queued only once."""
+        statement = (
+            upsert(QueuedUpdate)
+            .values(update_id=update_id, chat_id=chat_id, payload=payload)
+            .on_conflict_do_nothing(index_elements=[QueuedUpdate.update_id])
+            .returning(QueuedUpdate.update_id)
+        )
+        async with AsyncScopedSession() as session:
+            result = await session.execute(statement)
+            return result.first() is not None
+
+    @staticmethod
+    async def claim(partition: int, partitions: int, limit: int) -> list[QueuedUpdate]:
+        """Oldest updates of one partition; a partition is the chats with ``abs(chat_id) % partitions``."""
+        async with AsyncScopedSession() as session:
+            result = await session.execute(
+                Select(QueuedUpdate)
+                .filter(func.abs(QueuedUpdate.chat_id) % partitions == partition)
+                .order_by(QueuedUpdate.update_id)
+                .limit(limit)
+            )
+            return list(result.scalars().all())
+
+    @staticmethod
+    async def ack(update_ids: Sequence[int]) -> None:
+        if not update_ids:
+            return
+        async with AsyncScopedSession() as session:
+            await session.execute(delete(QueuedUpdate).filter(QueuedUpdate.update_id.in_(update_ids)))
@@ -1,10 +1,18 @@
 from __future__ import annotations
 
-from sqlalchemy import Select
+from collections.abc import Mapping
+
+from sqlalchemy import Select, or_
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from telegram import User as TgUser
 
-from .db import AsyncScopedSession, Base, ResultForStats
+from config import USER_CACHE_SIZE
+
+from .cache import LruCache
+from .db import AsyncScopedSession, Base, GameResultForStats, upsert
+
+# Last (full_name, username) written for each user id, so unchanged profiles skip the database entirely.
+seen_profiles: LruCache[int, tuple[str, str]] = LruCache(USER_CACHE_SIZE, 'user_profiles')
 
 
 class User(Base):
@@ -14,20 +22,37 @@ class User(Base):
     full_name: Mapped[str] = mapped_column()
     username: Mapped[str] = mapped_column()
 
-    framed_results: Mapped[list[ResultForStats]] = relationship('FramedResult', back_populates='user', lazy='joined')
-    episode_results: Mapped[list[ResultForStats]] = relationship('EpisodeResult', back_populates='user', lazy='joined')
+    results: Mapped[list[GameResultForStats]] = relationship('GameResult', back_populates='user', lazy='raise')
 
     @staticmethod
     async def update_from_tg_user(tg_user: TgUser) -> None:
+        profile = (tg_user.full_name, tg_user.username or '')
+        if seen_profiles.get(tg_user.id) == profile:
+            return
+        full_name, username = profile
+        statement = upsert(User).values(id=tg_user.id, full_name=full_name, username=username)
+        statement = statement.on_conflict_do_update(
+            index_elements=[User.id],
+            set_={'full_name': statement.excluded.full_name, 'username': statement.excluded.username},
+            where=or_(User.full_name != statement.excluded.full_name, User.username != statement.excluded.username),
+        )
+        async with AsyncScopedSession() as session:
+            await session.execute(statement)
+        seen_profiles.put(tg_user.id, profile)
+
+    @staticmethod
+    async def add_missing(full_names: Mapping[int, str]) -> None:
+        """Create users that are not known yet; profiles of known users are newer than any import and stay."""
+        if not full_names:
+            return
+        statement = upsert(User).values(
+            [
+                {'id': user_id, 'full_name': full_name, 'username': ''}
+                for user_id, full_name in sorted(full_names.items())
+            ]
+        )
         async with AsyncScopedSession() as session:
-            result = await session.execute(Select(User).filter(User.id == tg_user.id))
-            user = result.scalars().first()
-            if not user:
-                user = User(id=tg_user.id)
-            user.full_name = tg_user.full_name
-            user.username = tg_user.username or ''
-            session.add(user)
-            await session.commit()
+            await session.execute(statement.on_conflict_do_nothing(index_elements=[User.id]))
 
     @staticmethod
     async def get(user_id: int) -> User | None:
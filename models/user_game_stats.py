@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import Any
+
+from sqlalchemy import ColumnElement, Float, ForeignKey, Index, Select, String, cast, desc, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute, Mapped, aliased, mapped_column
+
+from games import GAMES, GameSpec
+
+from .chat_member import ChatMember
+from .db import AsyncScopedSession, Base, ResultRow, upsert
+from .user import User
+
+
+class UserGameStats(Base):
+    """Per-user, per-game totals kept in step with ``game_result``, so boards and /stats scale with players."""
+
+    __tablename__ = 'user_game_stats'
+    __table_args__ = (Index('ix_user_game_stats_game_score', 'game', 'score'),)
+
+    user_id: Mapped[int] = mapped_column(ForeignKey('user.id'), primary_key=True)
+    game: Mapped[str] = mapped_column(String(32), primary_key=True)
+    rounds: Mapped[int] = mapped_column(default=0)
+    wins: Mapped[int] = mapped_column(default=0)
+    win_frames_total: Mapped[int] = mapped_column(default=0)
+    score: Mapped[int] = mapped_column(default=0)
+
+    @staticmethod
+    async def add_results(session: AsyncSession, rows: Sequence[ResultRow]) -> None:
+        """Add newly saved results to the totals inside the caller's transaction."""
+        increments: dict[tuple[int, str], list[int]] = {}
+        for row in rows:
+            totals = increments.setdefault((row.user_id, row.game), [0, 0, 0, 0])
+            totals[0] += 1
+            if row.won:
+                totals[1] += 1
+                totals[2] += row.win_frame or 0
+            totals[3] += GAMES[row.game].score(row.won, row.win_frame)
+        if not increments:
+            return
+
+        statement = upsert(UserGameStats).values(
+            [
+                {
+                    'user_id': user_id,
+                    'game': game,
+                    'rounds': rounds,
+                    'wins': wins,
+                    'win_frames_total': win_frames_total,
+                    'score': score,
+                }
+                # Sorted, so concurrent writers lock rows in the same order.
+                for (user_id, game), (rounds, wins, win_frames_total, score) in sorted(increments.items())
+            ]
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[UserGameStats.user_id, UserGameStats.game],
+            set_={
+                'rounds': UserGameStats.rounds + statement.excluded.rounds,
+                'wins': UserGameStats.wins + statement.excluded.wins,
+                'win_frames_total': UserGameStats.win_frames_total + statement.excluded.win_frames_total,
+                'score': UserGameStats.score + statement.excluded.score,
+            },
+        )
+        await session.execute(statement)
+
+    @staticmethod
+    def user_totals_statement(user_id: int) -> Select:
+        return (
+            Select(
+                UserGameStats.game,
+                func.coalesce(UserGameStats.rounds, 0).label('rounds_count'),
+                func.coalesce(UserGameStats.wins, 0).label('rounds_won_count'),
+                func.coalesce(UserGameStats.win_frames_total, 0).label('win_frames_total'),
+            )
+            .select_from(User)
+            .outerjoin(UserGameStats, UserGameStats.user_id == User.id)
+            .filter(User.id == user_id)
+        )
+
+    @staticmethod
+    def score_percentiles_statement(user_id: int) -> Select:
+        others = aliased(UserGameStats)
+        below = (
+            Select(func.count())
+            .select_from(others)
+            .filter(others.game == UserGameStats.game, others.score < UserGameStats.score)
+            .scalar_subquery()
+        )
+        players = Select(func.count()).select_from(others).filter(others.game == UserGameStats.game).scalar_subquery()
+        return Select(UserGameStats.game, below, players).filter(UserGameStats.user_id == user_id)
+
+    @staticmethod
+    async def score_percentiles(user_id: int) -> dict[str, float]:
+        """Per game, the percentage of players scoring lower than the user; games nobody else played are left out.
+
+        Both counts are range scans of the (game, score) index, however many players a game has.
+        """
+        async with AsyncScopedSession() as session:
+            result = await session.execute(UserGameStats.score_percentiles_statement(user_id))
+            return {game: 100 * below / players for game, below, players in result.all() if players > 1}
+
+    @staticmethod
+    async def user_totals(user_id: int):
+        """Per-game totals of a user in one query.
+
+        Returns no rows for an unknown user and a single row with ``game`` set to ``None`` for a user
+        without results.
+        """
+        async with AsyncScopedSession() as session:
+            result = await session.execute(UserGameStats.user_totals_statement(user_id))
+            return result.all()
+
+    @staticmethod
+    def top_statement(
+        game: GameSpec,
+        chat_id: int | None,
+        score: ColumnElement[Any] | InstrumentedAttribute[Any],
+        descending: bool = True,
+    ) -> Select:
+        statement = Select(User.full_name.label('name'), score.label('score'))
+        if chat_id is None:
+            statement = statement.select_from(UserGameStats)
+        else:
+            # Start from the chat's members, so only their stats rows are read.
+            statement = (
+                statement.select_from(ChatMember)
+                .join(UserGameStats, UserGameStats.user_id == ChatMember.user_id)
+                .filter(ChatMember.chat_id == chat_id)
+            )
+        statement = statement.join(User, User.id == UserGameStats.user_id).filter(UserGameStats.game == game.slug)
+        return statement.order_by(desc(text('score')) if descending else text('score')).limit(10)
+
+    @staticmethod
+    async def _top(
+        game: GameSpec,
+        chat_id: int | None,
+        score: ColumnElement[Any] | InstrumentedAttribute[Any],
+        descending: bool = True,
+    ):
+        statement = UserGameStats.top_statement(game, chat_id, score, descending)
+        async with AsyncScopedSession() as session:
+            result = await session.execute(statement)
+            return result.all()
+
+    @staticmethod
+    async def top_score(game: GameSpec, chat_id: int | None = None):
+        return await UserGameStats._top(game, chat_id, UserGameStats.score)
+
+    @staticmethod
+    async def top_average_frame(game: GameSpec, chat_id: int | None = None):
+        average_frame = cast(UserGameStats.win_frames_total, Float) / func.nullif(UserGameStats.wins, 0)
+        return await UserGameStats._top(game, chat_id, average_frame, descending=False)
+
+    @staticmethod
+    async def top_rounds(game: GameSpec, chat_id: int | None = None):
+        return await UserGameStats._top(game, chat_id, UserGameStats.rounds)
+
+    @staticmethod
+    async def top_won(game: GameSpec, chat_id: int | None = None):
+        return await UserGameStats._top(game, chat_id, UserGameStats.wins)
@@ -0,0 +1,182 @@
+"""``python-telegram-bot`` persistence kept in the bot's database.
+
+Every chat, user and conversation is pickled into a row of its own, so an update touches only the rows
+whose data changed instead of rewriting one big pickle file. Unchanged data is recognised by a digest of
+its last written pickle and skipped, and the rows staged by one persistence run are written together in a
+single upsert.
+"""
+
+import asyncio
+import hashlib
+import json
+import pickle
+from collections.abc import Awaitable, Iterable
+from typing import Any
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from models.persisted_data import PersistedData
+
+USER_DATA = 'user_data'
+CHAT_DATA = 'chat_data'
+BOT_DATA = 'bot_data'
+CALLBACK_DATA = 'callback_data'
+SINGLE_KEY = ''
+# Rows staged together while importing, well below the bind parameter limits of both dialects.
+IMPORT_CHUNK_SIZE = 1000
+
+
+def pickle_data(value: object) -> bytes:
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def conversation_kind(name: str) -> str:
+    return f'conversation:{name}'
+
+
+class DatabasePersistence(BasePersistence[dict[Any, Any], dict[Any, Any], dict[Any, Any]]):
+    def __init__(self, store_data: PersistenceInput | None = None, update_interval: float = 60) -> None:
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self._digests: dict[tuple[str, str], bytes] = {}
+        self._pending: dict[tuple[str, str], bytes] = {}
+        self._lock = asyncio.Lock()
+        self._table_ready = False
+
+    async def _load(self, kind: str) -> dict[str, Any]:
+        if not self._table_ready:
+            await PersistedData.create_table()
+            self._table_ready = True
+        loaded = {}
+        for key, data in (await PersistedData.load(kind)).items():
+            loaded[key] = pickle.loads(data)  # noqa: S301 - written by this bot
+            # Digest of a fresh pickle, so rows written with another protocol are not rewritten unchanged.
+            self._digests[(kind, key)] = digest(pickle_data(loaded[key]))
+        return loaded
+
+    async def _store(self, kind: str, key: str, value: object) -> None:
+        data = pickle_data(value)
+        previous = self._digests.get((kind, key))
+        # Chats and users that never stored anything do not need a row.
+        if previous == digest(data) or (previous is None and value in ({}, None)):
+            return
+        self._pending[(kind, key)] = data
+        # Let the other updates of the same persistence run stage their rows first.
+        await asyncio.sleep(0)
+        await self._write_pending()
+
+    async def _write_pending(self) -> None:
+        async with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            try:
+                await PersistedData.write(pending)
+            except Exception:
+                self._pending = pending | self._pending
+                raise
+            for entry, data in pending.items():
+                self._digests[entry] = digest(data)
+
+    async def _drop(self, kind: str, key: str) -> None:
+        # A write that is already running may hold this entry; deleting before it finishes would resurrect it.
+        async with self._lock:
+            self._pending.pop((kind, key), None)
+            if self._digests.pop((kind, key), None) is not None:
+                await PersistedData.drop(kind, key)
+
+    async def get_user_data(self) -> dict[int, dict[Any, Any]]:
+        return {int(key): value for key, value in (await self._load(USER_DATA)).items()}
+
+    async def get_chat_data(self) -> dict[int, dict[Any, Any]]:
+        return {int(key): value for key, value in (await self._load(CHAT_DATA)).items()}
+
+    async def get_bot_data(self) -> dict[Any, Any]:
+        return (await self._load(BOT_DATA)).get(SINGLE_KEY, {})
+
+    async def get_callback_data(self) -> Any:
+        return (await self._load(CALLBACK_DATA)).get(SINGLE_KEY)
+
+    async def get_conversations(self, name: str) -> dict[tuple[int | str, ...], object]:
+        loaded = await self._load(conversation_kind(name))
+        return {tuple(json.loads(key)): state for key, state in loaded.items()}
+
+    async def update_user_data(self, user_id: int, data: dict[Any, Any]) -> None:
+        await self._store(USER_DATA, str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict[Any, Any]) -> None:
+        await self._store(CHAT_DATA, str(chat_id), data)
+
+    async def update_bot_data(self, data: dict[Any, Any]) -> None:
+        await self._store(BOT_DATA, SINGLE_KEY, data)
+
+    async def update_callback_data(self, data: Any) -> None:
+        await self._store(CALLBACK_DATA, SINGLE_KEY, data)
+
+    async def update_conversation(self, name: str, key: tuple[int | str, ...], new_state: object | None) -> None:
+        conversation_key = json.dumps(list(key))
+        if new_state is None:
+            await self._drop(conversation_kind(name), conversation_key)
+            return
+        await self._store(conversation_kind(name), conversation_key, new_state)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await self._drop(CHAT_DATA, str(chat_id))
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self._drop(USER_DATA, str(user_id))
+
+    async def refresh_user_data(self, user_id: int, user_data: dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict[Any, Any]) -> None:
+        pass
+
+    async def flush(self) -> None:
+        await self._write_pending()
+
+
+async def _gather_in_chunks(updates: Iterable[Awaitable[None]]) -> int:
+    """Await the updates in concurrent chunks, so each chunk is staged and written as one upsert."""
+    count = 0
+    chunk: list[Awaitable[None]] = []
+    for update in updates:
+        chunk.append(update)
+        if len(chunk) == IMPORT_CHUNK_SIZE:
+            await asyncio.gather(*chunk)
+            count += len(chunk)
+            chunk = []
+    await asyncio.gather(*chunk)
+    return count + len(chunk)
+
+
+async def copy_persistence(
+    source: BasePersistence, target: BasePersistence, conversation_names: Iterable[str] = ()
+) -> dict[str, int]:
+    """Copy everything ``source`` holds into ``target`` and return how many entries of each kind were read."""
+    user_data = await source.get_user_data()
+    chat_data = await source.get_chat_data()
+    copied = {
+        USER_DATA: await _gather_in_chunks(target.update_user_data(key, data) for key, data in user_data.items()),
+        CHAT_DATA: await _gather_in_chunks(target.update_chat_data(key, data) for key, data in chat_data.items()),
+    }
+    bot_data = await source.get_bot_data()
+    await target.update_bot_data(bot_data)
+    copied[BOT_DATA] = 1 if bot_data else 0
+    callback_data = await source.get_callback_data()
+    if callback_data is not None:
+        await target.update_callback_data(callback_data)
+    copied[CALLBACK_DATA] = 0 if callback_data is None else 1
+    for name in conversation_names:
+        conversations = await source.get_conversations(name)
+        copied[conversation_kind(name)] = await _gather_in_chunks(
+            target.update_conversation(name, key, state) for key, state in conversations.items()
+        )
+    await target.flush()
+    return copied
@@ -0,0 +1,54 @@
+"""Single-pass recognition of game results pasted into chats."""
+
+import re
+from dataclasses import dataclass
+
+from games import GAMES_BY_HEADER, GameSpec
+
+
+@dataclass(frozen=True, slots=True)
+class ParsedResult:
+    game: GameSpec
+    round: int
+    won: bool
+    win_frame: int | None
+
+
+# ``game_result.framed_round`` is a 32-bit INTEGER; a larger round would fail the whole batch it is written in.
+MAX_ROUND = 2**31 - 1
+
+# One pattern for every game: the header is looked up in the registry instead of being spelled out
+# in an alternation, so the cost of a message does not grow with the number of games.
+RESULT_PATTERN = re.compile(
+    r'(?P<header>[A-Z]\w*) #(?P<round>\d{1,10})\n'
+    r'(?P<emoji>\S+)(?P<result>(?: (?:🟥|🟩|⬛️?))+)\n\n'
+    r'https://(?P<host>[\w.-]+)'
+)
+
+
+def _parsed_result(game: GameSpec, data_round: str, data_result: str) -> ParsedResult:
+    # Every frame before the green one is red, so counting stops at the first green square.
+    green = data_result.find('🟩')
+    if green == -1:
+        return ParsedResult(game=game, round=int(data_round), won=False, win_frame=None)
+    return ParsedResult(game=game, round=int(data_round), won=True, win_frame=data_result.count('🟥', 0, green) + 1)
+
+
+def parse_results(text: str) -> tuple[ParsedResult, ...]:
+    """Return the first result of every registered game found in ``text``, in a single scan."""
+    # Most group messages are chatter; a substring check rejects them before the regex runs.
+    if 'https://' not in text:
+        return ()
+
+    results: dict[str, ParsedResult] = {}
+    for match in RESULT_PATTERN.finditer(text):
+        game = GAMES_BY_HEADER.get(match['header'])
+        if game is None or game.slug in results:
+            continue
+        data_result = match['result']
+        if match['emoji'] != game.emoji or match['host'] != game.host or data_result.count(' ') != game.grid_length:
+            continue
+        if int(match['round']) > MAX_ROUND:
+            continue
+        results[game.slug] = _parsed_result(game, match['round'], data_result)
+    return tuple(results.values())
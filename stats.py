@@ -2,7 +2,13 @@ import dataclasses
 from collections.abc import Sequence
 from typing import override
 
+from config import LATEST_ROUND_MIN_PLAYERS
+from games import GAMES
 from models.db import ResultForStats
+from models.game_result import GameResult
+from models.user_game_stats import UserGameStats
+
+RECENT_ROUNDS = 30
 
 
 @dataclasses.dataclass(frozen=True)
@@ -10,6 +16,12 @@ class Stats:
     rounds_count: int
     rounds_won_count: int
     average_frame: float | None
+    # Filled in only by user_detailed_stats.
+    frame_counts: tuple[int, ...] = ()
+    current_streak: int = 0
+    longest_streak: int = 0
+    recent_average_frame: float | None = None
+    percentile: float | None = None
 
 
 @dataclasses.dataclass(frozen=True, slots=True)
@@ -33,3 +45,88 @@ async def count_stats(results: Sequence[ResultForStats]) -> Stats:
     average_frame = (total_frames / rounds_won_count) if rounds_won_count else None
 
     return Stats(rounds_count=rounds_count, rounds_won_count=rounds_won_count, average_frame=average_frame)
+
+
+def stats_from_totals(rounds_count: int, rounds_won_count: int, win_frames_total: int) -> Stats:
+    average_frame = (win_frames_total / rounds_won_count) if rounds_won_count else None
+    return Stats(rounds_count=rounds_count, rounds_won_count=rounds_won_count, average_frame=average_frame)
+
+
+async def user_stats(user_id: int) -> dict[str, Stats] | None:
+    """Stats of every game the user played, read from ``user_game_stats``; ``None`` for an unknown user."""
+    totals = await UserGameStats.user_totals(user_id)
+    if not totals:
+        return None
+    by_game = {
+        row.game: stats_from_totals(row.rounds_count, row.rounds_won_count, row.win_frames_total)
+        for row in totals
+        if row.game is not None
+    }
+    return {slug: by_game[slug] for slug in GAMES if slug in by_game}
+
+
+def frame_counts(frames: bytes, grid_length: int) -> tuple[int, ...]:
+    """How many rounds were guessed on each frame; ``frames`` holds one win frame per round, 0 for a loss."""
+    return tuple(frames.count(frame) for frame in range(1, grid_length + 1))
+
+
+def streaks(codes: bytes) -> tuple[int, int]:
+    """Current and longest run of rounds guessed in a row, from the codes of :meth:`GameResult.user_columns`.
+
+    A win after a skipped round starts a new run, so it becomes a separator followed by a win, and the
+    runs are the pieces between losses.
+    """
+    runs = codes.replace(b'\x02', b'\x00\x01').split(b'\x00')
+    return len(runs[-1]), max(map(len, runs))
+
+
+def recent_average_frame(frames: bytes) -> float | None:
+    won = frames[-RECENT_ROUNDS:].replace(b'\x00', b'')
+    return sum(won) / len(won) if won else None
+
+
+def detailed_stats(
+    game_stats: Stats, codes: bytes, frames: bytes, grid_length: int, percentile: float | None, up_to_date: bool
+) -> Stats:
+    """``up_to_date`` tells whether the user played the game's latest round; a run that stopped earlier is over."""
+    current_streak, longest_streak = streaks(codes)
+    if not up_to_date:
+        current_streak = 0
+    return dataclasses.replace(
+        game_stats,
+        frame_counts=frame_counts(frames, grid_length),
+        current_streak=current_streak,
+        longest_streak=longest_streak,
+        recent_average_frame=recent_average_frame(frames),
+        percentile=percentile,
+    )
+
+
+async def user_detailed_stats(user_id: int) -> dict[str, Stats] | None:
+    """:func:`user_stats` with the frame distribution, streaks, recent form and score percentile of each game.
+
+    All of a user's rounds are read in one query as columns and packed into ``bytes``; the per-game
+    numbers are then counts, replaces and splits over those, so a long history costs no Python loop.
+    """
+    by_game = await user_stats(user_id)
+    if not by_game:
+        return by_game
+    games, codes, frames, rounds = await GameResult.user_columns(user_id)
+    percentiles = await UserGameStats.score_percentiles(user_id)
+    all_codes, all_frames = bytes(codes), bytes(frames)
+    detailed = {}
+    for slug, game_stats in by_game.items():
+        # Rows come ordered by game, so each game is one contiguous slice.
+        start = games.index(slug) if slug in games else 0
+        end = start + games.count(slug)
+        latest_round = await GameResult.latest_round(GAMES[slug], LATEST_ROUND_MIN_PLAYERS) if end > start else None
+        up_to_date = latest_round is not None and rounds[end - 1] >= latest_round
+        detailed[slug] = detailed_stats(
+            game_stats,
+            all_codes[start:end],
+            all_frames[start:end],
+            GAMES[slug].grid_length,
+            percentiles.get(slug),
+            up_to_date,
+        )
+    return detailed
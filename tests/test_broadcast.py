@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncEngine
+from telegram.error import BadRequest, ChatMigrated, Forbidden, RetryAfter, TimedOut
+
+from broadcast import Broadcaster
+from models import ChatMember, GameResult, User
+from models.broadcast import Broadcast
+from models.db import ResultRow
+from models.group import Group
+
+
+@pytest.fixture
+def groups(monkeypatch: pytest.MonkeyPatch) -> dict[str, list]:
+    state: dict[str, list] = {'active': [-5, -4, -3, -2, -1], 'deactivated': [], 'progress': [], 'migrated': []}
+
+    async def ids_after(group_id: int | None, limit: int, active_only: bool = True) -> list[int]:
+        return [gid for gid in state['active'] if group_id is None or gid > group_id][:limit]
+
+    async def deactivate(group_ids: list[int]) -> None:
+        state['deactivated'].extend(group_ids)
+
+    async def migrate(old_id: int, new_id: int) -> None:
+        state['migrated'].append((old_id, new_id))
+
+    async def save_progress(broadcast: Broadcast) -> None:
+        state['progress'].append((broadcast.last_group_id, broadcast.delivered, broadcast.finished))
+
+    monkeypatch.setattr(Group, 'ids_after', ids_after)
+    monkeypatch.setattr(Group, 'deactivate', deactivate)
+    monkeypatch.setattr(Group, 'migrate', migrate)
+    monkeypatch.setattr(Broadcast, 'save_progress', save_progress)
+    return state
+
+
+def new_broadcast(last_group_id: int | None = None) -> Broadcast:
+    return Broadcast(
+        id=1,
+        text='hello',
+        report_chat_id=42,
+        last_group_id=last_group_id,
+        delivered=0,
+        failed=0,
+        deactivated=0,
+        finished=False,
+    )
+
+
+@pytest.mark.asyncio
+async def test_broadcast_retries_and_deactivates_gone_groups(groups: dict[str, list]) -> None:
+    attempts: dict[int, int] = {}
+
+    async def send_message(chat_id: int, text: str) -> None:
+        attempts[chat_id] = attempts.get(chat_id, 0) + 1
+        if chat_id == -5 and attempts[chat_id] == 1:
+            raise RetryAfter(0)
+        if chat_id == -4 and attempts[chat_id] < 3:
+            raise TimedOut()
+        if chat_id == -3:
+            raise Forbidden('bot was kicked from the group chat')
+        if chat_id == -2:
+            raise BadRequest('Chat not found')
+        if chat_id == -1:
+            raise BadRequest('Message text is empty')
+
+    bot = AsyncMock()
+    bot.send_message.side_effect = send_message
+    broadcaster = Broadcaster(concurrency=2, batch_size=2, max_retries=3, backoff=0)
+    broadcast = new_broadcast()
+
+    await broadcaster.run(bot, broadcast)
+
+    assert (broadcast.delivered, broadcast.failed, broadcast.deactivated) == (2, 1, 2)
+    assert attempts == {-5: 2, -4: 3, -3: 1, -2: 1, -1: 1}
+    assert groups['deactivated'] == [-3, -2]
+    assert groups['progress'] == [(-4, 2, False), (-2, 2, False), (-1, 2, False), (-1, 2, True)]
+    assert broadcaster.retries.value == 3
+
+
+@pytest.mark.asyncio
+async def test_broadcast_gives_up_after_max_retries(groups: dict[str, list]) -> None:
+    groups['active'] = [-1]
+    bot = AsyncMock()
+    bot.send_message.side_effect = TimedOut()
+    broadcaster = Broadcaster(concurrency=1, batch_size=10, max_retries=2, backoff=0)
+    broadcast = new_broadcast()
+
+    await broadcaster.run(bot, broadcast)
+
+    assert bot.send_message.await_count == 3
+    assert (broadcast.delivered, broadcast.failed) == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_resumes_after_saved_group(groups: dict[str, list]) -> None:
+    bot = AsyncMock()
+    broadcaster = Broadcaster(concurrency=4, batch_size=10, max_retries=0)
+
+    await broadcaster.run_and_report(bot, new_broadcast(last_group_id=-3))
+
+    sent_to = [call.kwargs['chat_id'] for call in bot.send_message.await_args_list]
+    assert sent_to == [-2, -1, 42]
+    assert bot.send_message.await_args_list[-1].kwargs['text'].startswith('Рассылка завершена: доставлено 2')
+
+
+@pytest.mark.asyncio
+async def test_broadcast_follows_groups_that_became_supergroups(groups: dict[str, list]) -> None:
+    groups['active'] = [-2, -1]
+    sent: list[int] = []
+
+    async def send_message(chat_id: int, text: str) -> None:
+        if chat_id == -2:
+            raise ChatMigrated(-1002)
+        sent.append(chat_id)
+
+    bot = AsyncMock()
+    bot.send_message.side_effect = send_message
+    broadcast = new_broadcast()
+
+    await Broadcaster(concurrency=1, batch_size=5, max_retries=0, backoff=0).run(bot, broadcast)
+
+    assert sorted(sent) == [-1002, -1]
+    assert (broadcast.delivered, broadcast.failed, broadcast.deactivated) == (2, 0, 0)
+    assert groups['migrated'] == [(-2, -1002)]
+    assert groups['deactivated'] == []
+
+
+@pytest.mark.asyncio
+async def test_failed_report_does_not_escape(groups: dict[str, list]) -> None:
+    groups['active'] = [-1]
+
+    async def send_message(chat_id: int, text: str) -> None:
+        if chat_id == 42:
+            raise TimedOut()
+
+    bot = AsyncMock()
+    bot.send_message.side_effect = send_message
+    broadcast = new_broadcast()
+
+    await Broadcaster(concurrency=1, batch_size=5, max_retries=0, backoff=0).run_and_report(bot, broadcast)
+
+    assert broadcast.finished
+    assert broadcast.delivered == 1
+
+
+@pytest.mark.asyncio
+async def test_group_migrate_moves_title_members_and_results(sqlite_db: AsyncEngine) -> None:
+    await User.add_missing({1: 'Alice', 2: 'Bob'})
+    await Group.upsert_titles({-2: 'Friends', -1002: 'Friends (old record)'})
+    await GameResult.save_results(
+        [ResultRow('framed', 1, 100, True, 2, chat_id=-2), ResultRow('framed', 2, 100, True, 1, chat_id=-1002)]
+    )
+
+    await Group.migrate(-2, -1002)
+
+    async with sqlite_db.connect() as conn:
+        groups = (await conn.execute(Select(Group.id, Group.title))).all()
+        members = (
+            await conn.execute(Select(ChatMember.chat_id, ChatMember.user_id).order_by(ChatMember.user_id))
+        ).all()
+        chats = (await conn.execute(Select(GameResult.chat_id).distinct())).scalars().all()
+    assert groups == [(-1002, 'Friends (old record)')]
+    assert members == [(-1002, 1), (-1002, 2)]
+    assert chats == [-1002]
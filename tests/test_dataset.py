@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from benchmarks import dataset
+from benchmarks.dataset import DatasetShape, loaded_dataset
+from models import ChatMember, GameResult, User, UserGameStats
+
+SHAPE = DatasetShape(users=20, rounds=10, chats=3)
+MODELS = (User, ChatMember, GameResult, UserGameStats)
+
+
+async def row_counts(engine: AsyncEngine) -> dict[str, int]:
+    async with engine.connect() as conn:
+        return {
+            model.__tablename__: await conn.scalar(select(func.count()).select_from(model)) or 0 for model in MODELS
+        }
+
+
+@pytest.mark.asyncio
+async def test_loaded_dataset_is_rolled_back(sqlite_db: AsyncEngine, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(dataset, 'engine', sqlite_db)
+
+    async with loaded_dataset(SHAPE) as conn:
+        loaded = await conn.scalar(select(func.count()).select_from(GameResult))
+        assert loaded is not None
+        assert 0 < loaded <= SHAPE.users * SHAPE.rounds
+
+    assert await row_counts(sqlite_db) == dict.fromkeys((model.__tablename__ for model in MODELS), 0)
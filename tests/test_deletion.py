@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+from telegram.error import BadRequest
+
+from deletion import DeletionScheduler
+
+
+def test_messages_become_due_on_the_tick_after_their_delay() -> None:
+    scheduler = DeletionScheduler(Path('unused'), tick=5)
+    scheduler.schedule(1, 10, delay=30, now=1000)
+    scheduler.schedule(1, 11, delay=32, now=1000)
+    scheduler.schedule(2, 20, delay=30, now=1001)
+
+    assert scheduler.pop_due(now=1029) == {}
+    assert scheduler.pop_due(now=1031) == {1: [10]}
+    assert scheduler.pop_due(now=1035) == {1: [11], 2: [20]}
+    assert len(scheduler) == 0
+    assert scheduler.backlog.value == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_deletes_per_chat_in_chunks_of_100_and_counts_failures() -> None:
+    scheduler = DeletionScheduler(Path('unused'), tick=5)
+    for message_id in range(250):
+        scheduler.schedule(1, message_id, delay=0, now=0)
+    scheduler.schedule(2, 7, delay=0, now=0)
+    bot = AsyncMock()
+
+    async def delete_messages(chat_id: int, message_ids: list[int]) -> bool:
+        if chat_id == 2:
+            raise BadRequest('Message to delete not found')
+        return True
+
+    bot.delete_messages.side_effect = delete_messages
+
+    await scheduler.flush(bot, now=10)
+
+    calls = [(call.args[0], len(call.args[1])) for call in bot.delete_messages.await_args_list]
+    assert calls == [(1, 100), (1, 100), (1, 50), (2, 1)]
+    assert scheduler.deleted.value == 250
+    assert scheduler.failures.value == 1
+
+
+def test_pending_deletions_survive_a_restart(tmp_path: Path) -> None:
+    path = tmp_path / 'deletions.bin'
+    scheduler = DeletionScheduler(path, tick=5)
+    scheduler.schedule(-1001234567890, 10, delay=30, now=1_700_000_000)
+    scheduler.schedule(5, 11, delay=60, now=1_700_000_000)
+    scheduler.save()
+
+    restored = DeletionScheduler(path, tick=5)
+    restored.load()
+
+    assert path.stat().st_size == 5 + 2 * 16
+    assert restored.backlog.value == 2
+    assert restored.pop_due(now=1_700_000_030) == {-1001234567890: [10]}
+    assert restored.pop_due(now=1_700_000_060) == {5: [11]}
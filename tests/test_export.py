@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from types import SimpleNamespace
+from typing import cast
+
+import pytest
+from telegram import Chat, Message, Update, User
+from telegram.constants import ChatMemberStatus
+from telegram.ext import CallbackContext
+
+import main
+from export import COLUMNS, write_csv
+from models.game_result import GameResult
+
+ROWS = [
+    ('framed', 100, True, 2, 99, 'Test', -123),
+    ('framed', 101, False, None, 99, 'Test', -123),
+    ('episode', 7, True, 1, 99, 'Test', None),
+]
+
+
+async def chunks(rows: Sequence[tuple], size: int) -> AsyncIterator[Sequence[tuple]]:
+    for start in range(0, len(rows), size):
+        yield rows[start : start + size]
+
+
+@dataclass
+class ExportBot:
+    status: str = ChatMemberStatus.MEMBER
+    documents: list[tuple[str, bytes]] = field(default_factory=list)
+    messages: list[str] = field(default_factory=list)
+
+    async def get_chat_member(self, _chat_id: int, _user_id: int) -> SimpleNamespace:
+        return SimpleNamespace(status=self.status)
+
+    async def send_message(self, *, chat_id: int, text: str, reply_to_message_id: int) -> None:
+        self.messages.append(text)
+
+    async def send_document(self, *, chat_id: int, document: io.BufferedIOBase, filename: str, **_kwargs) -> None:
+        self.documents.append((filename, document.read()))
+
+
+def command_update(chat_type: str) -> Update:
+    chat = Chat(id=-123 if chat_type != Chat.PRIVATE else 99, type=chat_type)
+    message = Message(
+        message_id=1,
+        date=datetime.now(UTC),
+        chat=chat,
+        from_user=User(id=99, first_name='Test', is_bot=False),
+        text='/export',
+    )
+    return Update(update_id=1, message=message)
+
+
+@pytest.mark.asyncio
+async def test_write_csv_streams_every_chunk_into_one_gzip_file() -> None:
+    file = io.BytesIO()
+
+    written = await write_csv(chunks(ROWS, 2), file)
+
+    assert written == 3
+    assert not file.closed
+    lines = list(csv.reader(io.StringIO(gzip.decompress(file.getvalue()).decode())))
+    assert lines[0] == list(COLUMNS)
+    assert lines[1:] == [
+        ['framed', '100', 'True', '2', '99', 'Test', '-123'],
+        ['framed', '101', 'False', '', '99', 'Test', '-123'],
+        ['episode', '7', 'True', '1', '99', 'Test', ''],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_private_export_sends_the_players_results(monkeypatch: pytest.MonkeyPatch) -> None:
+    requested: list[dict[str, int | None]] = []
+
+    def stream_rows(chunk_size: int, user_id: int | None = None, chat_id: int | None = None):
+        requested.append({'user_id': user_id, 'chat_id': chat_id})
+        return chunks(ROWS, chunk_size)
+
+    monkeypatch.setattr(GameResult, 'stream_rows', stream_rows)
+    bot = ExportBot()
+
+    await main.export_results(command_update(Chat.PRIVATE), cast(CallbackContext, SimpleNamespace(bot=bot)))
+
+    assert requested == [{'user_id': 99, 'chat_id': None}]
+    [(filename, document)] = bot.documents
+    assert filename == 'results_99.csv.gz'
+    assert len(gzip.decompress(document).splitlines()) == 4
+
+
+@pytest.mark.asyncio
+async def test_group_export_is_for_admins_only(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(GameResult, 'stream_rows', lambda chunk_size, **_filters: chunks(ROWS, chunk_size))
+    bot = ExportBot()
+
+    await main.export_results(command_update(Chat.SUPERGROUP), cast(CallbackContext, SimpleNamespace(bot=bot)))
+    bot.status = ChatMemberStatus.ADMINISTRATOR
+    await main.export_results(command_update(Chat.SUPERGROUP), cast(CallbackContext, SimpleNamespace(bot=bot)))
+
+    assert bot.messages == ['Выгрузить результаты группы может только администратор']
+    assert [filename for filename, _document in bot.documents] == ['results_123.csv.gz']
+
+
+@pytest.mark.asyncio
+async def test_export_too_large_for_telegram_is_explained(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(GameResult, 'stream_rows', lambda chunk_size, **_filters: chunks(ROWS, chunk_size))
+    monkeypatch.setattr(main, 'MAX_EXPORT_SIZE', 10)
+    bot = ExportBot()
+
+    await main.export_results(command_update(Chat.PRIVATE), cast(CallbackContext, SimpleNamespace(bot=bot)))
+
+    assert bot.documents == []
+    [reply] = bot.messages
+    assert reply.endswith('столько Telegram не даёт отправить')
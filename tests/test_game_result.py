@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import cast
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import Select, inspect
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from games import EPISODE, FRAMED
+from models import GameResult, User
+from models.db import ResultRow
+from models.migrations import SCHEMA_LOCK_KEY, lock_schema, run_migrations
+
+
+@pytest.mark.asyncio
+async def test_save_results_marks_only_first_insert_as_saved(sqlite_db: AsyncEngine) -> None:
+    await User.add_missing({1: 'Alice', 2: 'Bob'})
+
+    saved = await GameResult.save_results(
+        [
+            ResultRow('framed', 1, 100, True, 2),
+            ResultRow('framed', 1, 100, False, None),
+            ResultRow('framed', 2, 100, True, 1),
+            ResultRow('episode', 1, 100, True, 3),
+        ]
+    )
+
+    assert saved == [True, False, True, True]
+
+
+@pytest.mark.asyncio
+async def test_reposted_result_is_not_saved_again(sqlite_db: AsyncEngine) -> None:
+    await User.add_missing({1: 'Alice'})
+    assert await GameResult.save_results([ResultRow('framed', 1, 100, True, 2, chat_id=-10)]) == [True]
+
+    assert await GameResult.save_results([ResultRow('framed', 1, 100, False, None, chat_id=-20)]) == [False]
+
+    async with sqlite_db.connect() as conn:
+        rows = (await conn.execute(Select(GameResult.won, GameResult.chat_id))).all()
+    assert rows == [(True, -10)]
+
+
+@pytest.mark.asyncio
+async def test_legacy_results_migration_keeps_earliest_duplicate(sqlite_db: AsyncEngine) -> None:
+    await User.add_missing({1: 'Alice', 2: 'Bob'})
+    async with sqlite_db.begin() as conn:
+        await conn.exec_driver_sql(
+            'CREATE TABLE framed_result (id INTEGER PRIMARY KEY, user_id INTEGER, framed_round INTEGER, '
+            'won BOOLEAN, win_frame INTEGER)'
+        )
+        await conn.exec_driver_sql(
+            'INSERT INTO framed_result (id, user_id, framed_round, won, win_frame) VALUES '
+            '(1, 1, 100, 1, 3), (2, 1, 100, 0, NULL), (3, 2, 100, 1, 1), (4, 1, 101, 0, NULL)'
+        )
+
+        await run_migrations(conn)
+
+        rows = (
+            await conn.execute(
+                Select(GameResult.user_id, GameResult.framed_round, GameResult.won, GameResult.win_frame)
+                .filter(GameResult.game == 'framed')
+                .order_by(GameResult.user_id, GameResult.framed_round)
+            )
+        ).all()
+        tables = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
+    assert rows == [(1, 100, True, 3), (1, 101, False, None), (2, 100, True, 1)]
+    assert 'framed_result_migrated' in tables
+    assert 'framed_result' not in tables
+
+
+@pytest.mark.asyncio
+async def test_latest_round_ignores_rounds_too_few_players_posted(sqlite_db: AsyncEngine) -> None:
+    await User.add_missing({1: 'Alice', 2: 'Bob', 3: 'Carol'})
+    await GameResult.save_results(
+        [
+            *(ResultRow('framed', user_id, 100, True, 1) for user_id in (1, 2, 3)),
+            *(ResultRow('framed', user_id, 101, True, 1) for user_id in (1, 2)),
+            ResultRow('framed', 3, 2_000_000_000, True, 1),
+        ]
+    )
+
+    assert await GameResult.latest_round(FRAMED, min_players=3) == 100
+    assert await GameResult.latest_round(FRAMED, min_players=2) == 101
+    # Until a round has enough players, the latest of all is the best guess.
+    assert await GameResult.latest_round(FRAMED, min_players=4) == 2_000_000_000
+    assert await GameResult.latest_round(EPISODE, min_players=3) is None
+
+
+@pytest.mark.asyncio
+async def test_schema_lock_serializes_postgres_startups_only() -> None:
+    postgres = SimpleNamespace(dialect=SimpleNamespace(name='postgresql'), execute=AsyncMock())
+    sqlite = SimpleNamespace(dialect=SimpleNamespace(name='sqlite'), execute=AsyncMock())
+
+    await lock_schema(cast(AsyncConnection, postgres))
+    await lock_schema(cast(AsyncConnection, sqlite))
+
+    (statement,), _ = postgres.execute.await_args
+    compiled = statement.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True})
+    assert str(compiled) == f'SELECT pg_advisory_xact_lock({SCHEMA_LOCK_KEY}) AS pg_advisory_xact_lock_1'
+    sqlite.execute.assert_not_awaited()
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from models.group import Group
+
+
+@pytest.mark.asyncio
+async def test_iter_ids_pages_by_last_seen_id(monkeypatch: pytest.MonkeyPatch) -> None:
+    group_ids = [-30, -20, -10, -5, 7]
+    pages: list[int | None] = []
+
+    async def ids_after(group_id: int | None, limit: int, active_only: bool = True) -> list[int]:
+        pages.append(group_id)
+        return [gid for gid in group_ids if group_id is None or gid > group_id][:limit]
+
+    monkeypatch.setattr(Group, 'ids_after', ids_after)
+
+    batches = [batch async for batch in Group.iter_ids(2)]
+
+    assert batches == [[-30, -20], [-10, -5], [7]]
+    assert pages == [None, -20, -5, 7]
+
+
+@pytest.mark.asyncio
+async def test_ids_after_skips_inactive_groups_and_seen_ids(sqlite_db: AsyncEngine) -> None:
+    await Group.upsert_titles({-30: 'a', -20: 'b', -10: 'c', 7: 'd'})
+    await Group.deactivate([-20])
+
+    assert await Group.ids_after(None, 2) == [-30, -10]
+    assert await Group.ids_after(-30, 5) == [-10, 7]
+    assert await Group.ids_after(-30, 5, active_only=False) == [-20, -10, 7]
+    assert [batch async for batch in Group.iter_ids(2, after=-30)] == [[-10, 7]]
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from metrics import render
+from models.group import Group, GroupCache
+
+
+@pytest.mark.asyncio
+async def test_group_cache_skips_unchanged_titles_and_coalesces_changes(monkeypatch: pytest.MonkeyPatch) -> None:
+    writes: list[dict[int, str]] = []
+    reactivated: list[set[int]] = []
+
+    async def upsert_titles(titles: dict[int, str]) -> None:
+        if titles:
+            writes.append(dict(titles))
+
+    async def reactivate(group_ids: set[int]) -> None:
+        reactivated.append(set(group_ids))
+
+    monkeypatch.setattr(Group, 'upsert_titles', upsert_titles)
+    monkeypatch.setattr(Group, 'reactivate', reactivate)
+    cache = GroupCache(max_size=10)
+
+    cache.record(1, 'first')
+    cache.record(1, 'first')
+    cache.record(2, 'second')
+    cache.record(2, 'renamed')
+    await cache.flush()
+    cache.record(1, 'first')
+    await cache.flush()
+
+    assert writes == [{1: 'first', 2: 'renamed'}]
+    assert reactivated == [set(), {1}]
+    assert cache.titles.hits.value == 3
+    assert cache.titles.misses.value == 2
+    assert 'framed_bot_cache_hits{cache="group_titles"} 3\n' in render()
+
+
+@pytest.mark.asyncio
+async def test_group_cache_keeps_pending_titles_when_flush_fails(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def upsert_titles(_titles: dict[int, str]) -> None:
+        raise ConnectionError('database is down')
+
+    monkeypatch.setattr(Group, 'upsert_titles', upsert_titles)
+    cache = GroupCache(max_size=2)
+    # Remembered from an earlier flush.
+    cache.titles.put(3, 'third')
+
+    cache.record(3, 'third')
+    cache.record(1, 'first')
+    cache.record(2, 'second')
+    with pytest.raises(ConnectionError):
+        await cache.flush()
+
+    assert cache.pending == {1: 'first', 2: 'second'}
+    assert cache.seen == {3}
+    assert len(cache.titles) == 2
+
+
+@pytest.mark.asyncio
+async def test_group_deactivated_elsewhere_is_reactivated_by_its_next_message(sqlite_db: AsyncEngine) -> None:
+    cache = GroupCache(max_size=10)
+    cache.record(-1, 'chat')
+    await cache.flush()
+    # Deactivated by a broadcast in another process; this cache still remembers the title.
+    await Group.deactivate([-1])
+
+    cache.record(-1, 'chat')
+    await cache.flush()
+
+    group = await Group.get(-1)
+    assert group is not None
+    assert group.active
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import io
+import json
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+
+import pytest
+
+from history_import import CHECKPOINT_KIND, ChatExport, HistoryImporter, JsonStream, stream_messages
+from models.db import ResultRow
+from models.game_result import GameResult
+from models.persisted_data import PersistedData
+from models.user import User
+
+EXPORT = Path(__file__).parent / 'fixtures' / 'chat_export.json'
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 16])
+def test_messages_are_streamed_across_chunk_boundaries(chunk_size: int) -> None:
+    raw = EXPORT.read_bytes()
+    export = ChatExport()
+
+    messages = list(stream_messages(JsonStream(io.BytesIO(raw), chunk_size), export))
+
+    assert messages == json.loads(raw)['messages']
+    assert export.chat_id == -1001234567
+
+
+def test_malformed_message_fails_with_its_offset_without_reading_to_the_end() -> None:
+    head = '{"name": "Кино", "messages": [{"id": 1}, {"id": 2, oops}'.encode()
+    raw = head + b', {"id": 3}' * 100_000 + b']}'
+    stream = JsonStream(io.BytesIO(raw), chunk_size=64, max_value_size=256)
+
+    with pytest.raises(ValueError, match=f'at byte {head.index(b"oops")}$'):
+        list(stream_messages(stream, ChatExport()))
+
+    assert stream.bytes_read < 1024
+
+
+@pytest.fixture
+def database(monkeypatch: pytest.MonkeyPatch) -> dict[str, list]:
+    state: dict[str, list] = {'users': [], 'batches': [], 'checkpoints': [{}]}
+    inserted: set[tuple[str, int, int]] = set()
+
+    async def add_missing(full_names: Mapping[int, str]) -> None:
+        state['users'].append(dict(full_names))
+
+    async def save_results(rows: Sequence[ResultRow]) -> list[bool]:
+        state['batches'].append(list(rows))
+        saved = []
+        for row in rows:
+            key = (row.game, row.user_id, row.framed_round)
+            saved.append(key not in inserted)
+            inserted.add(key)
+        return saved
+
+    async def load(kind: str) -> dict[str, bytes]:
+        return {key: data for (row_kind, key), data in state['checkpoints'][0].items() if row_kind == kind}
+
+    async def write(entries: Mapping[tuple[str, str], bytes]) -> None:
+        state['checkpoints'][0].update(entries)
+
+    monkeypatch.setattr(User, 'add_missing', add_missing)
+    monkeypatch.setattr(GameResult, 'save_results', save_results)
+    monkeypatch.setattr(PersistedData, 'load', load)
+    monkeypatch.setattr(PersistedData, 'write', write)
+    return state
+
+
+@pytest.mark.asyncio
+async def test_import_saves_results_of_users_and_reports_duplicates(database: dict[str, list]) -> None:
+    progress = await HistoryImporter(batch_size=2).run(EXPORT)
+
+    rows = [row for batch in database['batches'] for row in batch]
+    assert [(row.game, row.user_id, row.framed_round, row.won, row.win_frame) for row in rows] == [
+        ('framed', 11, 100, True, 2),
+        ('framed', 12, 100, False, None),
+        ('episode', 12, 7, True, 1),
+        ('framed', 11, 100, True, 2),
+        ('framed', 11, 101, True, 1),
+    ]
+    assert {row.chat_id for row in rows} == {-1001234567}
+    assert database['users'][0] == {11: 'Аня', 12: 'Боря'}
+    assert (progress.messages, progress.saved, progress.duplicates) == (7, 4, 1)
+    assert database['checkpoints'][0] == {(CHECKPOINT_KIND, '-1001234567'): b'{"message_id": 7}'}
+
+
+@pytest.mark.asyncio
+async def test_import_resumes_after_the_checkpoint(database: dict[str, list]) -> None:
+    database['checkpoints'][0][CHECKPOINT_KIND, '-1001234567'] = b'{"message_id": 4}'
+
+    progress = await HistoryImporter(batch_size=2).run(EXPORT)
+
+    rows = [row for batch in database['batches'] for row in batch]
+    assert [(row.user_id, row.framed_round) for row in rows] == [(11, 100), (11, 101)]
+    assert progress.skipped == 4
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Sequence
+
+import pytest
+
+from ingest import ResultIngestor
+from models.db import ResultRow
+
+
+class RecordingModel:
+    batches: list[list[ResultRow]] = []
+
+    @staticmethod
+    async def save_results(rows: Sequence[ResultRow]) -> list[bool]:
+        RecordingModel.batches.append(list(rows))
+        return [row.framed_round % 2 == 0 for row in rows]
+
+
+class FailingModel:
+    @staticmethod
+    async def save_results(rows: Sequence[ResultRow]) -> list[bool]:
+        raise ConnectionError('database is down')
+
+
+@pytest.mark.asyncio
+async def test_ingestor_writes_concurrent_results_in_one_batch() -> None:
+    RecordingModel.batches = []
+    ingestor = ResultIngestor(batch_size=10, linger=0.05, queue_size=100)
+    await ingestor.start()
+
+    statuses = await asyncio.gather(
+        *(ingestor.submit(RecordingModel, ResultRow('framed', user_id, 42 + user_id, True, 1)) for user_id in range(5))
+    )
+    await ingestor.stop()
+
+    assert statuses == [True, False, True, False, True]
+    assert [len(batch) for batch in RecordingModel.batches] == [5]
+    assert ingestor.batch_sizes.count == 1
+    assert ingestor.batch_sizes.sum == 5
+
+
+@pytest.mark.asyncio
+async def test_ingestor_splits_batches_at_batch_size() -> None:
+    RecordingModel.batches = []
+    ingestor = ResultIngestor(batch_size=2, linger=0.05, queue_size=100)
+    await ingestor.start()
+
+    await asyncio.gather(
+        *(ingestor.submit(RecordingModel, ResultRow('framed', user_id, 1, False, None)) for user_id in range(5))
+    )
+    await ingestor.stop()
+
+    assert [len(batch) for batch in RecordingModel.batches] == [2, 2, 1]
+
+
+class RejectingModel:
+    """Fails any statement that contains round 0, like a database rejecting one bad row of a multi-row insert."""
+
+    batches: list[list[ResultRow]] = []
+
+    @staticmethod
+    async def save_results(rows: Sequence[ResultRow]) -> list[bool]:
+        RejectingModel.batches.append(list(rows))
+        if any(row.framed_round == 0 for row in rows):
+            raise ValueError('round out of range')
+        return [True] * len(rows)
+
+
+@pytest.mark.asyncio
+async def test_ingestor_retries_a_failed_batch_row_by_row() -> None:
+    RejectingModel.batches = []
+    ingestor = ResultIngestor(batch_size=10, linger=0.05, queue_size=100)
+    await ingestor.start()
+
+    statuses = await asyncio.gather(
+        *(ingestor.submit(RejectingModel, ResultRow('framed', user_id, user_id, True, 1)) for user_id in range(3)),
+        return_exceptions=True,
+    )
+    await ingestor.stop()
+
+    assert isinstance(statuses[0], ValueError)
+    assert statuses[1:] == [True, True]
+    assert [len(batch) for batch in RejectingModel.batches] == [3, 1, 1, 1]
+    assert ingestor.flush_errors.value == 2
+
+
+@pytest.mark.asyncio
+async def test_ingestor_propagates_write_errors_to_callers() -> None:
+    ingestor = ResultIngestor(batch_size=10, linger=0, queue_size=100)
+    await ingestor.start()
+
+    with pytest.raises(ConnectionError):
+        await ingestor.submit(FailingModel, ResultRow('framed', 1, 1, False, None))
+    await ingestor.stop()
+
+    assert ingestor.flush_errors.value == 1
+
+
+@pytest.mark.asyncio
+async def test_ingestor_writes_directly_when_not_started() -> None:
+    RecordingModel.batches = []
+    ingestor = ResultIngestor(batch_size=10, linger=0.05, queue_size=100)
+
+    assert await ingestor.submit(RecordingModel, ResultRow('framed', 1, 2, True, 1)) is True
+    assert RecordingModel.batches == [[ResultRow('framed', 1, 2, True, 1)]]
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import math
+
+import pytest
+
+from instrumentation import handler_metrics, instrumented, query_label
+from metrics import Counter, Histogram, render
+
+
+async def instrumented_ok() -> None:
+    return None
+
+
+async def instrumented_fails() -> None:
+    raise RuntimeError('handler failed')
+
+
+@pytest.mark.asyncio
+async def test_instrumented_handler_records_latency_and_errors() -> None:
+    ok = instrumented(instrumented_ok)
+    fails = instrumented(instrumented_fails)
+
+    await ok()
+    await ok()
+    with pytest.raises(RuntimeError):
+        await fails()
+
+    assert handler_metrics['instrumented_ok'].seconds.count == 2
+    assert handler_metrics['instrumented_ok'].errors.value == 0
+    assert handler_metrics['instrumented_fails'].seconds.count == 1
+    assert handler_metrics['instrumented_fails'].errors.value == 1
+    assert handler_metrics['instrumented_fails'].in_flight.value == 0
+
+
+def test_query_label_names_the_verb_and_first_table() -> None:
+    assert query_label('SELECT "user".id FROM "user" WHERE "user".id = $1') == 'select user'
+    assert query_label('INSERT INTO game_result (game) VALUES ($1), ($2) ON CONFLICT DO NOTHING') == (
+        'insert game_result'
+    )
+    assert query_label('UPDATE "group" SET active=$1') == 'update group'
+    assert query_label('SELECT 1') == 'select'
+
+
+def test_histogram_quantiles_and_exposition() -> None:
+    histogram = Histogram('test_latency_seconds', 'Latency', (0.1, 1), {'handler': 'top'})
+    Counter('test_requests', 'Requests').inc(3)
+    for value in (0.05, 0.05, 0.5, 5):
+        histogram.observe(value)
+
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1
+    assert histogram.quantile(0.99) == math.inf
+    text = render()
+    assert 'test_latency_seconds_bucket{handler="top",le="0.1"} 2\n' in text
+    assert 'test_latency_seconds_bucket{handler="top",le="+Inf"} 4\n' in text
+    assert 'test_latency_seconds_count{handler="top"} 4\n' in text
+    assert 'test_requests 3\n' in text
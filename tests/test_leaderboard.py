@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from leaderboard import LeaderboardCache
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_cache_collapses_concurrent_loads() -> None:
+    cache = LeaderboardCache(ttl=60)
+    renders = 0
+    release = asyncio.Event()
+
+    async def render() -> str:
+        nonlocal renders
+        renders += 1
+        await release.wait()
+        return 'board'
+
+    waiters = [asyncio.create_task(cache.get((1, 'framed', 'global'), render)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiters) == ['board'] * 5
+    assert await cache.get((1, 'framed', 'global'), render) == 'board'
+    assert renders == 1
+    assert cache.misses.value == 1
+    assert cache.shared_loads.value == 4
+    assert cache.hits.value == 1
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_cache_invalidation_is_per_game() -> None:
+    cache = LeaderboardCache(ttl=60)
+    renders: list[str] = []
+
+    def render_for(game: str):
+        async def render() -> str:
+            renders.append(game)
+            return game
+
+        return render
+
+    await cache.get((1, 'framed', 'global'), render_for('framed'))
+    await cache.get((1, 'episode', 'global'), render_for('episode'))
+    cache.invalidate('framed')
+    await cache.get((1, 'framed', 'global'), render_for('framed'))
+    await cache.get((1, 'episode', 'global'), render_for('episode'))
+
+    assert renders == ['framed', 'episode', 'framed']
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_cache_drops_loads_started_before_invalidation() -> None:
+    cache = LeaderboardCache(ttl=60)
+    renders = 0
+
+    async def render() -> str:
+        nonlocal renders
+        renders += 1
+        cache.invalidate('framed')
+        return f'board {renders}'
+
+    assert await cache.get((1, 'framed', 'global'), render) == 'board 1'
+    assert await cache.get((1, 'framed', 'global'), render) == 'board 2'
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_cache_expires_entries() -> None:
+    cache = LeaderboardCache(ttl=0)
+    renders = 0
+
+    async def render() -> str:
+        nonlocal renders
+        renders += 1
+        return 'board'
+
+    await cache.get((1, 'framed', 'global'), render)
+    await cache.get((1, 'framed', 'global'), render)
+
+    assert renders == 2
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import pickle
+from collections.abc import Mapping
+from pathlib import Path
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine
+from telegram.ext import ExtBot, PicklePersistence
+
+import manage
+from models.persisted_data import PersistedData
+from persistence import BOT_DATA, CALLBACK_DATA, CHAT_DATA, USER_DATA, DatabasePersistence, conversation_kind
+
+
+@pytest.fixture
+def table(monkeypatch: pytest.MonkeyPatch) -> dict[str, list]:
+    state: dict[str, list] = {'rows': [{(CHAT_DATA, '-1'): pickle.dumps({'kept': True})}], 'writes': [], 'drops': []}
+
+    async def create_table() -> None:
+        pass
+
+    async def load(kind: str) -> dict[str, bytes]:
+        return {key: data for (row_kind, key), data in state['rows'][0].items() if row_kind == kind}
+
+    async def write(entries: Mapping[tuple[str, str], bytes]) -> None:
+        state['writes'].append(sorted(entries))
+        state['rows'][0].update(entries)
+
+    async def drop(kind: str, key: str) -> None:
+        state['drops'].append((kind, key))
+
+    monkeypatch.setattr(PersistedData, 'create_table', create_table)
+    monkeypatch.setattr(PersistedData, 'load', load)
+    monkeypatch.setattr(PersistedData, 'write', write)
+    monkeypatch.setattr(PersistedData, 'drop', drop)
+    return state
+
+
+@pytest.mark.asyncio
+async def test_only_changed_entries_are_written_in_one_batch(table: dict[str, list]) -> None:
+    persistence = DatabasePersistence()
+    assert await persistence.get_chat_data() == {-1: {'kept': True}}
+
+    await asyncio.gather(
+        persistence.update_chat_data(-1, {'kept': True}),
+        persistence.update_chat_data(-2, {}),
+        persistence.update_chat_data(-3, {'new': 1}),
+        persistence.update_user_data(4, {'name': 'x'}),
+    )
+    await persistence.update_user_data(4, {'name': 'x'})
+
+    assert table['writes'] == [[(CHAT_DATA, '-3'), (USER_DATA, '4')]]
+
+
+@pytest.mark.asyncio
+async def test_dropping_deletes_only_stored_rows(table: dict[str, list]) -> None:
+    persistence = DatabasePersistence()
+    await persistence.get_chat_data()
+
+    await persistence.drop_chat_data(-1)
+    await persistence.drop_chat_data(-2)
+
+    assert table['drops'] == [(CHAT_DATA, '-1')]
+
+
+@pytest.mark.asyncio
+async def test_drop_waits_for_a_running_write(table: dict[str, list], monkeypatch: pytest.MonkeyPatch) -> None:
+    writing = asyncio.Event()
+    release = asyncio.Event()
+    rows: dict[tuple[str, str], bytes] = {}
+
+    async def write(entries: Mapping[tuple[str, str], bytes]) -> None:
+        writing.set()
+        await release.wait()
+        rows.update(entries)
+
+    async def drop(kind: str, key: str) -> None:
+        rows.pop((kind, key), None)
+
+    monkeypatch.setattr(PersistedData, 'write', write)
+    monkeypatch.setattr(PersistedData, 'drop', drop)
+    persistence = DatabasePersistence()
+
+    update = asyncio.create_task(persistence.update_chat_data(-3, {'new': 1}))
+    await writing.wait()
+    dropping = asyncio.create_task(persistence.drop_chat_data(-3))
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(update, dropping)
+
+    assert rows == {}
+
+
+@pytest.mark.asyncio
+async def test_import_pickle_copies_a_pickle_file(
+    sqlite_db: AsyncEngine, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / 'bot_data'
+    source = PicklePersistence(path)
+    source.set_bot(ExtBot(manage.BOT_TOKEN))
+    await source.update_user_data(1, {'name': 'Alice'})
+    await source.update_chat_data(-10, {'title': 'Friends'})
+    await source.update_bot_data({'version': 2})
+    await source.update_conversation('setup', (-10, 1), 'waiting')
+    await source.flush()
+
+    async def init_db() -> None:
+        pass
+
+    monkeypatch.setattr(manage, 'init_db', init_db)
+    assert await manage.import_pickle(argparse.Namespace(path=path)) == 0
+
+    imported = DatabasePersistence()
+    assert await imported.get_user_data() == {1: {'name': 'Alice'}}
+    assert await imported.get_chat_data() == {-10: {'title': 'Friends'}}
+    assert await imported.get_bot_data() == {'version': 2}
+    assert await imported.get_callback_data() is None
+    assert await imported.get_conversations('setup') == {(-10, 1): 'waiting'}
+    stored = {kind: sorted(await PersistedData.load(kind)) for kind in (USER_DATA, CHAT_DATA, BOT_DATA, CALLBACK_DATA)}
+    assert stored == {USER_DATA: ['1'], CHAT_DATA: ['-10'], BOT_DATA: [''], CALLBACK_DATA: []}
+    assert sorted(await PersistedData.load(conversation_kind('setup'))) == ['[-10, 1]']
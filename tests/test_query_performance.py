@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import os
+import statistics
+import time
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.dataset import DatasetShape, loaded_dataset
+from benchmarks.query_benchmark import benchmark_queries, explain, time_statement
+from models import ChatMember, GameResult, User, UserGameStats, init_db
+from models.db import current_session, engine
+from stats import user_detailed_stats
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get('PERF_TESTS'), reason='needs a scratch database in DB_CONNECTION_STRING; set PERF_TESTS=1'
+)
+
+SHAPE = DatasetShape(users=2_000, rounds=90, chats=50)
+# Generous enough for a laptop; a query that starts scanning every result blows through it.
+MEDIAN_BUDGET_SECONDS = 0.05
+# /stats of players with 10k rounds each: one query for the history, then bytes operations over it.
+LONG_HISTORY = DatasetShape(users=20, rounds=10_000, chats=3, participation=1.0)
+STATS_BUDGET_SECONDS = 0.25
+
+
+async def row_counts() -> dict[str, int]:
+    async with engine.connect() as conn:
+        return {
+            model.__tablename__: await conn.scalar(select(func.count()).select_from(model)) or 0
+            for model in (User, ChatMember, GameResult, UserGameStats)
+        }
+
+
+@pytest.mark.asyncio
+async def test_boards_and_stats_stay_within_budget() -> None:
+    await init_db()
+    counts_before = await row_counts()
+    async with loaded_dataset(SHAPE) as conn:
+        slow = {}
+        for query, statement in benchmark_queries(SHAPE).items():
+            await conn.execute(statement)
+            median = statistics.median(await time_statement(conn, statement, repeat=5))
+            if median > MEDIAN_BUDGET_SECONDS:
+                slow[query] = median
+            if conn.dialect.name == 'postgresql' and not query.startswith('weekly'):
+                # Boards and /stats read user_game_stats, never the raw results.
+                assert not any('game_result' in line for line in await explain(conn, statement)), query
+
+    assert slow == {}
+    # The dataset is rolled back, COPY included.
+    assert await row_counts() == counts_before
+
+
+@pytest.mark.asyncio
+async def test_stats_of_a_long_history_stay_within_budget() -> None:
+    await init_db()
+    timings = []
+    async with loaded_dataset(LONG_HISTORY) as conn:
+        # The model queries join the fixture's transaction, the only one that sees the dataset.
+        token = current_session.set(AsyncSession(bind=conn))
+        try:
+            by_game = await user_detailed_stats(1)
+            for _ in range(5):
+                started = time.perf_counter()
+                await user_detailed_stats(1)
+                timings.append(time.perf_counter() - started)
+        finally:
+            current_session.reset(token)
+
+    assert by_game is not None
+    assert by_game['framed'].rounds_count == LONG_HISTORY.rounds
+    assert statistics.median(timings) < STATS_BUDGET_SECONDS
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import pytest
+
+from games import EPISODE, FRAMED
+from result_parser import ParsedResult, parse_results
+
+
+@pytest.mark.parametrize(
+    ('text', 'expected'),
+    [
+        ('Framed #42\n🎥 🟥 🟩 ⬛ ⬛ ⬛ ⬛\n\nhttps://framed.wtf', ParsedResult(FRAMED, 42, True, 2)),
+        ('Framed #42\n🎥 🟩 ⬛️ ⬛️ ⬛️ ⬛️ ⬛️\n\nhttps://framed.wtf', ParsedResult(FRAMED, 42, True, 1)),
+        ('Framed #1000\n🎥 🟥 🟥 🟥 🟥 🟥 🟥\n\nhttps://framed.wtf', ParsedResult(FRAMED, 1000, False, None)),
+        (
+            'Episode #7\n📺 🟥 🟥 🟩 ⬛ ⬛ ⬛ ⬛ ⬛ ⬛ ⬛\n\nhttps://episode.wtf',
+            ParsedResult(EPISODE, 7, True, 3),
+        ),
+    ],
+)
+def test_parse_results_recognises_supported_games(text: str, expected: ParsedResult) -> None:
+    assert parse_results(text) == (expected,)
+
+
+@pytest.mark.parametrize(
+    'text',
+    [
+        'Framed #42 was easy',
+        'Framed #42\n🎥 🟥 🟩 ⬛ ⬛ ⬛\n\nhttps://framed.wtf',
+        'Episode #7\n📺 🟥 🟥 🟩 ⬛ ⬛ ⬛\n\nhttps://episode.wtf',
+        'Framed #42\n📺 🟥 🟩 ⬛ ⬛ ⬛ ⬛\n\nhttps://framed.wtf',
+        'Framed #42\n🎥 🟥 🟩 ⬛ ⬛ ⬛ ⬛\n\nhttps://episode.wtf',
+        'Moviedle #42\n🎥 🟥 🟩 ⬛ ⬛ ⬛ ⬛\n\nhttps://moviedle.wtf',
+        'Framed #2147483648\n🎥 🟥 🟩 ⬛ ⬛ ⬛ ⬛\n\nhttps://framed.wtf',
+        'Framed #99999999999999999999\n🎥 🟥 🟩 ⬛ ⬛ ⬛ ⬛\n\nhttps://framed.wtf',
+    ],
+)
+def test_parse_results_ignores_other_messages(text: str) -> None:
+    assert parse_results(text) == ()
+
+
+def test_parse_results_finds_every_game_in_one_message() -> None:
+    text = (
+        'Мои результаты:\n'
+        'Framed #42\n🎥 🟥 🟩 ⬛ ⬛ ⬛ ⬛\n\nhttps://framed.wtf\n'
+        'Episode #7\n📺 🟩 ⬛ ⬛ ⬛ ⬛ ⬛ ⬛ ⬛ ⬛ ⬛\n\nhttps://episode.wtf'
+    )
+
+    assert parse_results(text) == (ParsedResult(FRAMED, 42, True, 2), ParsedResult(EPISODE, 7, True, 1))
@@ -1,19 +1,25 @@
 from __future__ import annotations
 
-from collections.abc import Awaitable, Callable
+import time
+from collections.abc import Sequence
 from dataclasses import dataclass, field
-from datetime import UTC, datetime, timedelta
-from unittest.mock import AsyncMock
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import cast
+from unittest.mock import AsyncMock, Mock
 
 import pytest
 from telegram import Chat, Message, ReactionTypeEmoji, Update, User
 from telegram.error import TelegramError
-from telegram.ext import ApplicationBuilder, ContextTypes, ExtBot, JobQueue
+from telegram.ext import ApplicationBuilder, ContextTypes, ExtBot
 
 import main
-from models.episode_result import EpisodeResult
-from models.framed_result import FramedResult
+from deletion import DeletionScheduler
+from games import EPISODE, FRAMED
+from models.db import ResultRow
+from models.game_result import GameResult
 from models.user import User as BotUser
+from result_parser import ParsedResult, parse_results
 
 
 @dataclass(frozen=True, slots=True)
@@ -30,14 +36,6 @@ class SendMessageCall:
     reply_to_message_id: int
 
 
-@dataclass(frozen=True, slots=True)
-class ScheduledJob:
-    callback: Callable[[ContextTypes.DEFAULT_TYPE], Awaitable[None]]
-    when: timedelta
-    data: int
-    chat_id: int
-
-
 @dataclass(slots=True)
 class BotRecorder:
     should_fail_reaction: bool = False
@@ -65,28 +63,11 @@ class BotRecorder:
         )
 
 
-@dataclass(slots=True)
-class JobQueueRecorder:
-    calls: list[ScheduledJob] = field(default_factory=list)
-
-    def run_once(
-        self,
-        callback: Callable[[ContextTypes.DEFAULT_TYPE], Awaitable[None]],
-        when: timedelta,
-        data: int,
-        *,
-        chat_id: int,
-    ) -> ScheduledJob:
-        job = ScheduledJob(callback=callback, when=when, data=data, chat_id=chat_id)
-        self.calls.append(job)
-        return job
-
-
 @dataclass(frozen=True, slots=True)
 class RecordedContext:
     context: ContextTypes.DEFAULT_TYPE
     bot: BotRecorder
-    job_queue: JobQueueRecorder
+    deletions: DeletionScheduler
 
 
 def make_update(text: str = 'Framed #42\n🎥 🟥 🟩 ⬛ ⬛ ⬛ ⬛\n\nhttps://framed.wtf') -> Update:
@@ -106,8 +87,7 @@ def make_context(monkeypatch: pytest.MonkeyPatch, *, fail_reaction: bool = False
     application = ApplicationBuilder().token('123:ABC').build()
     context = ContextTypes.DEFAULT_TYPE(application)
     bot = BotRecorder(should_fail_reaction=fail_reaction)
-    job_queue = JobQueueRecorder()
-    assert context.job_queue is not None
+    deletions = DeletionScheduler(Path('unused'), tick=5)
 
     async def set_message_reaction(
         _bot: ExtBot[None], *, chat_id: int, message_id: int, reaction: ReactionTypeEmoji
@@ -117,20 +97,16 @@ def make_context(monkeypatch: pytest.MonkeyPatch, *, fail_reaction: bool = False
     async def send_message(_bot: ExtBot[None], *, chat_id: int, text: str, reply_to_message_id: int) -> Message:
         return await bot.send_message(chat_id=chat_id, text=text, reply_to_message_id=reply_to_message_id)
 
-    def run_once(
-        _job_queue: JobQueue[ContextTypes.DEFAULT_TYPE],
-        callback: Callable[[ContextTypes.DEFAULT_TYPE], Awaitable[None]],
-        when: timedelta,
-        data: int,
-        *,
-        chat_id: int,
-    ) -> ScheduledJob:
-        return job_queue.run_once(callback, when, data, chat_id=chat_id)
-
     monkeypatch.setattr(type(context.bot), 'set_message_reaction', set_message_reaction)
     monkeypatch.setattr(type(context.bot), 'send_message', send_message)
-    monkeypatch.setattr(type(context.job_queue), 'run_once', run_once)
-    return RecordedContext(context=context, bot=bot, job_queue=job_queue)
+    monkeypatch.setattr(main, 'deletion_scheduler', deletions)
+    return RecordedContext(context=context, bot=bot, deletions=deletions)
+
+
+def parsed_framed_result(update: Update) -> ParsedResult | None:
+    assert update.message is not None
+    assert update.message.text is not None
+    return next(iter(parse_results(update.message.text)), None)
 
 
 def make_result_model(saved: bool):
@@ -138,9 +114,9 @@ def make_result_model(saved: bool):
         calls: list[tuple[int, int, bool, int | None]] = []
 
         @staticmethod
-        async def save_result(user_id: int, framed_round: int, won: bool, win_frame: int | None) -> bool:
-            ResultModel.calls.append((user_id, framed_round, won, win_frame))
-            return saved
+        async def save_results(rows: Sequence[ResultRow]) -> list[bool]:
+            ResultModel.calls.extend((row.user_id, row.framed_round, row.won, row.win_frame) for row in rows)
+            return [saved] * len(rows)
 
     return ResultModel
 
@@ -153,7 +129,7 @@ async def test_save_results_uses_saved_reaction_when_saved(monkeypatch: pytest.M
     update_from_user = AsyncMock()
     monkeypatch.setattr(BotUser, 'update_from_tg_user', update_from_user)
 
-    await main.save_results(update, test_context.context, main.framed_pattern, result_model)
+    await main.save_results(update, test_context.context, parsed_framed_result(update), result_model)
 
     update_from_user.assert_awaited_once_with(update.effective_user)
     assert result_model.calls == [(99, 42, True, 2)]
@@ -161,7 +137,7 @@ async def test_save_results_uses_saved_reaction_when_saved(monkeypatch: pytest.M
         ReactionCall(chat_id=123, message_id=456, reaction=main.saved_result_reaction)
     ]
     assert test_context.bot.send_message_calls == []
-    assert test_context.job_queue.calls == []
+    assert len(test_context.deletions) == 0
 
 
 @pytest.mark.asyncio
@@ -174,14 +150,14 @@ async def test_save_results_uses_trophy_reaction_when_saved_on_first_frame(
     update_from_user = AsyncMock()
     monkeypatch.setattr(BotUser, 'update_from_tg_user', update_from_user)
 
-    await main.save_results(update, test_context.context, main.framed_pattern, result_model)
+    await main.save_results(update, test_context.context, parsed_framed_result(update), result_model)
 
     assert result_model.calls == [(99, 42, True, 1)]
     assert test_context.bot.reaction_calls == [
         ReactionCall(chat_id=123, message_id=456, reaction=main.first_frame_saved_result_reaction)
     ]
     assert test_context.bot.send_message_calls == []
-    assert test_context.job_queue.calls == []
+    assert len(test_context.deletions) == 0
 
 
 @pytest.mark.asyncio
@@ -192,14 +168,14 @@ async def test_save_results_uses_duplicate_reaction_when_duplicate(monkeypatch:
     update_from_user = AsyncMock()
     monkeypatch.setattr(BotUser, 'update_from_tg_user', update_from_user)
 
-    await main.save_results(update, test_context.context, main.framed_pattern, result_model)
+    await main.save_results(update, test_context.context, parsed_framed_result(update), result_model)
 
     assert result_model.calls == [(99, 42, True, 2)]
     assert test_context.bot.reaction_calls == [
         ReactionCall(chat_id=123, message_id=456, reaction=main.duplicate_result_reaction)
     ]
     assert test_context.bot.send_message_calls == []
-    assert test_context.job_queue.calls == []
+    assert len(test_context.deletions) == 0
 
 
 @pytest.mark.asyncio
@@ -210,7 +186,7 @@ async def test_save_results_falls_back_to_reply_when_reaction_fails(monkeypatch:
     update_from_user = AsyncMock()
     monkeypatch.setattr(BotUser, 'update_from_tg_user', update_from_user)
 
-    await main.save_results(update, test_context.context, main.framed_pattern, result_model)
+    await main.save_results(update, test_context.context, parsed_framed_result(update), result_model)
 
     assert test_context.bot.reaction_calls == [
         ReactionCall(chat_id=123, message_id=456, reaction=main.saved_result_reaction)
@@ -218,33 +194,61 @@ async def test_save_results_falls_back_to_reply_when_reaction_fails(monkeypatch:
     assert test_context.bot.send_message_calls == [
         SendMessageCall(chat_id=123, text='Спасибо, записал', reply_to_message_id=456)
     ]
-    assert len(test_context.job_queue.calls) == 1
-    job = test_context.job_queue.calls[0]
-    assert job.callback is main.delete_message_task
-    assert job.when == timedelta(seconds=30)
-    assert job.data == 777
-    assert job.chat_id == 123
+    assert test_context.deletions.pop_due(time.time()) == {}
+    assert test_context.deletions.pop_due(time.time() + main.REPLY_LIFETIME + 5) == {123: [777]}
 
 
 @pytest.mark.asyncio
-async def test_new_framed_data_delegates_to_save_results(monkeypatch: pytest.MonkeyPatch) -> None:
+async def test_new_game_result_delegates_framed_result_to_save_results(monkeypatch: pytest.MonkeyPatch) -> None:
     update = make_update()
     test_context = make_context(monkeypatch)
     save_results = AsyncMock()
     monkeypatch.setattr(main, 'save_results', save_results)
 
-    await main.new_framed_data(update, test_context.context)
+    await main.new_game_result(update, test_context.context)
 
-    save_results.assert_awaited_once_with(update, test_context.context, main.framed_pattern, FramedResult)
+    save_results.assert_awaited_once_with(update, test_context.context, ParsedResult(FRAMED, 42, True, 2), GameResult)
 
 
 @pytest.mark.asyncio
-async def test_new_episode_data_delegates_to_save_results(monkeypatch: pytest.MonkeyPatch) -> None:
+async def test_new_game_result_delegates_episode_result_to_save_results(monkeypatch: pytest.MonkeyPatch) -> None:
     update = make_update('Episode #7\n📺 🟥 🟥 🟩 ⬛ ⬛ ⬛ ⬛ ⬛ ⬛ ⬛\n\nhttps://episode.wtf')
     test_context = make_context(monkeypatch)
     save_results = AsyncMock()
     monkeypatch.setattr(main, 'save_results', save_results)
 
-    await main.new_episode_data(update, test_context.context)
+    await main.new_game_result(update, test_context.context)
+
+    save_results.assert_awaited_once_with(update, test_context.context, ParsedResult(EPISODE, 7, True, 3), GameResult)
+
+
+@pytest.mark.asyncio
+async def test_new_game_result_uses_results_parsed_by_filter(monkeypatch: pytest.MonkeyPatch) -> None:
+    update = make_update()
+    test_context = make_context(monkeypatch)
+    save_results = AsyncMock()
+    monkeypatch.setattr(main, 'save_results', save_results)
+    filter_data = main.GAME_RESULT_FILTER.check_update(update)
+    assert isinstance(filter_data, dict)
+    test_context.context.update(cast(dict[str, object], filter_data))
+    parse_results = Mock(side_effect=AssertionError('the message must not be parsed twice'))
+    monkeypatch.setattr(main, 'parse_results', parse_results)
+
+    await main.new_game_result(update, test_context.context)
+
+    save_results.assert_awaited_once_with(update, test_context.context, ParsedResult(FRAMED, 42, True, 2), GameResult)
+
+
+@pytest.mark.asyncio
+async def test_save_results_ignores_messages_without_result(monkeypatch: pytest.MonkeyPatch) -> None:
+    update = make_update('Framed #42 is hard today')
+    test_context = make_context(monkeypatch)
+    result_model = make_result_model(True)
+    update_from_user = AsyncMock()
+    monkeypatch.setattr(BotUser, 'update_from_tg_user', update_from_user)
+
+    await main.save_results(update, test_context.context, parsed_framed_result(update), result_model)
 
-    save_results.assert_awaited_once_with(update, test_context.context, main.episode_pattern, EpisodeResult)
+    update_from_user.assert_not_awaited()
+    assert result_model.calls == []
+    assert test_context.bot.reaction_calls == []
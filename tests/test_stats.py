@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import stats
+from models import GameResult, User
+from models.db import ResultRow
+
+
+# Not frozen: ResultForStats declares plain, writable attributes.
+@dataclass(slots=True)
+class Result:
+    game: str
+    won: bool
+    win_frame: int | None
+
+
+RESULTS = [
+    Result('framed', True, 1),
+    Result('framed', True, 4),
+    Result('framed', False, None),
+    Result('episode', False, None),
+    Result('framed', True, 2),
+]
+
+
+async def save(results: list[Result], user_id: int = 99) -> None:
+    await GameResult.save_results(
+        [
+            ResultRow(result.game, user_id, framed_round, result.won, result.win_frame)
+            for framed_round, result in enumerate(results, start=1)
+        ]
+    )
+
+
+@pytest.mark.asyncio
+async def test_user_stats_matches_count_stats(sqlite_db: AsyncEngine) -> None:
+    await User.add_missing({99: 'Alice', 100: 'Bob'})
+    await save(RESULTS)
+    await save([Result('framed', True, 6)], user_id=100)
+
+    by_game = await stats.user_stats(99)
+
+    assert by_game == {
+        'framed': await stats.count_stats([result for result in RESULTS if result.game == 'framed']),
+        'episode': await stats.count_stats([result for result in RESULTS if result.game == 'episode']),
+    }
+    assert by_game is not None
+    assert list(by_game) == ['framed', 'episode']
+
+
+@pytest.mark.asyncio
+async def test_user_stats_distinguishes_unknown_users_from_users_without_results(sqlite_db: AsyncEngine) -> None:
+    assert await stats.user_stats(99) is None
+    await User.add_missing({99: 'Alice'})
+    assert await stats.user_stats(99) == {}
+
+
+def test_streaks_are_cut_by_losses_and_skipped_rounds() -> None:
+    assert stats.streaks(b'') == (0, 0)
+    assert stats.streaks(bytes([2, 1, 1, 0, 2, 1])) == (2, 3)
+    assert stats.streaks(bytes([2, 1, 2, 1, 1, 1])) == (4, 4)
+    assert stats.streaks(bytes([2, 1, 1, 1, 0])) == (0, 4)
+
+
+def test_frame_counts_and_recent_average_ignore_losses() -> None:
+    frames = bytes([1, 4, 0, 2, 2])
+
+    assert stats.frame_counts(frames, 6) == (1, 2, 0, 1, 0, 0)
+    assert stats.recent_average_frame(frames) == 9 / 4
+    assert stats.recent_average_frame(bytes(5)) is None
+    assert stats.recent_average_frame(bytes([6] * 10 + [1] * stats.RECENT_ROUNDS)) == 1
+
+
+@pytest.mark.asyncio
+async def test_user_detailed_stats_slices_columns_per_game(sqlite_db: AsyncEngine) -> None:
+    await User.add_missing({99: 'Alice', 100: 'Bob', 101: 'Carol'})
+    await GameResult.save_results(
+        [
+            ResultRow('framed', 99, 1, True, 1),
+            ResultRow('framed', 99, 2, True, 4),
+            ResultRow('framed', 99, 3, False, None),
+            # Round 4 skipped.
+            ResultRow('framed', 99, 5, True, 2),
+            ResultRow('episode', 99, 1, False, None),
+            ResultRow('framed', 100, 5, False, None),
+            ResultRow('framed', 101, 5, True, 1),
+        ]
+    )
+
+    by_game = await stats.user_detailed_stats(99)
+
+    assert by_game is not None
+    framed, episode = by_game['framed'], by_game['episode']
+    assert framed.average_frame == 7 / 3
+    assert framed.frame_counts == (1, 1, 0, 1, 0, 0)
+    assert (framed.current_streak, framed.longest_streak) == (1, 2)
+    assert framed.recent_average_frame == 7 / 3
+    # Bob and Carol played one round each, so both scored less than Alice.
+    assert framed.percentile == 100 * 2 / 3
+    assert episode.frame_counts == (0,) * 10
+    assert (episode.current_streak, episode.longest_streak) == (0, 0)
+    assert episode.recent_average_frame is None
+    assert episode.percentile is None
+
+
+@pytest.mark.asyncio
+async def test_current_streak_ends_when_the_latest_round_is_missed(sqlite_db: AsyncEngine) -> None:
+    await User.add_missing({99: 'Alice', 100: 'Bob', 101: 'Carol', 102: 'Dave'})
+    await GameResult.save_results(
+        [
+            *(ResultRow('framed', 99, framed_round, True, 1) for framed_round in (1, 2, 3)),
+            *(ResultRow('framed', user_id, 3, True, 2) for user_id in (100, 101, 102)),
+        ]
+    )
+    by_game = await stats.user_detailed_stats(99)
+    assert by_game is not None
+    assert (by_game['framed'].current_streak, by_game['framed'].longest_streak) == (3, 3)
+
+    await GameResult.save_results([ResultRow('framed', user_id, 4, True, 2) for user_id in (100, 101, 102)])
+
+    by_game = await stats.user_detailed_stats(99)
+    assert by_game is not None
+    assert (by_game['framed'].current_streak, by_game['framed'].longest_streak) == (0, 3)
@@ -0,0 +1,84 @@
+from datetime import UTC, datetime
+from types import SimpleNamespace
+from typing import cast
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine
+from telegram import Chat, Message, Update, User
+from telegram.ext import CallbackContext, CommandHandler
+
+import main
+from main import TopType, TopWindow
+from models.db import current_session
+
+
+@pytest.mark.parametrize(
+    ('data', 'expected'),
+    [
+        ('top:1:0', (TopType.TOP_SCORE, TopWindow.ALL_TIME)),
+        ('top:3:2', (TopType.TOP_WIN, TopWindow.MONTH)),
+        ('{"top": 2}', (TopType.TOP_FRAME, TopWindow.ALL_TIME)),
+        ('top:9:0', None),
+        ('top:1:9', None),
+        ('top:1:0 ', None),
+        ('{"top": 2, "x": 1}', None),
+    ],
+)
+def test_parse_top_callback(data: str, expected: tuple[TopType, TopWindow] | None) -> None:
+    assert main.parse_top_callback(data) == expected
+
+
+def test_keyboard_callback_data_round_trips() -> None:
+    markup = main.top_reply_markup(TopType.TOP_ROUNDS, TopWindow.WEEK)
+
+    types_row, windows_row = markup.inline_keyboard
+    assert [main.parse_top_callback(button.callback_data) for button in types_row] == [
+        (TopType.TOP_SCORE, TopWindow.WEEK),
+        (TopType.TOP_FRAME, TopWindow.WEEK),
+        (TopType.TOP_WIN, TopWindow.WEEK),
+    ]
+    assert [main.parse_top_callback(button.callback_data) for button in windows_row] == [
+        (TopType.TOP_ROUNDS, TopWindow.ALL_TIME),
+        (TopType.TOP_ROUNDS, TopWindow.MONTH),
+        (TopType.TOP_ROUNDS, TopWindow.SEASON),
+    ]
+
+
+def test_window_rounds(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(main, 'SEASON_FIRST_ROUND', 10)
+    monkeypatch.setattr(main, 'SEASON_LENGTH', 100)
+
+    assert main.window_rounds(TopWindow.WEEK, 1000) == (994, 1000)
+    assert main.window_rounds(TopWindow.MONTH, 1000) == (971, 1000)
+    assert main.window_rounds(TopWindow.WEEK, 3) == (1, 3)
+    assert main.window_rounds(TopWindow.SEASON, 1000) == (910, 1000)
+    assert main.window_rounds(TopWindow.SEASON, 909) == (810, 909)
+
+
+@pytest.mark.asyncio
+async def test_top_replies_after_its_transaction_is_finished(sqlite_db: AsyncEngine) -> None:
+    sessions_while_sending = []
+
+    async def send_message(**_kwargs: object) -> None:
+        sessions_while_sending.append(current_session.get())
+
+    bot = AsyncMock()
+    bot.send_message.side_effect = send_message
+    message = Message(
+        message_id=1,
+        date=datetime.now(UTC),
+        chat=Chat(id=-123, type=Chat.GROUP),
+        from_user=User(id=99, first_name='Test', is_bot=False),
+        text='/top',
+    )
+
+    handler = next(
+        handler
+        for handler in main.build_application().handlers[0]
+        if isinstance(handler, CommandHandler) and 'top' in handler.commands
+    )
+
+    await handler.callback(Update(update_id=1, message=message), cast(CallbackContext, SimpleNamespace(bot=bot)))
+
+    assert sessions_while_sending == [None]
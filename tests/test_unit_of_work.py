@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import pytest
+
+from models.db import AsyncScopedSession, current_session, unit_of_work
+
+
+@pytest.mark.asyncio
+async def test_scoped_sessions_share_the_unit_of_work() -> None:
+    async with unit_of_work() as session:
+        async with AsyncScopedSession() as first, AsyncScopedSession() as second:
+            assert first is session
+            assert second is session
+        async with unit_of_work() as nested:
+            assert nested is session
+
+    assert current_session.get() is None
+
+
+@pytest.mark.asyncio
+async def test_scoped_session_outside_unit_of_work_is_its_own() -> None:
+    async with AsyncScopedSession() as first, AsyncScopedSession() as second:
+        assert first is not second
+        assert first.in_transaction()
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_is_cleared_after_an_error() -> None:
+    with pytest.raises(RuntimeError):
+        async with unit_of_work():
+            raise RuntimeError('handler failed')
+
+    assert current_session.get() is None
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import Select, delete, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import main
+from games import FRAMED
+from models import ChatMember, GameResult, User, UserGameStats
+from models.db import ResultRow
+from models.maintenance import StatsMismatch, check_user_game_stats, rebuild_user_game_stats
+from models.migrations import run_migrations
+
+BATCHES = [
+    [
+        ResultRow('framed', 1, 100, True, 2, chat_id=-10),
+        ResultRow('framed', 2, 100, False, None, chat_id=-10),
+        ResultRow('episode', 1, 7, True, 4, chat_id=-10),
+    ],
+    [
+        ResultRow('framed', 1, 101, False, None, chat_id=-10),
+        # A repost of an already saved result must not be counted twice.
+        ResultRow('framed', 2, 100, True, 1, chat_id=-20),
+        ResultRow('framed', 2, 101, True, 1, chat_id=-20),
+        ResultRow('episode', 2, 7, False, None, chat_id=-20),
+    ],
+]
+
+
+async def stats_rows(engine: AsyncEngine) -> list[tuple[int, str, int, int, int, int]]:
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            Select(
+                UserGameStats.user_id,
+                UserGameStats.game,
+                UserGameStats.rounds,
+                UserGameStats.wins,
+                UserGameStats.win_frames_total,
+                UserGameStats.score,
+            ).order_by(UserGameStats.user_id, UserGameStats.game)
+        )
+        return [tuple(row) for row in result.all()]
+
+
+async def save_batches() -> None:
+    await User.add_missing({1: 'Alice', 2: 'Bob'})
+    for batch in BATCHES:
+        await GameResult.save_results(batch)
+
+
+@pytest.mark.asyncio
+async def test_incremental_totals_match_a_full_rebuild(sqlite_db: AsyncEngine) -> None:
+    await save_batches()
+    incremental = await stats_rows(sqlite_db)
+
+    async with sqlite_db.begin() as conn:
+        rebuilt = await rebuild_user_game_stats(conn)
+
+    assert rebuilt == len(incremental)
+    assert await stats_rows(sqlite_db) == incremental
+    assert incremental == [
+        (1, 'episode', 1, 1, 4, 7),
+        (1, 'framed', 2, 1, 2, 6),
+        (2, 'episode', 1, 0, 0, 1),
+        (2, 'framed', 2, 1, 1, 7),
+    ]
+    assert await check_user_game_stats() == []
+
+
+@pytest.mark.asyncio
+async def test_check_user_game_stats_reports_drift(sqlite_db: AsyncEngine) -> None:
+    await save_batches()
+    async with sqlite_db.begin() as conn:
+        await conn.execute(
+            update(UserGameStats)
+            .filter(UserGameStats.user_id == 1, UserGameStats.game == 'framed')
+            .values(score=UserGameStats.score + 5)
+        )
+        await conn.execute(delete(UserGameStats).filter(UserGameStats.user_id == 2, UserGameStats.game == 'episode'))
+
+    assert await check_user_game_stats() == [
+        StatsMismatch(1, 'framed', (2, 1, 2, 6), (2, 1, 2, 11)),
+        StatsMismatch(2, 'episode', (1, 0, 0, 1), None),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_group_boards_rank_only_members_of_the_chat(sqlite_db: AsyncEngine) -> None:
+    await save_batches()
+    await User.add_missing({3: 'Carol'})
+    # Saved before chats were recorded: counts on the global board only.
+    await GameResult.save_results([ResultRow('framed', 3, 100, False, None)])
+
+    assert await UserGameStats.top_score(FRAMED, -10) == [('Bob', 7), ('Alice', 6)]
+    assert await UserGameStats.top_score(FRAMED, -20) == [('Bob', 7)]
+    assert await UserGameStats.top_score(FRAMED) == [('Bob', 7), ('Alice', 6), ('Carol', 1)]
+    # Windowed boards go by membership too, not by the chat a result was posted in.
+    assert await GameResult.top_score_between(FRAMED, 101, 101, -10) == [('Bob', 6), ('Alice', 1)]
+
+    # A repost in the group makes the player a member there.
+    await GameResult.save_results([ResultRow('framed', 3, 100, False, None, chat_id=-20)])
+    assert await UserGameStats.top_score(FRAMED, -20) == [('Bob', 7), ('Carol', 1)]
+
+
+@pytest.mark.asyncio
+async def test_group_board_text_explains_who_is_ranked(sqlite_db: AsyncEngine) -> None:
+    await save_batches()
+
+    group_text = await main.render_top(main.TopType.TOP_SCORE, main.TopWindow.ALL_TIME, -10)
+    global_text = await main.render_top(main.TopType.TOP_SCORE, main.TopWindow.ALL_TIME, None)
+
+    assert group_text.endswith('В топе группы только те, кто присылал сюда результаты.')
+    assert 'В топе группы' not in global_text
+
+
+@pytest.mark.asyncio
+async def test_migrations_backfill_chat_members_from_results(sqlite_db: AsyncEngine) -> None:
+    await save_batches()
+    async with sqlite_db.begin() as conn:
+        await conn.execute(delete(ChatMember))
+        await run_migrations(conn)
+        members = (
+            await conn.execute(
+                Select(ChatMember.chat_id, ChatMember.user_id).order_by(ChatMember.chat_id, ChatMember.user_id)
+            )
+        ).all()
+
+    assert members == [(-20, 2), (-10, 1), (-10, 2)]
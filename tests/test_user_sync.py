@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from unittest.mock import MagicMock
+
+import pytest
+from telegram import User as TgUser
+
+from models import user as user_module
+from models.cache import LruCache
+from models.user import User
+
+
+class SessionRecorder:
+    def __init__(self) -> None:
+        self.statements: list[object] = []
+        self.commits = 0
+
+    async def __aenter__(self) -> SessionRecorder:
+        return self
+
+    async def __aexit__(self, *_exc_info: object) -> None:
+        # A scoped session outside of a unit of work commits when its block exits.
+        self.commits += 1
+
+    async def execute(self, statement: object) -> MagicMock:
+        self.statements.append(statement)
+        return MagicMock()
+
+
+@pytest.mark.asyncio
+async def test_update_from_tg_user_skips_unchanged_profiles(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = SessionRecorder()
+    monkeypatch.setattr(user_module, 'AsyncScopedSession', lambda: session)
+    monkeypatch.setattr(user_module, 'seen_profiles', LruCache(10, 'user_profiles'))
+
+    await User.update_from_tg_user(TgUser(id=99, first_name='Test', is_bot=False, username='test'))
+    await User.update_from_tg_user(TgUser(id=99, first_name='Test', is_bot=False, username='test'))
+    await User.update_from_tg_user(TgUser(id=99, first_name='Renamed', is_bot=False, username='test'))
+
+    assert len(session.statements) == 2
+    assert session.commits == 2
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import cast
+
+import pytest
+import pytest_asyncio
+from telegram import Update
+from telegram.ext import Application, ExtBot
+
+from webhook import WebhookServer, post_update
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+SECRET = 'test-secret'  # noqa: S105
+
+
+@dataclass
+class FakeApplication:
+    bot: ExtBot[None] = field(default_factory=lambda: ExtBot('123:ABC'))
+    update_queue: asyncio.Queue[object] = field(default_factory=asyncio.Queue)
+    running: bool = True
+
+
+@pytest.fixture
+def application() -> FakeApplication:
+    return FakeApplication()
+
+
+@pytest_asyncio.fixture
+async def server(application: FakeApplication) -> AsyncIterator[WebhookServer]:
+    webhook_server = WebhookServer(
+        cast(Application, application), '/telegram', SECRET, max_body_size=4096, request_timeout=0.2
+    )
+    await webhook_server.start('127.0.0.1', 0)
+    yield webhook_server
+    await webhook_server.stop()
+
+
+async def request(server: WebhookServer, raw: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+    writer.write(raw)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+def url(server: WebhookServer, path: str = '/telegram') -> str:
+    return f'http://127.0.0.1:{server.port}{path}'
+
+
+@pytest.mark.asyncio
+async def test_replayed_updates_reach_the_update_queue(server: WebhookServer, application: FakeApplication) -> None:
+    lines = (FIXTURES / 'updates.jsonl').read_bytes().splitlines()
+
+    statuses = [await asyncio.to_thread(post_update, url(server), line, SECRET) for line in lines]
+
+    assert statuses == [200] * len(lines)
+    queue = application.update_queue
+    updates = [queue.get_nowait() for _ in range(queue.qsize())]
+    assert len(updates) == len(lines)
+    assert [update.update_id for update in updates if isinstance(update, Update)] == [1001, 1002, 1003]
+
+
+@pytest.mark.asyncio
+async def test_requests_without_the_secret_or_with_bad_json_are_rejected(server: WebhookServer) -> None:
+    assert await asyncio.to_thread(post_update, url(server), b'{"update_id": 1}', 'wrong') == 403
+    assert await asyncio.to_thread(post_update, url(server), b'not json', SECRET) == 400
+    assert await asyncio.to_thread(post_update, url(server), b'x' * 5000, SECRET) == 413
+    assert await asyncio.to_thread(post_update, url(server, '/elsewhere'), b'{}', SECRET) == 405
+    assert server.application.update_queue.empty()
+    assert server.rejected.value == 4
+
+
+@pytest.mark.asyncio
+async def test_health_and_readiness(server: WebhookServer, application: FakeApplication) -> None:
+    healthz = b'GET /healthz HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n'
+    readyz = b'GET /readyz HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n'
+
+    assert (await request(server, healthz)).startswith(b'HTTP/1.1 200 OK')
+    assert (await request(server, readyz)).startswith(b'HTTP/1.1 200 OK')
+    application.running = False
+    assert (await request(server, readyz)).startswith(b'HTTP/1.1 503')
+    assert (await request(server, healthz)).startswith(b'HTTP/1.1 200 OK')
+
+
+@pytest.mark.asyncio
+async def test_metrics_are_served_in_prometheus_format(server: WebhookServer) -> None:
+    metrics = b'GET /metrics HTTP/1.1\r\nHost: x\r\nConnection: close\r\n'
+
+    response = await request(server, metrics + f'Authorization: Bearer {SECRET}\r\n\r\n'.encode())
+    anonymous = await request(server, metrics + b'\r\n')
+    wrong = await request(server, metrics + b'Authorization: Bearer wrong\r\n\r\n')
+
+    assert response.startswith(b'HTTP/1.1 200 OK')
+    assert b'# TYPE framed_bot_webhook_updates counter\n' in response
+    assert anonymous.startswith(b'HTTP/1.1 403')
+    assert wrong.startswith(b'HTTP/1.1 403')
+
+
+@pytest.mark.asyncio
+async def test_stop_closes_idle_keep_alive_connections(server: WebhookServer) -> None:
+    reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+    writer.write(b'GET /healthz HTTP/1.1\r\nHost: x\r\n\r\n')
+    await writer.drain()
+    assert (await reader.readuntil(b'ok')).startswith(b'HTTP/1.1 200 OK')
+
+    await asyncio.wait_for(server.stop(), timeout=1)
+
+    assert await reader.read() == b''
+    assert not server.ready
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_stalled_request_times_out_and_does_not_hold_up_stop(server: WebhookServer) -> None:
+    reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+    writer.write(b'POST /telegram HTTP/1.1\r\nHost: x\r\nContent-Length: 100\r\n\r\n{"update_id"')
+    await writer.drain()
+
+    await asyncio.sleep(0.05)
+
+    await asyncio.wait_for(server.stop(), timeout=1)
+
+    assert (await reader.read()).startswith(b'HTTP/1.1 408 Request Timeout')
+    writer.close()
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import cast
+
+import pytest
+from telegram import Update
+from telegram.ext import Application, CallbackContext, ExtBot
+
+from workers import MemoryUpdateQueue, UpdateForwarder, UpdateWorker
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+@dataclass
+class FakeApplication:
+    bot: ExtBot[None] = field(default_factory=lambda: ExtBot('123:ABC'))
+    processed: list[tuple[int, int]] = field(default_factory=list)
+
+    async def process_update(self, update: Update) -> None:
+        assert update.effective_chat is not None
+        # Later updates finish first unless the worker keeps a chat's updates in order.
+        await asyncio.sleep(0.01 * (2000 - update.update_id) / 1000)
+        self.processed.append((update.effective_chat.id, update.update_id))
+
+
+def message_update(update_id: int, chat_id: int) -> str:
+    return json.dumps(
+        {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': 1760000000,
+                'chat': {'id': chat_id, 'type': 'group', 'title': 'chat'},
+                'text': 'hi',
+            },
+        }
+    )
+
+
+def make_worker(queue: MemoryUpdateQueue, index: int = 0, count: int = 1) -> UpdateWorker:
+    application = cast(Application, FakeApplication())
+    return UpdateWorker(application, queue, index, count, batch_size=100, poll_interval=0.01)
+
+
+def processed(worker: UpdateWorker) -> list[tuple[int, int]]:
+    return cast(FakeApplication, worker.application).processed
+
+
+@pytest.mark.asyncio
+async def test_forwarder_queues_each_update_once() -> None:
+    queue = MemoryUpdateQueue()
+    forwarder = UpdateForwarder(queue)
+    bot = ExtBot('123:ABC')
+    updates = [Update.de_json(json.loads(line), bot) for line in (FIXTURES / 'updates.jsonl').read_text().splitlines()]
+
+    for update in [*updates, updates[0]]:
+        await forwarder(update, cast(CallbackContext, None))
+
+    assert sorted(queue.updates) == [1001, 1002, 1003]
+    assert {queued.chat_id for queued in queue.updates.values()} == {-100}
+    assert (forwarder.queued.value, forwarder.redelivered.value) == (3, 1)
+
+
+@pytest.mark.asyncio
+async def test_workers_split_chats_and_keep_each_chat_in_order() -> None:
+    queue = MemoryUpdateQueue()
+    for update_id, chat_id in [(1001, -10), (1002, -11), (1003, -10), (1004, -12), (1005, -11), (1006, -10)]:
+        await queue.put(update_id, chat_id, message_update(update_id, chat_id))
+    even, odd = make_worker(queue, 0, 2), make_worker(queue, 1, 2)
+
+    assert await even.process_batch() == 4
+    assert await odd.process_batch() == 2
+
+    assert [update_id for chat_id, update_id in processed(even) if chat_id == -10] == [1001, 1003, 1006]
+    assert [update_id for chat_id, update_id in processed(even) if chat_id == -12] == [1004]
+    assert processed(odd) == [(-11, 1002), (-11, 1005)]
+    assert queue.updates == {}
+
+
+@pytest.mark.asyncio
+async def test_update_that_was_not_acknowledged_is_not_processed_twice() -> None:
+    class FailingAck(MemoryUpdateQueue):
+        failures = 1
+
+        async def ack(self, update_ids: Sequence[int]) -> None:
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError('database is down')
+            await super().ack(update_ids)
+
+    queue = FailingAck()
+    await queue.put(1001, -10, message_update(1001, -10))
+    worker = make_worker(queue)
+
+    with pytest.raises(ConnectionError):
+        await worker.process_batch()
+    await worker.process_batch()
+
+    assert processed(worker) == [(-10, 1001)]
+    assert (worker.processed.value, worker.skipped.value) == (1, 1)
+    assert queue.updates == {}
+
+
+@pytest.mark.asyncio
+async def test_worker_that_stops_mid_batch_gets_only_the_unhandled_updates_again() -> None:
+    class Crash(BaseException):
+        pass
+
+    class CrashingApplication(FakeApplication):
+        async def process_update(self, update: Update) -> None:
+            if update.update_id == 1002:
+                raise Crash
+            await super().process_update(update)
+
+    queue = MemoryUpdateQueue()
+    for update_id in (1001, 1002, 1003):
+        await queue.put(update_id, -10, message_update(update_id, -10))
+    crashing = UpdateWorker(cast(Application, CrashingApplication()), queue, 0, 1, batch_size=100, poll_interval=0.01)
+
+    with pytest.raises(Crash):
+        await crashing.process_batch()
+    restarted = make_worker(queue)
+    await restarted.process_batch()
+
+    assert processed(crashing) == [(-10, 1001)]
+    assert processed(restarted) == [(-10, 1002), (-10, 1003)]
+    assert queue.updates == {}
+
+
+@pytest.mark.asyncio
+async def test_update_that_cannot_be_decoded_is_dropped_without_holding_up_its_chat() -> None:
+    queue = MemoryUpdateQueue()
+    await queue.put(1001, -10, '{not json')
+    await queue.put(1002, -10, message_update(1002, -10))
+    worker = make_worker(queue)
+
+    assert await worker.process_batch() == 2
+
+    assert processed(worker) == [(-10, 1002)]
+    assert (worker.processed.value, worker.failed.value) == (1, 1)
+    assert queue.updates == {}
+
+
+@pytest.mark.asyncio
+async def test_run_retries_when_the_queue_cannot_be_read() -> None:
+    stop_requested = asyncio.Event()
+
+    class FlakyClaim(MemoryUpdateQueue):
+        failures = 2
+
+        async def claim(self, partition: int, partitions: int, limit: int) -> list:
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError('database is down')
+            claimed = await super().claim(partition, partitions, limit)
+            if not claimed:
+                stop_requested.set()
+            return claimed
+
+    queue = FlakyClaim()
+    await queue.put(1001, -10, message_update(1001, -10))
+    worker = make_worker(queue)
+
+    await asyncio.wait_for(worker.run(stop_requested), 5)
+
+    assert processed(worker) == [(-10, 1001)]
+    assert queue.updates == {}
@@ -0,0 +1,239 @@
+"""Webhook mode: Telegram pushes updates to an HTTP endpoint served by the bot itself.
+
+:class:`WebhookServer` is a small HTTP/1.1 server on asyncio streams. It accepts updates on the webhook
+path when Telegram's secret token header matches, and answers ``/healthz`` (the process is up) and
+``/readyz`` (updates are being processed) for the orchestrator and ``/metrics`` for Prometheus, which has
+to send the secret token as a bearer token. A request has ``REQUEST_TIMEOUT`` seconds to arrive in full.
+:func:`serve` runs the application around it. On SIGTERM or SIGINT it stops accepting updates, lets the
+application finish the queued updates and the running ``block=False`` handlers, and then shuts down;
+Telegram keeps the updates it could not deliver meanwhile and sends them to the next instance.
+"""
+
+import asyncio
+import contextlib
+import hmac
+import json
+import logging
+import signal
+import urllib.error
+import urllib.request
+from typing import Any
+from urllib.parse import urlsplit
+
+from telegram import Update
+from telegram.ext import Application
+
+from metrics import Counter, render
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = 'x-telegram-bot-api-secret-token'  # noqa: S105 - a header name
+MAX_HEADERS = 100
+# Seconds for the headers and body of a request; a client stalling longer would also hold up a shutdown.
+REQUEST_TIMEOUT = 10.0
+# A client that went away or sent something that is not HTTP.
+CONNECTION_ERRORS = (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError)
+MALFORMED_UPDATE_ERRORS = (ValueError, TypeError, KeyError)
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    403: 'Forbidden',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    408: 'Request Timeout',
+    411: 'Length Required',
+    413: 'Content Too Large',
+    503: 'Service Unavailable',
+}
+
+
+class WebhookServer:
+    def __init__(
+        self,
+        application: Application[Any, Any, Any, Any, Any, Any],
+        path: str,
+        secret_token: str,
+        max_body_size: int,
+        request_timeout: float = REQUEST_TIMEOUT,
+    ) -> None:
+        self.application = application
+        self.path = path
+        self.secret_token = secret_token
+        self.max_body_size = max_body_size
+        self.request_timeout = request_timeout
+        self.draining = False
+        self.accepted = Counter('framed_bot_webhook_updates', 'Updates accepted from the webhook')
+        self.rejected = Counter('framed_bot_webhook_rejected', 'Webhook requests answered with an error')
+        self._server: asyncio.Server | None = None
+        self._idle: set[asyncio.StreamWriter] = set()
+
+    @property
+    def ready(self) -> bool:
+        return self.application.running and not self.draining
+
+    @property
+    def port(self) -> int:
+        if self._server is None:
+            raise RuntimeError('the server is not started')
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self, host: str, port: int) -> None:
+        self._server = await asyncio.start_server(self._serve_connection, host, port)
+
+    async def stop(self) -> None:
+        """Stop accepting connections and wait for the requests being answered."""
+        self.draining = True
+        if self._server is None:
+            return
+        self._server.close()
+        # Keep-alive connections waiting for their next request would hold wait_closed forever.
+        for writer in list(self._idle):
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while not self.draining:
+                self._idle.add(writer)
+                try:
+                    request_line = await reader.readline()
+                finally:
+                    self._idle.discard(writer)
+                if not request_line:
+                    break
+                status, body, keep_alive = await self._answer(request_line, reader)
+                if status >= 400:
+                    self.rejected.inc()
+                keep_alive = keep_alive and not self.draining
+                writer.write(
+                    f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                    f'Content-Type: text/plain; charset=utf-8\r\n'
+                    f'Content-Length: {len(body)}\r\n'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1')
+                    + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except CONNECTION_ERRORS:
+            pass
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _answer(self, request_line: bytes, reader: asyncio.StreamReader) -> tuple[int, bytes, bool]:
+        """Read the rest of one request and return the status, body and whether to keep the connection."""
+        method, target, version = request_line.decode('latin-1').split()
+        headers: dict[str, str] = {}
+        try:
+            async with asyncio.timeout(self.request_timeout):
+                for _ in range(MAX_HEADERS):
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                else:
+                    return 400, b'too many headers', False
+
+                if 'transfer-encoding' in headers:
+                    return 411, b'content-length required', False
+                length = int(headers.get('content-length', '0'))
+                if length > self.max_body_size:
+                    return 413, b'update too large', False
+                body = await reader.readexactly(length)
+        except TimeoutError:
+            return 408, b'request timed out', False
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+        path = urlsplit(target).path
+        if path == self.path:
+            if method != 'POST':
+                return 405, b'use POST', keep_alive
+            return (*await self._accept_update(headers, body), keep_alive)
+        if method != 'GET':
+            return 405, b'use GET', keep_alive
+        match path:
+            case '/healthz':
+                return 200, b'ok', keep_alive
+            case '/readyz':
+                return (200, b'ready', keep_alive) if self.ready else (503, b'not ready', keep_alive)
+            case '/metrics':
+                if not self._authorized(headers.get('authorization', '')):
+                    return 403, b'bearer token required', keep_alive
+                return 200, render().encode(), keep_alive
+            case _:
+                return 404, b'not found', keep_alive
+
+    def _authorized(self, authorization: str) -> bool:
+        scheme, _, token = authorization.partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(token.encode(), self.secret_token.encode())
+
+    async def _accept_update(self, headers: dict[str, str], body: bytes) -> tuple[int, bytes]:
+        if not hmac.compare_digest(headers.get(SECRET_TOKEN_HEADER, '').encode(), self.secret_token.encode()):
+            return 403, b'wrong secret token'
+        if not self.ready:
+            # Telegram retries, and the update reaches an instance that is not shutting down.
+            return 503, b'not ready'
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except MALFORMED_UPDATE_ERRORS:
+            logger.warning('Ignoring a malformed update', exc_info=True)
+            return 400, b'malformed update'
+        await self.application.update_queue.put(update)
+        self.accepted.inc()
+        return 200, b'ok'
+
+
+def post_update(url: str, body: bytes, secret_token: str, timeout: float = 10) -> int:
+    """Send one update the way Telegram does and return the response status; used to replay recorded updates."""
+    request = urllib.request.Request(  # noqa: S310 - the URL is given by the operator
+        url,
+        data=body,
+        method='POST',
+        headers={'Content-Type': 'application/json', SECRET_TOKEN_HEADER: secret_token},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:  # noqa: S310
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+async def serve(
+    application: Application[Any, Any, Any, Any, Any, Any],
+    url: str,
+    listen: str,
+    port: int,
+    secret_token: str,
+    max_body_size: int = 1 << 20,
+) -> None:
+    """Run the application in webhook mode until SIGTERM or SIGINT."""
+    if not secret_token:
+        raise RuntimeError('WEBHOOK_SECRET_TOKEN is required in webhook mode')
+    stop_requested = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop_requested.set)
+
+    server = WebhookServer(application, urlsplit(url).path or '/', secret_token, max_body_size)
+    await application.initialize()
+    if application.post_init is not None:
+        await application.post_init(application)
+    await server.start(listen, port)
+    try:
+        await application.bot.set_webhook(url, allowed_updates=Update.ALL_TYPES, secret_token=secret_token)
+        await application.start()
+        logger.info('Serving the webhook on %s:%d', listen, server.port)
+        await stop_requested.wait()
+    finally:
+        logger.info('Draining: no new updates, finishing the accepted ones')
+        await server.stop()
+        if application.running:
+            await application.stop()
+            if application.post_stop is not None:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown is not None:
+            await application.post_shutdown(application)
@@ -0,0 +1,192 @@
+"""Ingress and worker processes for running the bot on several cores.
+
+The ingress process receives updates (polling or webhook) and only queues them. Every worker process
+handles the chats of one partition, ``abs(chat_id) % WORKER_COUNT == WORKER_INDEX``, so all updates of a
+chat are processed by the same worker, in ``update_id`` order. Within a batch, different chats are processed
+concurrently and the updates of one chat one after another.
+
+Delivery is at least once. Every update is acknowledged as soon as it is handled, so a worker that stops
+gets at most the update it was handling again on restart, not the rest of its batch: handled again, a
+result would look like a repost and get the wrong reply. A result that reaches the database twice is
+still saved once, because ``game_result`` is unique per game, user and round, and only the insert that
+wins reports the result as saved. An update that cannot be decoded or handled is logged and acknowledged,
+so it does not hold up the rest of its partition.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import signal
+from collections import defaultdict
+from collections.abc import Sequence
+from typing import Any, Protocol
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes
+
+from metrics import Counter
+from models.cache import LruCache
+from models.queued_update import QueuedUpdate
+
+logger = logging.getLogger(__name__)
+
+# Longest wait between attempts while the queue cannot be read or acknowledged.
+MAX_RETRY_DELAY = 60.0
+
+
+class UpdateQueue(Protocol):
+    """Implemented by the :class:`models.queued_update.QueuedUpdate` class itself, through its static methods."""
+
+    async def put(self, update_id: int, chat_id: int, payload: str) -> bool: ...
+
+    async def claim(self, partition: int, partitions: int, limit: int) -> list[QueuedUpdate]: ...
+
+    async def ack(self, update_ids: Sequence[int]) -> None: ...
+
+
+class MemoryUpdateQueue:
+    """In-process stand-in for :class:`models.queued_update.QueuedUpdate`."""
+
+    def __init__(self) -> None:
+        self.updates: dict[int, QueuedUpdate] = {}
+
+    async def put(self, update_id: int, chat_id: int, payload: str) -> bool:
+        if update_id in self.updates:
+            return False
+        self.updates[update_id] = QueuedUpdate(update_id=update_id, chat_id=chat_id, payload=payload)
+        return True
+
+    async def claim(self, partition: int, partitions: int, limit: int) -> list[QueuedUpdate]:
+        claimed = [queued for queued in self.updates.values() if partition_of(queued.chat_id, partitions) == partition]
+        return sorted(claimed, key=lambda queued: queued.update_id)[:limit]
+
+    async def ack(self, update_ids: Sequence[int]) -> None:
+        for update_id in update_ids:
+            self.updates.pop(update_id, None)
+
+
+def partition_of(chat_id: int, partitions: int) -> int:
+    return abs(chat_id) % partitions
+
+
+def partition_chat_id(update: Update) -> int:
+    """The chat whose updates must stay in order; updates without a chat are ordered per user."""
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return 0
+
+
+class UpdateForwarder:
+    """Handler callback of the ingress process."""
+
+    def __init__(self, queue: UpdateQueue) -> None:
+        self.queue = queue
+        self.queued = Counter('framed_bot_ingress_queued', 'Updates queued for the workers')
+        self.redelivered = Counter('framed_bot_ingress_redelivered', 'Updates that were already queued')
+
+    async def __call__(self, update: Update, _context: ContextTypes.DEFAULT_TYPE) -> None:
+        queued = await self.queue.put(update.update_id, partition_chat_id(update), json.dumps(update.to_dict()))
+        (self.queued if queued else self.redelivered).inc()
+
+
+class UpdateWorker:
+    def __init__(
+        self,
+        application: Application[Any, Any, Any, Any, Any, Any],
+        queue: UpdateQueue,
+        index: int,
+        count: int,
+        batch_size: int,
+        poll_interval: float,
+    ) -> None:
+        if not 0 <= index < count:
+            raise ValueError(f'worker index {index} is outside 0..{count - 1}')
+        self.application = application
+        self.queue = queue
+        self.index = index
+        self.count = count
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.processed = Counter('framed_bot_worker_processed', 'Updates processed by this worker')
+        self.skipped = Counter('framed_bot_worker_skipped', 'Updates this worker had already processed')
+        self.failed = Counter('framed_bot_worker_failed', 'Updates that could not be decoded or handled')
+        # Updates processed but not acknowledged yet, e.g. when acknowledging them failed.
+        self._recent: LruCache[int, bool] = LruCache(batch_size * 10, 'recent_updates')
+
+    async def run(self, stop_requested: asyncio.Event) -> None:
+        failures = 0
+        while not stop_requested.is_set():
+            try:
+                processed = await self.process_batch()
+            except Exception:
+                failures += 1
+                logger.exception('Worker %d could not process its queue (attempt %d)', self.index, failures)
+                delay = min(self.poll_interval * 2**failures, MAX_RETRY_DELAY)
+            else:
+                failures = 0
+                if processed:
+                    continue
+                delay = self.poll_interval
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(stop_requested.wait(), delay)
+
+    async def process_batch(self) -> int:
+        batch = await self.queue.claim(self.index, self.count, self.batch_size)
+        by_chat: dict[int, list[QueuedUpdate]] = defaultdict(list)
+        for queued in batch:
+            by_chat[queued.chat_id].append(queued)
+        # Every chat finishes before the batch is claimed again, even when another one failed.
+        outcomes = await asyncio.gather(
+            *(self._process_chat(updates) for updates in by_chat.values()), return_exceptions=True
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+        return len(batch)
+
+    async def _process_chat(self, updates: list[QueuedUpdate]) -> None:
+        for queued in updates:
+            if self._recent.get(queued.update_id):
+                self.skipped.inc()
+            else:
+                await self._process(queued)
+                self._recent.put(queued.update_id, True)
+            await self.queue.ack([queued.update_id])
+
+    async def _process(self, queued: QueuedUpdate) -> None:
+        try:
+            update = Update.de_json(json.loads(queued.payload), self.application.bot)
+            # Handlers are registered blocking in worker mode, so this returns once the update is handled.
+            await self.application.process_update(update)
+        except Exception:
+            logger.exception('Dropping update %d of chat %d', queued.update_id, queued.chat_id)
+            self.failed.inc()
+        else:
+            self.processed.inc()
+
+
+async def serve_worker(worker: UpdateWorker) -> None:
+    """Run the worker's application and consume its partition until SIGTERM or SIGINT."""
+    application = worker.application
+    stop_requested = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop_requested.set)
+
+    await application.initialize()
+    if application.post_init is not None:
+        await application.post_init(application)
+    await application.start()
+    logger.info('Worker %d of %d started', worker.index, worker.count)
+    try:
+        await worker.run(stop_requested)
+    finally:
+        await application.stop()
+        if application.post_stop is not None:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown is not None:
+            await application.post_shutdown(application)